@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Batched datagram I/O for the reliable UDP sender and receiver.
+
+DatagramBatcher queues outgoing datagrams and flushes a whole burst with a
+single sendmmsg() call, and drains every readable datagram with a single
+recvmmsg() call. Both are reached through ctypes on Linux; elsewhere (or for
+non-IPv4 sockets) the same interface falls back to a sendmsg()/recvfrom()
+loop, so callers never need to know which path is in use.
+"""
+
+import ctypes
+import errno
+import socket
+import struct
+import sys
+
+
+class IoVec(ctypes.Structure):  # pylint: disable=too-few-public-methods
+    """struct iovec"""
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class MsgHdr(ctypes.Structure):  # pylint: disable=too-few-public-methods
+    """struct msghdr"""
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(IoVec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class MMsgHdr(ctypes.Structure):  # pylint: disable=too-few-public-methods
+    """struct mmsghdr"""
+    _fields_ = [('msg_hdr', MsgHdr), ('msg_len', ctypes.c_uint)]
+
+
+class SockAddrIn(ctypes.Structure):  # pylint: disable=too-few-public-methods
+    """struct sockaddr_in (port and address in network byte order)"""
+    _fields_ = [
+        ('sin_family', ctypes.c_ushort),
+        ('sin_port', ctypes.c_uint8 * 2),
+        ('sin_addr', ctypes.c_uint8 * 4),
+        ('sin_zero', ctypes.c_uint8 * 8),
+    ]
+
+
+class PyBuffer(ctypes.Structure):  # pylint: disable=too-few-public-methods
+    """Py_buffer, used to borrow the address of read-only buffers."""
+    _fields_ = [
+        ('buf', ctypes.c_void_p),
+        ('obj', ctypes.c_void_p),
+        ('len', ctypes.c_ssize_t),
+        ('itemsize', ctypes.c_ssize_t),
+        ('readonly', ctypes.c_int),
+        ('ndim', ctypes.c_int),
+        ('format', ctypes.c_char_p),
+        ('shape', ctypes.c_void_p),
+        ('strides', ctypes.c_void_p),
+        ('suboffsets', ctypes.c_void_p),
+        ('internal', ctypes.c_void_p),
+    ]
+
+
+def load_mmsg_calls():
+    """Return (sendmmsg, recvmmsg) from libc, or (None, None)."""
+    if not sys.platform.startswith('linux'):
+        return None, None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        sendmmsg = libc.sendmmsg
+        recvmmsg = libc.recvmmsg
+    except (OSError, AttributeError):
+        return None, None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int,
+                         ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+    return sendmmsg, recvmmsg
+
+
+SENDMMSG, RECVMMSG = load_mmsg_calls()
+
+GET_BUFFER = ctypes.pythonapi.PyObject_GetBuffer
+GET_BUFFER.argtypes = [ctypes.py_object, ctypes.POINTER(PyBuffer), ctypes.c_int]
+GET_BUFFER.restype = ctypes.c_int
+RELEASE_BUFFER = ctypes.pythonapi.PyBuffer_Release
+RELEASE_BUFFER.argtypes = [ctypes.POINTER(PyBuffer)]
+RELEASE_BUFFER.restype = None
+
+MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0x40)
+AGAIN_ERRNOS = (errno.EAGAIN, errno.EWOULDBLOCK)
+
+
+class DatagramBatcher:  # pylint: disable=too-many-instance-attributes
+    """Queue-and-flush sender and drain-all receiver for one UDP socket.
+
+    queue() collects datagrams (each a list of buffers sent as one datagram
+    with scatter/gather) and flush() sends them all, with one system call per
+    batch where sendmmsg() is available. recv_batch() returns every datagram
+    already waiting on the socket without blocking.
+
+    Datagrams that do not fit the socket send buffer of a non-blocking socket
+    are dropped, as the network would; the protocol retransmits them.
+    """
+
+    def __init__(self, sock, batch_size=64, recv_size=2048):
+        self.sock = sock
+        self.batch_size = batch_size
+        self.recv_size = recv_size
+        self.pending = []
+        self.use_mmsg = SENDMMSG is not None and sock.family == socket.AF_INET
+        self.addr_cache = {}
+
+        self.send_calls = 0
+        self.datagrams_sent = 0
+        self.datagrams_dropped = 0
+        self.recv_calls = 0
+        self.datagrams_received = 0
+
+        if self.use_mmsg:
+            self.recv_arena = bytearray(batch_size * recv_size)
+            arena_base = ctypes.addressof(
+                (ctypes.c_char * len(self.recv_arena)).from_buffer(self.recv_arena))
+            self.recv_iovs = (IoVec * batch_size)()
+            self.recv_names = (SockAddrIn * batch_size)()
+            self.recv_msgs = (MMsgHdr * batch_size)()
+            for i in range(batch_size):
+                self.recv_iovs[i].iov_base = arena_base + i * recv_size
+                self.recv_iovs[i].iov_len = recv_size
+                hdr = self.recv_msgs[i].msg_hdr
+                hdr.msg_name = ctypes.addressof(self.recv_names[i])
+                hdr.msg_iov = ctypes.pointer(self.recv_iovs[i])
+                hdr.msg_iovlen = 1
+
+    def queue(self, buffers, addr):
+        """Queue one datagram made of buffers for addr; flush when full."""
+        self.pending.append((buffers, addr))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send every queued datagram and return how many were sent."""
+        if not self.pending:
+            return 0
+        pending, self.pending = self.pending, []
+        if self.use_mmsg:
+            sent = self.flush_mmsg(pending)
+        else:
+            sent = self.flush_loop(pending)
+        self.datagrams_sent += sent
+        self.datagrams_dropped += len(pending) - sent
+        return sent
+
+    def flush_loop(self, pending):
+        """Fallback: one sendmsg()/sendto() per datagram."""
+        sent = 0
+        for buffers, addr in pending:
+            self.send_calls += 1
+            try:
+                if hasattr(self.sock, 'sendmsg'):
+                    self.sock.sendmsg(buffers, (), 0, addr)
+                else:
+                    self.sock.sendto(b''.join(buffers), addr)
+            except (BlockingIOError, InterruptedError):
+                break
+            sent += 1
+        return sent
+
+    def sockaddr(self, addr):
+        """Return a cached sockaddr_in for an (ip, port) tuple."""
+        name = self.addr_cache.get(addr)
+        if name is None:
+            name = SockAddrIn()
+            name.sin_family = socket.AF_INET
+            name.sin_port[:] = struct.pack('!H', addr[1])
+            name.sin_addr[:] = socket.inet_aton(addr[0])
+            self.addr_cache[addr] = name
+        return name
+
+    def flush_mmsg(self, pending):
+        """Send pending datagrams with as few sendmmsg() calls as possible."""
+        count = len(pending)
+        msgs = (MMsgHdr * count)()
+        views = []
+        iov_arrays = []
+        try:
+            for i, (buffers, addr) in enumerate(pending):
+                iovs = (IoVec * len(buffers))()
+                for j, buf in enumerate(buffers):
+                    view = PyBuffer()
+                    GET_BUFFER(buf, ctypes.byref(view), 0)
+                    views.append(view)
+                    iovs[j].iov_base = view.buf
+                    iovs[j].iov_len = view.len
+                iov_arrays.append(iovs)
+                hdr = msgs[i].msg_hdr
+                name = self.sockaddr(addr)
+                hdr.msg_name = ctypes.addressof(name)
+                hdr.msg_namelen = ctypes.sizeof(name)
+                hdr.msg_iov = iovs
+                hdr.msg_iovlen = len(buffers)
+
+            sent = 0
+            fd = self.sock.fileno()
+            while sent < count:
+                self.send_calls += 1
+                result = SENDMMSG(fd, ctypes.byref(msgs[sent]), count - sent, 0)
+                if result < 0:
+                    err = ctypes.get_errno()
+                    if err == errno.EINTR:
+                        continue
+                    if err in AGAIN_ERRNOS:
+                        break
+                    raise OSError(err, 'sendmmsg: ' + errno.errorcode.get(err, str(err)))
+                sent += result
+            return sent
+        finally:
+            for view in views:
+                RELEASE_BUFFER(ctypes.byref(view))
+
+    def recv_batch(self):
+        """Return a list of (data, addr) for every datagram already queued."""
+        if self.use_mmsg:
+            return self.recv_mmsg()
+        return self.recv_loop()
+
+    def recv_loop(self):
+        """Fallback: non-blocking recvfrom() until the socket is empty."""
+        received = []
+        timeout = self.sock.gettimeout()
+        self.sock.setblocking(False)
+        try:
+            while len(received) < self.batch_size:
+                self.recv_calls += 1
+                try:
+                    received.append(self.sock.recvfrom(self.recv_size))
+                except (BlockingIOError, InterruptedError):
+                    break
+        finally:
+            self.sock.settimeout(timeout)
+        self.datagrams_received += len(received)
+        return received
+
+    def recv_mmsg(self):
+        """Drain up to batch_size datagrams with one recvmmsg() call."""
+        for i in range(self.batch_size):
+            self.recv_msgs[i].msg_hdr.msg_namelen = ctypes.sizeof(SockAddrIn)
+        while True:
+            self.recv_calls += 1
+            count = RECVMMSG(self.sock.fileno(), self.recv_msgs, self.batch_size,
+                             MSG_DONTWAIT, None)
+            if count >= 0:
+                break
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if err in AGAIN_ERRNOS:
+                return []
+            raise OSError(err, 'recvmmsg: ' + errno.errorcode.get(err, str(err)))
+
+        received = []
+        arena = self.recv_arena
+        for i in range(count):
+            start = i * self.recv_size
+            data = bytes(arena[start:start + self.recv_msgs[i].msg_len])
+            name = self.recv_names[i]
+            addr = (socket.inet_ntoa(bytes(name.sin_addr)),
+                    struct.unpack('!H', bytes(name.sin_port))[0])
+            received.append((data, addr))
+        self.datagrams_received += count
+        return received
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Digests of received files, for the clients and the experiment drivers.
+
+RollingDigest hashes a file's bytes in order as the receiver produces them,
+so a client can report the digest of its output file at the end of the
+transfer and the driver does not have to read the file back. md5 -- what
+the experiment CSVs record -- is the default; blake2b/blake2s, and the
+xxhash family when the xxhash package is installed, are cheaper choices.
+
+file_digest() is the fallback for output that was not hashed while it was
+written: it maps the file and hashes it with one update() call.
+"""
+
+import hashlib
+import mmap
+import os
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+XXHASH_ALGORITHMS = ('xxh64', 'xxh3_64', 'xxh3_128')
+ALGORITHMS = ('md5', 'sha1', 'blake2b', 'blake2s') + (XXHASH_ALGORITHMS if xxhash else ())
+DEFAULT_ALGORITHM = 'md5'
+
+
+def new_hasher(algorithm=DEFAULT_ALGORITHM):
+    """A hashlib-style object (update/hexdigest) for an algorithm name"""
+    if algorithm in XXHASH_ALGORITHMS:
+        if xxhash is None:
+            raise ValueError(f"{algorithm} needs the xxhash package")
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+
+class RollingDigest:
+    """Digest of a byte stream fed in order; length is the bytes hashed so far."""
+
+    def __init__(self, algorithm=DEFAULT_ALGORITHM):
+        self.algorithm = algorithm
+        self.hasher = new_hasher(algorithm)
+        self.length = 0
+
+    def update(self, data):
+        """Hash the next bytes of the stream"""
+        self.hasher.update(data)
+        self.length += len(data)
+
+    def update_from_fd(self, fd, end, block_size=1 << 20):
+        """Hash the bytes of fd from offset length up to end, for output that
+        is written in place rather than in order; they are still in the page
+        cache, so this costs a copy, not a disk read"""
+        while self.length < end:
+            data = os.pread(fd, min(block_size, end - self.length), self.length)
+            if not data:
+                break
+            self.update(data)
+
+    def hexdigest(self):
+        """Hex digest of the bytes hashed so far"""
+        return self.hasher.hexdigest()
+
+
+def file_digest(path, algorithm=DEFAULT_ALGORITHM):
+    """Hex digest of a file's contents, or None if it does not exist"""
+    hasher = new_hasher(algorithm)
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, \
+                        memoryview(mapped) as view:
+                    hasher.update(view)
+    except FileNotFoundError:
+        return None
+    return hasher.hexdigest()
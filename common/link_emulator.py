@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Userspace link emulator: the experiment topologies without Mininet or root.
+
+LinkEmulator relays UDP datagrams between clients and servers on one host
+through an emulated bottleneck link. Each direction of the link applies
+what netem/tbf would on a Mininet TCLink: Bernoulli or Gilbert-Elliott
+loss, a drop-tail queue of buffer_size packets in front of a token bucket
+of the given bandwidth, and a one-way delay with uniform jitter (which, as
+with netem, can reorder packets). Loss and jitter follow the Mininet
+conventions: loss in percent, delays in milliseconds.
+
+Each route maps a listening port to one server and adds fixed access-link
+delays on the client and server side of the bottleneck, so a dumbbell with
+per-host access delays is a set of routes sharing one bottleneck. Every
+client gets its own upstream socket, so servers still see one address per
+client.
+
+EmulatedNetwork runs the emulator as a subprocess behind a small subset of
+the Mininet API (start, stop, get(name).cmd/cmdPrint/IP), which is what the
+experiment drivers use for their local backend.
+
+Usage:
+    python3 link_emulator.py --route LISTEN_PORT:SERVER_IP:SERVER_PORT[:CLIENT_MS[:SERVER_MS]]
+                             [--route ...] [options]
+
+Clients send to 127.0.0.1:LISTEN_PORT instead of the server.
+"""
+
+import argparse
+import collections
+import heapq
+import os
+import random
+import select
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+
+class BernoulliLoss:
+    """Independent loss with probability percent / 100."""
+
+    def __init__(self, percent):
+        self.p = percent / 100
+
+    def drop(self, rng):
+        """Whether the next packet is lost"""
+        return self.p > 0 and rng.random() < self.p
+
+
+class GilbertElliottLoss:
+    """Two-state bursty loss, parameterised like netem's gemodel (percent):
+    p = P(good -> bad), r = P(bad -> good), loss_bad = 1 - h (loss in the bad
+    state), loss_good = 1 - k (loss in the good state)."""
+
+    def __init__(self, p, r, loss_bad=100.0, loss_good=0.0):
+        self.p = p / 100
+        self.r = r / 100
+        self.loss_bad = loss_bad / 100
+        self.loss_good = loss_good / 100
+        self.bad = False
+
+    def drop(self, rng):
+        """Advance the good/bad state by one packet and return whether it is lost"""
+        if self.bad:
+            if rng.random() < self.r:
+                self.bad = False
+        elif rng.random() < self.p:
+            self.bad = True
+        return rng.random() < (self.loss_bad if self.bad else self.loss_good)
+
+
+class LinkDirection:
+    """Loss, queue, token bucket and delay of one direction of the link."""
+
+    def __init__(self, bandwidth_mbps=None, delay_ms=0.0, jitter_ms=0.0, loss_model=None,
+                 buffer_size=None, burst_bytes=1500, rng=None):
+        self.rate = bandwidth_mbps * 1e6 / 8 if bandwidth_mbps else None  # bytes/s
+        self.delay = delay_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.loss_model = loss_model
+        self.buffer_size = buffer_size
+        self.burst = burst_bytes
+        self.rng = rng or random.Random()
+
+        # Token bucket, evaluated lazily at each departure
+        self.tokens = burst_bytes
+        self.tokens_time = 0.0
+        self.last_departure = 0.0
+        self.departures = collections.deque()  # departure times of queued packets
+
+        # Statistics
+        self.forwarded = 0
+        self.lost = 0
+        self.queue_drops = 0
+
+    def departure_time(self, now, size):
+        """FIFO departure time of a size-byte packet queued at now"""
+        start = max(now, self.last_departure)
+        tokens = min(self.burst, self.tokens + (start - self.tokens_time) * self.rate)
+        if tokens >= size:
+            departure = start
+            self.tokens = tokens - size
+        else:
+            departure = start + (size - tokens) / self.rate
+            self.tokens = 0.0
+        self.tokens_time = self.last_departure = departure
+        return departure
+
+    def admit(self, now, size):
+        """Return when a size-byte packet entering the link at now leaves it, or None if dropped"""
+        if self.loss_model is not None and self.loss_model.drop(self.rng):
+            self.lost += 1
+            return None
+
+        departure = now
+        if self.rate is not None:
+            while self.departures and self.departures[0] <= now:
+                self.departures.popleft()
+            if self.buffer_size is not None and len(self.departures) >= self.buffer_size:
+                self.queue_drops += 1
+                return None
+            departure = self.departure_time(now, size)
+            self.departures.append(departure)
+
+        self.forwarded += 1
+        delay = self.delay
+        if self.jitter:
+            delay = max(0.0, delay + self.rng.uniform(-self.jitter, self.jitter))
+        return departure + delay
+
+    def summary(self):
+        """One-line packet counts for the exit report"""
+        return f"{self.forwarded} forwarded, {self.lost} lost, {self.queue_drops} queue drops"
+
+
+class Route:
+    """A listening port relayed to one server, with access-link delays (seconds)."""
+
+    def __init__(self, listen_port, server_addr, client_delay_ms=0.0, server_delay_ms=0.0):
+        self.listen_port = listen_port
+        self.server_addr = server_addr
+        self.client_delay = client_delay_ms / 1000
+        self.server_delay = server_delay_ms / 1000
+        self.sock = None
+
+    @classmethod
+    def parse(cls, spec):
+        """Route from LISTEN_PORT:SERVER_IP:SERVER_PORT[:CLIENT_MS[:SERVER_MS]]"""
+        fields = spec.split(':')
+        if not 3 <= len(fields) <= 5:
+            raise ValueError(f"Bad route: {spec}")
+        delays = [float(value) for value in fields[3:]]
+        return cls(int(fields[0]), (fields[1], int(fields[2])), *delays)
+
+    def spec(self):
+        """The --route argument that parse() turns back into this route"""
+        return (f"{self.listen_port}:{self.server_addr[0]}:{self.server_addr[1]}:"
+                f"{self.client_delay * 1000:g}:{self.server_delay * 1000:g}")
+
+
+class LinkEmulator:
+    """UDP relay between clients and servers through one emulated bottleneck."""
+
+    def __init__(self, routes, bandwidth_mbps=None, delay_ms=0.0, jitter_ms=0.0, loss=0.0,
+                 gemodel=None, buffer_size=None, burst_bytes=1500, listen_ip='127.0.0.1',
+                 seed=None):
+        rng = random.Random(seed)
+
+        def loss_model():
+            if gemodel:
+                return GilbertElliottLoss(*gemodel)
+            return BernoulliLoss(loss) if loss else None
+
+        self.uplink = LinkDirection(bandwidth_mbps, delay_ms, jitter_ms, loss_model(),
+                                    buffer_size, burst_bytes, rng)
+        self.downlink = LinkDirection(bandwidth_mbps, delay_ms, jitter_ms, loss_model(),
+                                      buffer_size, burst_bytes, rng)
+        self.listen_ip = listen_ip
+
+        self.routes = {}    # {listening socket: Route}
+        for route in routes:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((listen_ip, route.listen_port))
+            sock.setblocking(False)
+            route.sock = sock
+            self.routes[sock] = route
+
+        self.upstream = {}  # {(listen port, client_addr): socket towards the server}
+        self.clients = {}   # {upstream socket: (Route, client_addr)}
+        # Heap of (time, order, link direction or None, socket, packet, destination):
+        # packets about to enter a link direction, or (None) to be delivered
+        self.events = []
+        self.order = 0
+
+    def upstream_socket(self, route, client_addr):
+        """The server-facing socket for a client, created on its first packet"""
+        key = (route.listen_port, client_addr)
+        sock = self.upstream.get(key)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((self.listen_ip, 0))
+            sock.setblocking(False)
+            self.upstream[key] = sock
+            self.clients[sock] = (route, client_addr)
+        return sock
+
+    def schedule(self, when, direction, sock, packet, dest):
+        """Queue an event: packet enters direction at when (or is delivered, for None)"""
+        heapq.heappush(self.events, (when, self.order, direction, sock, packet, dest))
+        self.order += 1
+
+    def receive(self, sock, now):
+        """Drain every datagram queued on a readable socket towards the bottleneck"""
+        while True:
+            try:
+                packet, addr = sock.recvfrom(65535)
+            except BlockingIOError:
+                return
+            route = self.routes.get(sock)
+            if route is not None:
+                # Client -> client access link -> uplink -> server access link
+                self.schedule(now + route.client_delay, self.uplink,
+                              self.upstream_socket(route, addr), packet, route.server_addr)
+            else:
+                route, client_addr = self.clients[sock]
+                self.schedule(now + route.server_delay, self.downlink,
+                              route.sock, packet, client_addr)
+
+    def process(self, now):
+        """Move due packets through the bottleneck and deliver those that have crossed it"""
+        while self.events and self.events[0][0] <= now:
+            when, _, direction, sock, packet, dest = heapq.heappop(self.events)
+            if direction is None:
+                try:
+                    sock.sendto(packet, dest)
+                except OSError:
+                    pass
+                continue
+            leave_at = direction.admit(when, len(packet))
+            if leave_at is not None:
+                # Then the access link on the far side
+                if direction is self.uplink:
+                    route, _ = self.clients[sock]
+                    leave_at += route.server_delay
+                else:
+                    leave_at += self.routes[sock].client_delay
+                self.schedule(leave_at, None, sock, packet, dest)
+
+    def run(self):
+        """Relay until interrupted"""
+        try:
+            while True:
+                now = time.time()
+                timeout = max(0.0, self.events[0][0] - now) if self.events else 1.0
+                ready, _, _ = select.select([*self.routes, *self.clients], [], [], timeout)
+                now = time.time()
+                for sock in ready:
+                    self.receive(sock, now)
+                self.process(time.time())
+        finally:
+            self.close()
+
+    def close(self):
+        """Close every socket and print the per-direction statistics"""
+        for sock in [*self.routes, *self.clients]:
+            sock.close()
+        print(f"Uplink: {self.uplink.summary()}")
+        print(f"Downlink: {self.downlink.summary()}")
+
+
+class LocalHost:
+    """A Mininet host stand-in: commands run on this machine."""
+
+    def __init__(self, name, ip='127.0.0.1'):
+        self.name = name
+        self.ip = ip
+
+    def IP(self):  # pylint: disable=invalid-name
+        """Address servers on this host listen on"""
+        return self.ip
+
+    def cmd(self, command):
+        """Run a shell command and return its output; trailing '&' runs it in the background"""
+        if command.rstrip().endswith('&'):
+            subprocess.Popen(command, shell=True, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.DEVNULL)
+            return ''
+        return subprocess.run(command, shell=True, stdout=subprocess.PIPE,
+                              stderr=subprocess.STDOUT, text=True, check=False).stdout
+
+    def cmdPrint(self, command):  # pylint: disable=invalid-name
+        """cmd(), echoing the output as Mininet does"""
+        output = self.cmd(command)
+        print(output, end='')
+        return output
+
+
+class EmulatedNetwork:
+    """Mininet-like handle on a link_emulator.py subprocess.
+
+    Every host is this machine; servers listen on 127.0.0.1 and clients
+    reach a server port through address(port), the emulator's route to it.
+    """
+
+    def __init__(self, routes, route_port_offset=10000, log_path=None, **link_options):
+        self.routes = [Route(port + route_port_offset, ('127.0.0.1', port), client_ms, server_ms)
+                       for port, client_ms, server_ms in routes]
+        self.route_port_offset = route_port_offset
+        self.link_options = link_options
+        self.log_path = log_path
+        self.process = None
+
+    def command(self):
+        """argv that runs this module as the emulator with the routes and link options"""
+        args = [sys.executable, os.path.abspath(__file__)]
+        for route in self.routes:
+            args += ['--route', route.spec()]
+        for name, value in self.link_options.items():
+            if value is None:
+                continue
+            if name == 'gemodel':
+                args += ['--gemodel', *(str(v) for v in value)]
+            else:
+                args += [f"--{name.replace('_', '-')}", str(value)]
+        return args
+
+    def start(self):
+        """Start the emulator, its output going to log_path if one was given"""
+        if self.log_path:
+            # The child keeps its own copy of the descriptor
+            with open(self.log_path, 'w') as log:
+                self.process = subprocess.Popen(self.command(), stdout=log,
+                                                stderr=subprocess.STDOUT)
+        else:
+            self.process = subprocess.Popen(self.command(), stdout=subprocess.DEVNULL,
+                                            stderr=subprocess.STDOUT)
+        time.sleep(0.2)  # let it bind its ports
+
+    def stop(self):
+        """Interrupt the emulator so it prints its statistics, killing it if it hangs"""
+        if self.process is not None:
+            self.process.send_signal(signal.SIGINT)
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+    def get(self, name):
+        """Host by name; every host is this machine"""
+        return LocalHost(name)
+
+    def address(self, port):
+        """(ip, port) a client sends to in order to reach server port"""
+        return '127.0.0.1', port + self.route_port_offset
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        usage="python3 link_emulator.py --route LISTEN_PORT:SERVER_IP:SERVER_PORT"
+              "[:CLIENT_MS[:SERVER_MS]] [--route ...] [options]")
+    parser.add_argument('--route', action='append', required=True, type=Route.parse,
+                        help="Relay LISTEN_PORT to SERVER_IP:SERVER_PORT, with optional "
+                             "client- and server-side access delays in ms")
+    parser.add_argument('--bw', type=float, default=None,
+                        help="Bottleneck bandwidth in Mbit/s per direction (default: unlimited)")
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help="Bottleneck one-way delay in ms")
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help="Uniform delay jitter in ms (+/-)")
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help="Bernoulli loss in percent per packet and direction")
+    parser.add_argument('--gemodel', type=float, nargs='+', default=None,
+                        metavar=('P', 'R'),
+                        help="Gilbert-Elliott loss instead: P R [1-H [1-K]] in percent, "
+                             "as for netem")
+    parser.add_argument('--buffer', '--buffer-size', dest='buffer', type=int, default=None,
+                        help="Drop-tail queue length in packets (default: unlimited)")
+    parser.add_argument('--burst', type=int, default=1500,
+                        help="Token bucket depth in bytes")
+    parser.add_argument('--seed', type=int, default=None, help="Loss and jitter RNG seed")
+    args = parser.parse_args()
+    if args.gemodel is not None and not 2 <= len(args.gemodel) <= 4:
+        parser.error("--gemodel takes 2 to 4 values")
+
+    # Exit through the finally clauses (and print statistics) on SIGTERM too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    emulator = LinkEmulator(args.route, bandwidth_mbps=args.bw, delay_ms=args.delay,
+                            jitter_ms=args.jitter, loss=args.loss, gemodel=args.gemodel,
+                            buffer_size=args.buffer, burst_bytes=args.burst, seed=args.seed)
+    try:
+        emulator.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
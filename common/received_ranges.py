@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Receiver-side SACK bookkeeping shared by the Part 1 and Part 2 clients.
+"""
+
+import bisect
+
+
+class ReceivedRanges:
+    """
+    Coalesced byte ranges received above the receive base, kept as two
+    parallel sorted lists so that each arrival is merged with a bisect
+    search instead of re-sorting the whole reassembly buffer.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.last_changed = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, start, end):
+        """
+        Record [start, end) as received, merging overlapping or adjacent
+        ranges, and remember it as the most recently changed range.
+        """
+        first = bisect.bisect_left(self.ends, start)
+        last = bisect.bisect_right(self.starts, end)
+        if first < last:
+            start = min(start, self.starts[first])
+            end = max(end, self.ends[last - 1])
+        self.starts[first:last] = [start]
+        self.ends[first:last] = [end]
+        self.last_changed = start
+
+    def trim(self, base):
+        """
+        Forget everything below base (the new cumulative ACK point).
+        """
+        done = bisect.bisect_right(self.ends, base)
+        if done:
+            del self.starts[:done]
+            del self.ends[:done]
+        if self.starts and self.starts[0] < base:
+            self.starts[0] = base
+
+    def blocks(self, limit):
+        """
+        Return up to limit (start, end) SACK blocks, the most recently
+        changed range first as RFC 2018 recommends, then the rest in
+        ascending order.
+        """
+        if not self.starts or limit <= 0:
+            return []
+        recent = None
+        if self.last_changed is not None:
+            index = bisect.bisect_right(self.starts, self.last_changed) - 1
+            if index >= 0 and self.ends[index] > self.last_changed:
+                recent = index
+
+        result = []
+        if recent is not None:
+            result.append((self.starts[recent], self.ends[recent]))
+        for index, (start, end) in enumerate(zip(self.starts, self.ends)):
+            if len(result) >= limit:
+                break
+            if index != recent:
+                result.append((start, end))
+        return result
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Loopback micro-benchmark for the Part 1 sender.
+
+Usage:
+    python3 p1_bench.py [size_mb] [--baseline] [--repeat N] [extra server args...]
+
+Transfers a random file of <size_mb> megabytes (default 8) over 127.0.0.1
+with window sizes of 10, 100 and 1000 segments and reports, for each run,
+the wall-clock time and the CPU time (user + system) spent by the server and
+the client per transferred megabyte. Any extra arguments are passed to
+p1_server.py so that its optional modes can be compared.
+
+--baseline also runs every window with the original retransmission timer
+path (p1_server.py --timer scan: a full-window scan on a 100 us poll) so the
+deadline heap can be compared against it on the same machine; --repeat runs
+each configuration N times, since single loopback runs are noisy.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER_PY = os.path.join(HERE, "p1_server.py")
+CLIENT_PY = os.path.join(HERE, "p1_client.py")
+
+MSS = 1180
+WINDOWS = [10, 100, 1000]
+SERVER_IP = "127.0.0.1"
+BASE_PORT = 16555
+
+
+def cpu_seconds(rusage):
+    """Return user + system CPU seconds from a resource usage record."""
+    return rusage.ru_utime + rusage.ru_stime
+
+
+def run_once(workdir, port, sws, server_args=(), client_args=()):
+    """Run one transfer and return (wall_s, server_cpu_s, client_cpu_s, ok)."""
+    out_file = os.path.join(workdir, "received_data.txt")
+    if os.path.exists(out_file):
+        os.remove(out_file)
+
+    server = subprocess.Popen(
+        [sys.executable, SERVER_PY, SERVER_IP, str(port), str(sws), *server_args],
+        cwd=workdir,
+    )
+    time.sleep(0.3)
+
+    start = time.time()
+    client = subprocess.Popen(
+        [sys.executable, CLIENT_PY, SERVER_IP, str(port), *client_args],
+        cwd=workdir,
+    )
+    _, _, client_usage = os.wait4(client.pid, 0)
+    wall = time.time() - start
+    _, _, server_usage = os.wait4(server.pid, 0)
+
+    with open(os.path.join(workdir, "data.txt"), "rb") as src, \
+            open(out_file, "rb") as dst:
+        ok = src.read() == dst.read()
+
+    return wall, cpu_seconds(server_usage), cpu_seconds(client_usage), ok
+
+
+def pop_flag(args, name):
+    """Remove a boolean flag from args and return whether it was present."""
+    if name in args:
+        args.remove(name)
+        return True
+    return False
+
+
+def pop_option(args, name, default):
+    """Remove '<name> <value>' from args and return the value (or default)."""
+    if name not in args:
+        return default
+    index = args.index(name)
+    value = args[index + 1]
+    del args[index:index + 2]
+    return value
+
+
+def main():
+    args = sys.argv[1:]
+    timers = ["scan", "heap"] if pop_flag(args, "--baseline") else ["heap"]
+    repeat = int(pop_option(args, "--repeat", "1"))
+    size_mb = 8.0
+    if args:
+        try:
+            size_mb = float(args[0])
+        except ValueError:
+            pass  # no size given: every argument is for the server
+        else:
+            del args[0]
+    server_args = tuple(args)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "data.txt"), "wb") as f:
+            f.write(os.urandom(int(size_mb * 1024 * 1024)))
+
+        print("window_segments,timer,wall_s,server_cpu_s_per_mb,client_cpu_s_per_mb,ok")
+        port = BASE_PORT
+        for segments in WINDOWS:
+            for _ in range(repeat):
+                for timer in timers:
+                    wall, server_cpu, client_cpu, ok = run_once(
+                        workdir, port, segments * MSS,
+                        server_args=(*server_args, "--timer", timer)
+                    )
+                    port += 1
+                    print(
+                        f"{segments},{timer},{wall:.3f},{server_cpu / size_mb:.4f},"
+                        f"{client_cpu / size_mb:.4f},{ok}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
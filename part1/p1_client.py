@@ -5,19 +5,101 @@ sends ACKs and SACK blocks. This module implements a simple reliable
 transfer over UDP (client side).
 """
 
+import argparse
+import os
+import queue
 import socket
-import sys
 import time
 import struct
+import sys
 import threading
 
+# Modules shared by Part 1 and Part 2
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+from batch_io import DatagramBatcher
+from digest import ALGORITHMS, DEFAULT_ALGORITHM, RollingDigest
+from received_ranges import ReceivedRanges
+
+# An ACK is the 4-byte ACK number plus 8 bytes per SACK block and must fit
+# in one 1200-byte datagram.
+MAX_SACK_BLOCKS = (1200 - 4) // 8
+LEGACY_SACK_BLOCKS = 2
+
+# Shortest receive timeout: settimeout(0.0) would make the socket
+# non-blocking, and recvfrom() would raise BlockingIOError, not a timeout.
+MIN_RECEIVE_TIMEOUT = 1e-4
+
+# Copies of the final ACK sent when the EOF arrives. The server's RTO can
+# reach 2 s, longer than the client lingers, so a lost final ACK would
+# otherwise leave the server waiting out its EOF timeout.
+EOF_ACK_COPIES = 3
+
+
+class WriteBehindWriter:
+    """
+    Write-behind pipeline for in-order data: bytes accumulate in a large
+    buffer and full batches are written by a background thread, so file I/O
+    stays off the receive/ACK path.
+    """
+
+    def __init__(self, output_file, batch_size=1 << 20, max_pending=8, fsync=False):
+        self.output_file = output_file
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.buffer = bytearray()
+        self.pending = queue.Queue(max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, data):
+        """
+        Append data; hand the buffer to the writer thread once it is full.
+        """
+        self.buffer += data
+        if len(self.buffer) >= self.batch_size:
+            batch, self.buffer = self.buffer, bytearray()
+            self.pending.put(batch)
+
+    def run(self):
+        """
+        Writer thread: write batches in order until the close sentinel.
+        """
+        while True:
+            batch = self.pending.get()
+            if batch is None:
+                return
+            if self.error is None:
+                try:
+                    self.output_file.write(batch)
+                except OSError as exc:
+                    self.error = exc
+
+    def close(self):
+        """
+        Write out the remaining bytes, wait for the writer thread and flush
+        (and optionally fsync) the file. Re-raises any write error.
+        """
+        if self.buffer:
+            self.pending.put(self.buffer)
+            self.buffer = bytearray()
+        self.pending.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        self.output_file.flush()
+        if self.fsync:
+            os.fsync(self.output_file.fileno())
+
 
 class ReliableUDPClient:  # pylint: disable=too-many-instance-attributes
     """
     Client implementing a reliable UDP receiver with basic SACK support.
     """
 
-    def __init__(self, server_ip, server_port):
+    def __init__(self, server_ip, server_port, batch_io=False,  # pylint: disable=too-many-arguments
+                 sack_blocks=LEGACY_SACK_BLOCKS, ack_policy='immediate', ack_every=2,
+                 ack_delay=0.02, fsync=False, digest=None):
         """
         Initialize client state.
         """
@@ -25,6 +107,8 @@ class ReliableUDPClient:  # pylint: disable=too-many-instance-attributes
         self.server_port = server_port
         self.server_addr = (server_ip, server_port)
         self.sock = None
+        self.batch_io = batch_io
+        self.batcher = None
 
         # Use snake_case attribute names to satisfy style checks.
         self.mss = 1180
@@ -33,17 +117,32 @@ class ReliableUDPClient:  # pylint: disable=too-many-instance-attributes
 
         self.recv_base = 0
         self.recv_buffer = {}
+        self.received_ranges = ReceivedRanges()
         self.received_data = []
 
         self.sack_blocks = []
+        self.max_sack_blocks = max(1, min(sack_blocks, MAX_SACK_BLOCKS))
 
         self.output_file = None
+        self.writer = None
+        self.fsync = fsync
+        # rolling digest (algorithm name, or None) of the data as it is written
+        self.digest = RollingDigest(digest) if digest else None
         self.transfer_complete = False
         self.eof_ack_num = 0
 
+        # Delayed ACKs: in-sequence data is acknowledged every ack_every
+        # segments or after ack_delay seconds; anything else is ACKed at once.
+        self.ack_policy = ack_policy
+        self.ack_every = ack_every
+        self.ack_delay = ack_delay
+        self.pending_acks = 0
+        self.ack_deadline = None
+
         self.packets_received = 0
         self.duplicate_packets = 0
         self.out_of_order_packets = 0
+        self.acks_sent = 0
         self.start_time = 0
 
         self.lock = threading.Lock()
@@ -64,61 +163,44 @@ class ReliableUDPClient:  # pylint: disable=too-many-instance-attributes
 
     def create_ack_packet(self, ack_num, sack_blocks):
         """
-        Create an ACK packet: 4-byte ACK number followed by up to two SACK blocks
-        (each start,end as 4-byte unsigned ints). SACK area is padded to 16 bytes.
+        Create an ACK packet: 4-byte ACK number followed by up to
+        max_sack_blocks SACK blocks (each start,end as 4-byte unsigned ints).
+        The SACK area is padded to 16 bytes, so with two or fewer blocks the
+        packet is the legacy 20-byte ACK; extra blocks extend it past 20 bytes.
         """
         header = struct.pack('!I', ack_num)
 
-        sack_data = b''
-        for i, (start, end) in enumerate(sack_blocks[:2]):
-            if i < 2:
-                sack_data += struct.pack('!II', start, end)
+        sack_data = b''.join(struct.pack('!II', start, end)
+                             for start, end in sack_blocks[:self.max_sack_blocks])
 
         sack_data = sack_data.ljust(16, b'\x00')
 
         return header + sack_data
 
-    def update_sack_blocks(self):
+    def create_request(self):
         """
-        Update self.sack_blocks from the current recv_buffer and recv_base.
-        Keeps at most two SACK blocks.
+        Create the one-byte file request. A client that wants more than the
+        legacy two SACK blocks appends the block count it will send, which
+        older servers ignore.
         """
-        self.sack_blocks = []
-
-        if not self.recv_buffer:
-            return
-
-        sorted_seqs = sorted(self.recv_buffer.keys())
-
-        # only include segments beyond current receive base
-        sorted_seqs = [seq for seq in sorted_seqs if seq > self.recv_base]
-
-        if not sorted_seqs:
-            return
-
-        current_start = sorted_seqs[0]
-        current_end = current_start + len(self.recv_buffer[current_start])
-
-        for seq in sorted_seqs[1:]:
-            data_len = len(self.recv_buffer[seq])
+        if self.max_sack_blocks <= LEGACY_SACK_BLOCKS:
+            return b'1'
+        return b'1' + struct.pack('!B', self.max_sack_blocks)
 
-            if seq == current_end:
-                current_end = seq + data_len
-            else:
-                self.sack_blocks.append((current_start, current_end))
-                current_start = seq
-                current_end = seq + data_len
-
-        self.sack_blocks.append((current_start, current_end))
-
-        # keep only first two blocks
-        self.sack_blocks = self.sack_blocks[:2]
+    def update_sack_blocks(self):
+        """
+        Update self.sack_blocks from the received ranges above recv_base.
+        Keeps at most max_sack_blocks blocks.
+        """
+        self.received_ranges.trim(self.recv_base)
+        self.sack_blocks = self.received_ranges.blocks(self.max_sack_blocks)
 
     def handle_packet(self, seq_num, data):
         """
         Handle a received packet (store, write in-order data, update stats),
         send appropriate ACKs. Returns True if EOF was processed and transfer
-        should terminate; otherwise False.
+        should terminate; otherwise False. The EOF itself is ACKed by
+        linger().
         """
         with self.lock:
             self.packets_received += 1
@@ -128,19 +210,20 @@ class ReliableUDPClient:  # pylint: disable=too-many-instance-attributes
                     self.transfer_complete = True
                     final_ack = seq_num + 3
                     self.eof_ack_num = final_ack
-                    ack_packet = self.create_ack_packet(final_ack, [])
-                    for _ in range(3):
-                        self.sock.sendto(ack_packet, self.server_addr)
                     return True
 
                 # EOF arrived out-of-order: buffer it and ack current base
                 self.recv_buffer[seq_num] = data
+                self.received_ranges.add(seq_num, seq_num + len(data))
                 self.update_sack_blocks()
                 ack_packet = self.create_ack_packet(self.recv_base, self.sack_blocks)
-                self.sock.sendto(ack_packet, self.server_addr)
+                self.send_ack_packet(ack_packet)
                 return False
 
             if seq_num == self.recv_base:
+                # with nothing buffered this is plain in-sequence data;
+                # otherwise it fills a hole and is ACKed immediately
+                in_sequence = not self.recv_buffer
                 self.write_data(data)
                 self.recv_base += len(data)
 
@@ -153,9 +236,6 @@ class ReliableUDPClient:  # pylint: disable=too-many-instance-attributes
                         self.transfer_complete = True
                         final_ack = self.recv_base + 3
                         self.eof_ack_num = final_ack
-                        ack_packet = self.create_ack_packet(final_ack, [])
-                        for _ in range(3):
-                            self.sock.sendto(ack_packet, self.server_addr)
                         return True
 
                     self.write_data(buffered_data)
@@ -164,29 +244,125 @@ class ReliableUDPClient:  # pylint: disable=too-many-instance-attributes
 
                 self.update_sack_blocks()
 
+                if in_sequence and self.delay_ack():
+                    return False
+
             elif seq_num < self.recv_base:
                 self.duplicate_packets += 1
 
             else:
                 if seq_num not in self.recv_buffer:
                     self.recv_buffer[seq_num] = data
+                    self.received_ranges.add(seq_num, seq_num + len(data))
                     self.out_of_order_packets += 1
                     self.update_sack_blocks()
                 else:
                     self.duplicate_packets += 1
 
-            ack_packet = self.create_ack_packet(self.recv_base, self.sack_blocks)
+            self.send_current_ack()
+
+            return False
+
+    def delay_ack(self):
+        """
+        Account for one in-sequence segment under the delayed-ACK policy.
+        Returns True if its ACK may be held back, False if it is due now.
+        """
+        if self.ack_policy != 'delayed':
+            return False
+        self.pending_acks += 1
+        if self.pending_acks >= self.ack_every:
+            return False
+        if self.ack_deadline is None:
+            self.ack_deadline = time.time() + self.ack_delay
+        return True
+
+    def send_current_ack(self):
+        """
+        ACK the current receive base and SACK state, clearing any delayed ACK.
+        """
+        self.pending_acks = 0
+        self.ack_deadline = None
+        ack_packet = self.create_ack_packet(self.recv_base, self.sack_blocks)
+        self.send_ack_packet(ack_packet)
+
+    def flush_delayed_ack(self):
+        """
+        Send a held-back ACK whose delay has expired.
+        """
+        with self.lock:
+            if self.ack_deadline is not None and time.time() >= self.ack_deadline:
+                self.send_current_ack()
+
+    def receive_timeout(self, idle_poll):
+        """
+        Socket timeout for the next receive: idle_poll, or less if a delayed
+        ACK falls due sooner.
+        """
+        if self.ack_deadline is None:
+            return idle_poll
+        return max(MIN_RECEIVE_TIMEOUT, min(idle_poll, self.ack_deadline - time.time()))
+
+    def send_ack_packet(self, ack_packet):
+        """
+        Send an ACK now, or queue it until flush_acks() when batching.
+        """
+        self.acks_sent += 1
+        if self.batcher:
+            self.batcher.queue([ack_packet], self.server_addr)
+        else:
             self.sock.sendto(ack_packet, self.server_addr)
 
+    def flush_acks(self):
+        """
+        Send any ACKs queued by the batched I/O layer.
+        """
+        if self.batcher:
+            self.batcher.flush()
+
+    def receive_packet(self, packet):
+        """
+        Parse and handle one datagram. Returns True once EOF is processed.
+        """
+        seq_num, data = self.parse_packet(packet)
+        if seq_num is None or data is None:
             return False
+        return self.handle_packet(seq_num, data)
+
+    def receive_batch(self):
+        """
+        Handle every further datagram already queued on the socket and flush
+        the resulting ACKs. Returns True once EOF is processed.
+        """
+        done = False
+        while not done:
+            batch = self.batcher.recv_batch()
+            for packet, _ in batch:
+                if self.receive_packet(packet):
+                    done = True
+                    break
+            if len(batch) < self.batcher.batch_size:
+                break
+        self.flush_acks()
+        return done
 
     def write_data(self, data):
         """
-        Write data to output file if open.
+        Queue in-order data for the write-behind writer, if open, and add it
+        to the digest.
+        """
+        if self.writer:
+            self.writer.write(data)
+            if self.digest:
+                self.digest.update(data)
+
+    def ack_ratio(self):
+        """
+        Return ACK datagrams sent per data packet received.
         """
-        if self.output_file:
-            self.output_file.write(data)
-            self.output_file.flush()
+        if not self.packets_received:
+            return 0.0
+        return self.acks_sent / self.packets_received
 
     def send_request(self):
         """
@@ -198,7 +374,7 @@ class ReliableUDPClient:  # pylint: disable=too-many-instance-attributes
 
         for attempt in range(max_retries):
             try:
-                self.sock.sendto(b'1', self.server_addr)
+                self.sock.sendto(self.create_request(), self.server_addr)
 
                 self.sock.settimeout(timeout)
                 packet, _ = self.sock.recvfrom(self.max_payload)
@@ -219,6 +395,27 @@ class ReliableUDPClient:  # pylint: disable=too-many-instance-attributes
         # Fallback: should not normally be reached
         raise ConnectionError("Failed to connect to server after maximum retries")
 
+    def linger(self, final_ack, duration=0.25):
+        """
+        ACK the EOF with a burst of EOF_ACK_COPIES, then stay for duration
+        seconds and ACK it again if the server retransmits it.
+        """
+        ack_packet = self.create_ack_packet(final_ack, [])
+        for _ in range(EOF_ACK_COPIES):
+            self.send_ack_packet(ack_packet)
+        self.flush_acks()
+        deadline = time.time() + duration
+        while time.time() < deadline:
+            try:
+                self.sock.settimeout(max(MIN_RECEIVE_TIMEOUT, deadline - time.time()))
+                self.sock.recvfrom(self.max_payload)
+            except (socket.timeout, BlockingIOError):
+                break
+            except OSError:
+                break
+            self.send_ack_packet(ack_packet)
+            self.flush_acks()
+
     def run(self):
         """
         Main receive loop: send request, receive packets, handle them until EOF
@@ -231,33 +428,39 @@ class ReliableUDPClient:  # pylint: disable=too-many-instance-attributes
             # keep attributes for compatibility with rest of class
             self.sock = sock
             self.output_file = output_file
+            self.writer = WriteBehindWriter(output_file, fsync=self.fsync)
+            if self.batch_io:
+                self.batcher = DatagramBatcher(sock, recv_size=self.max_payload)
 
             try:
                 first_packet = self.send_request()
 
                 self.start_time = time.time()
 
-                seq_num, data = self.parse_packet(first_packet)
-                if seq_num is not None and data is not None:
-                    self.handle_packet(seq_num, data)
+                self.receive_packet(first_packet)
+                self.flush_acks()
 
                 last_activity = time.time()
                 idle_timeout = 5.0
 
                 while not self.transfer_complete:
                     try:
-                        self.sock.settimeout(0.5)
+                        self.sock.settimeout(self.receive_timeout(0.5))
                         packet, _ = self.sock.recvfrom(self.max_payload)
 
-                        seq_num, data = self.parse_packet(packet)
-                        if seq_num is not None and data is not None:
-                            is_eof = self.handle_packet(seq_num, data)
-                            if is_eof:
-                                break
+                        is_eof = self.receive_packet(packet)
+                        if self.batcher and not is_eof:
+                            is_eof = self.receive_batch()
+                        self.flush_delayed_ack()
+                        self.flush_acks()
+                        if is_eof:
+                            break
 
                         last_activity = time.time()
 
-                    except socket.timeout:
+                    except (socket.timeout, BlockingIOError):
+                        self.flush_delayed_ack()
+                        self.flush_acks()
                         if time.time() - last_activity > idle_timeout:
                             break
                         continue
@@ -266,14 +469,12 @@ class ReliableUDPClient:  # pylint: disable=too-many-instance-attributes
                         break
 
                 if self.transfer_complete:
-                    final_ack = self.eof_ack_num if hasattr(self, 'eof_ack_num') else self.recv_base
-
-                    for _ in range(5):
-                        ack_packet = self.create_ack_packet(final_ack, [])
-                        self.sock.sendto(ack_packet, self.server_addr)
-                        time.sleep(0.05)
+                    self.linger(self.eof_ack_num)
 
             finally:
+                # drain the write-behind pipeline before the file is closed
+                self.writer.close()
+                self.writer = None
                 # clear references; actual closing is handled by context managers
                 self.output_file = None
                 self.sock = None
@@ -283,14 +484,43 @@ def main():
     """
     Entry point: expects server IP and port as command-line arguments.
     """
-    if len(sys.argv) != 3:
-        sys.exit(1)
-
-    server_ip = sys.argv[1]
-    server_port = int(sys.argv[2])
-
-    client = ReliableUDPClient(server_ip, server_port)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('server_ip')
+    parser.add_argument('server_port', type=int)
+    parser.add_argument('--batch-io', action='store_true',
+                        help='drain datagrams and flush ACKs in batches '
+                             '(recvmmsg/sendmmsg where available)')
+    parser.add_argument('--sack-blocks', type=int, default=LEGACY_SACK_BLOCKS,
+                        help=f'SACK blocks per ACK, 1-{MAX_SACK_BLOCKS} '
+                             f'(default: {LEGACY_SACK_BLOCKS}, the 20-byte legacy ACK)')
+    parser.add_argument('--ack-policy', choices=('immediate', 'delayed'), default='immediate',
+                        help='ACK every packet, or delay ACKs for in-sequence data '
+                             '(out-of-order data and hole fills are always ACKed at once)')
+    parser.add_argument('--ack-every', type=int, default=2,
+                        help='with delayed ACKs, ACK at least every N in-sequence segments')
+    parser.add_argument('--ack-delay', type=float, default=0.02,
+                        help='with delayed ACKs, maximum time to hold an ACK in seconds')
+    parser.add_argument('--fsync', action='store_true',
+                        help='fsync received_data.txt before exiting')
+    parser.add_argument('--stats', action='store_true',
+                        help='print packet and ACK counters when the transfer ends')
+    parser.add_argument('--digest', choices=ALGORITHMS + ('none',), default=DEFAULT_ALGORITHM,
+                        help='hash received_data.txt as it is written and print the digest '
+                             'of a completed transfer')
+    args = parser.parse_args()
+
+    client = ReliableUDPClient(args.server_ip, args.server_port, batch_io=args.batch_io,
+                               sack_blocks=args.sack_blocks, ack_policy=args.ack_policy,
+                               ack_every=args.ack_every, ack_delay=args.ack_delay,
+                               fsync=args.fsync,
+                               digest=None if args.digest == 'none' else args.digest)
     client.run()
+    if client.digest and client.transfer_complete:
+        print(f"Digest {client.digest.algorithm}: {client.digest.hexdigest()}")
+    if args.stats:
+        print(f"Data packets received: {client.packets_received}, "
+              f"ACKs sent: {client.acks_sent}, "
+              f"ACKs per data packet: {client.ack_ratio():.3f}")
 
 
 if __name__ == "__main__":
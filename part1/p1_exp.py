@@ -1,14 +1,25 @@
-from mininet.topo import Topo
-from mininet.net import Mininet
-from mininet.link import TCLink
-from mininet.node import RemoteController
-from mininet.cli import CLI
-from mininet.log import setLogLevel
-from mininet.node import Controller
-
 import time, re, os
 import sys
-import hashlib
+import itertools
+
+# Mininet is only needed by the default backend; '--backend local' runs the
+# same topology through link_emulator.py without it (or root)
+try:
+    from mininet.topo import Topo
+    from mininet.net import Mininet
+    from mininet.link import TCLink
+    from mininet.node import RemoteController
+    from mininet.cli import CLI
+    from mininet.log import setLogLevel
+    from mininet.node import Controller
+except ImportError:
+    Topo = object
+    Mininet = None
+
+# Modules shared by Part 1 and Part 2
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+from digest import file_digest
+from link_emulator import EmulatedNetwork
 
 
 class CustomTopo(Topo):
@@ -27,31 +38,63 @@ class CustomTopo(Topo):
         self.addLink(h2, s1, loss=0)
 
 
-def compute_md5(file_path):
-    hasher = hashlib.md5()
-    try:
-        with open(file_path, "rb") as file:
-            # Read the file in chunks to avoid using too much memory for large files
-            while chunk := file.read(8192):
-                hasher.update(chunk)
-        return hasher.hexdigest()
-    except FileNotFoundError:
+def output_md5(client_output, file_path):
+    """MD5 of the received file: as printed by a client that completed the
+    transfer, otherwise hashed from the file itself"""
+    match = re.search(r"^Digest md5: ([0-9a-f]{32})\s*$", client_output or "", re.MULTILINE)
+    if match:
+        return match.group(1)
+    md5_hash = file_digest(file_path, "md5")
+    if md5_hash is None:
         print(f"File not found: {file_path}")
-        return None
+    return md5_hash
 
 
-def run(expname):
-    # Set the log level to info to see detailed output
-    setLogLevel("info")
+def start_network(backend, loss, delay, jitter, server_port):
+    """Start the two-host topology on the selected backend"""
+    if backend == "local":
+        # h2 -> s1 has no impairment: one route through the lossy h1 link
+        net = EmulatedNetwork([(server_port, 0, 0)], delay=delay, jitter=jitter, loss=loss,
+                              log_path="/tmp/link_emulator.out")
+        net.start()
+        return net
 
     # IP and port of the remote controller
     controller_ip = "127.0.0.1"
     controller_port = 6653
 
-    # Output file
-    output_file = f"reliability_{expname}.csv"
+    # Create the custom topology with the specified loss, delay and jitter
+    topo = CustomTopo(loss=loss, delay=delay, jitter=jitter)
+
+    # Initialize the network with the custom topology and TCLink for link configuration
+    net = Mininet(topo=topo, link=TCLink, controller=None)
+    # Add the remote controller to the network
+    remote_controller = RemoteController(
+        "c0", ip=controller_ip, port=controller_port
+    )
+    net.addController(remote_controller)
+
+    # Start the network
+    net.start()
+    return net
+
+
+def run(expname, backend="mininet"):
+    if backend == "mininet":
+        if Mininet is None:
+            print("Mininet is not installed; use --backend local")
+            return
+        # Set the log level to info to see detailed output
+        setLogLevel("info")
+
+    # Output file (local-backend results are kept apart from Mininet ones)
+    suffix = "_local" if backend == "local" else ""
+    output_file = f"reliability_{expname}{suffix}.csv"
     f_out = open(output_file, "w")
-    f_out.write("iteration,loss,delay,jitter,md5_hash,ttc\n")
+    if expname == "sack":
+        f_out.write("iteration,loss,delay,jitter,sack_blocks,md5_hash,ttc\n")
+    else:
+        f_out.write("iteration,loss,delay,jitter,md5_hash,ttc\n")
 
     SERVER_IP = "10.0.0.1"
     SERVER_PORT = 6555
@@ -60,6 +103,8 @@ def run(expname):
     NUM_ITERATIONS = 5
     OUTFILE = "received_data.txt"
     delay_list, loss_list, jitter_list = [], [], []
+    # SACK blocks per ACK; 2 is the legacy 20-byte ACK
+    sack_list = [2]
 
     if expname == "loss":
         loss_list = [x for x in range(1, 6)]
@@ -69,56 +114,69 @@ def run(expname):
         delay_list = [20]
         loss_list = [1]
         jitter_list = [20, 40, 60, 80, 100]
+    elif expname == "sack":
+        # time-to-completion vs loss for different SACK block counts
+        loss_list = [x for x in range(1, 6)]
+        delay_list = [20]
+        jitter_list = [0]
+        sack_list = [2, 4, 8, 16]
     else:
-        print("Unknown experiment name. Use 'loss' or 'jitter'.")
+        print("Unknown experiment name. Use 'loss', 'jitter' or 'sack'.")
         f_out.close()
         return
 
     print(
-        "Loss list:", loss_list, "Delay list:", delay_list, "Jitter list:", jitter_list
+        "Loss list:", loss_list, "Delay list:", delay_list, "Jitter list:", jitter_list,
+        "SACK blocks:", sack_list
     )
 
     for LOSS in loss_list:
         for DELAY in delay_list:
-            for JITTER in jitter_list:
+            for JITTER, SACK_BLOCKS in itertools.product(jitter_list, sack_list):
                 for i in range(0, NUM_ITERATIONS):
                     print(
-                        f"\n--- Running topology with {LOSS}% packet loss, base delay {DELAY}ms and jitter {JITTER}ms (iter {i+1}/{NUM_ITERATIONS})"
+                        f"\n--- Running topology with {LOSS}% packet loss, base delay {DELAY}ms and jitter {JITTER}ms, {SACK_BLOCKS} SACK blocks (iter {i+1}/{NUM_ITERATIONS})"
                     )
 
                     os.system(f"rm -f {OUTFILE}")
 
-                    # Create the custom topology with the specified loss, delay and jitter
-                    topo = CustomTopo(loss=LOSS, delay=DELAY, jitter=JITTER)
-
-                    # Initialize the network with the custom topology and TCLink for link configuration
-                    net = Mininet(topo=topo, link=TCLink, controller=None)
-                    # Add the remote controller to the network
-                    remote_controller = RemoteController(
-                        "c0", ip=controller_ip, port=controller_port
-                    )
-                    net.addController(remote_controller)
-
-                    # Start the network
-                    net.start()
+                    net = start_network(backend, LOSS, DELAY, JITTER, SERVER_PORT)
 
                     # Get references to h1 and h2
                     h1 = net.get("h1")
                     h2 = net.get("h2")
 
+                    # The client reaches the server directly, or through the emulator
+                    if backend == "local":
+                        server_ip = h1.IP()
+                        client_ip, client_port = net.address(SERVER_PORT)
+                    else:
+                        server_ip, client_ip, client_port = SERVER_IP, SERVER_IP, SERVER_PORT
+
                     start_time = time.time()
 
-                    h1.cmd(f"python3 p1_server.py {SERVER_IP} {SERVER_PORT} {SWS} &")
-                    result = h2.cmd(f"python3 p1_client.py {SERVER_IP} {SERVER_PORT}")
+                    server_pid_raw = h1.cmd(
+                        f"bash -c 'python3 p1_server.py {server_ip} {SERVER_PORT} {SWS} > /dev/null 2>&1 & echo $!'"
+                    ).strip()
+                    server_pid = server_pid_raw.split()[0] if server_pid_raw else None
+                    result = h2.cmd(
+                        f"python3 p1_client.py {client_ip} {client_port} --sack-blocks {SACK_BLOCKS}"
+                    )
                     end_time = time.time()
                     ttc = end_time - start_time
 
-                    md5_hash = compute_md5(OUTFILE)
+                    md5_hash = output_md5(result, OUTFILE)
                     # write the result to a file
-                    f_out.write(f"{i},{LOSS},{DELAY},{JITTER},{md5_hash},{ttc}\n")
+                    if expname == "sack":
+                        f_out.write(f"{i},{LOSS},{DELAY},{JITTER},{SACK_BLOCKS},{md5_hash},{ttc}\n")
+                    else:
+                        f_out.write(f"{i},{LOSS},{DELAY},{JITTER},{md5_hash},{ttc}\n")
                     f_out.flush()
 
-                    # Stop the network
+                    # Stop the server by PID (a client that failed or timed out can
+                    # leave it holding SERVER_PORT), then the network
+                    if server_pid:
+                        h1.cmd(f"kill {server_pid} 2>/dev/null || true")
                     net.stop()
 
                     # Small pause before next iteration
@@ -129,8 +187,13 @@ def run(expname):
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python experiment.py <expname>")
+    args = sys.argv[1:]
+    backend = "mininet"
+    if len(args) == 3 and args[1] == "--backend":
+        backend = args[2]
+        args = args[:1]
+    if len(args) != 1 or backend not in ("mininet", "local"):
+        print("Usage: python experiment.py <expname> [--backend mininet|local]")
     else:
-        expname = sys.argv[1].lower()
-        run(expname)
+        expname = args[0].lower()
+        run(expname, backend)
@@ -5,11 +5,12 @@ Generates plots for Assignment 4, Part 1 analysis from a CSV file.
 Usage:
     python3 p1_plot.py <exp_name>
 
-Where <exp_name> is either 'loss' or 'jitter'.
+Where <exp_name> is 'loss', 'jitter' or 'sack'.
 
 This script expects to find:
 - 'reliability_loss.csv' if exp_name is 'loss'
 - 'reliability_jitter.csv' if exp_name is 'jitter'
+- 'reliability_sack.csv' if exp_name is 'sack' (one line per SACK block count)
 """
 
 import sys
@@ -63,7 +64,7 @@ def main():
     # --- 1. Parse Command-Line Arguments ---
     if len(sys.argv) != 2:
         print(f"Usage: python3 {sys.argv[0]} <exp_name>", file=sys.stderr)
-        print("  <exp_name> must be 'loss' or 'jitter'", file=sys.stderr)
+        print("  <exp_name> must be 'loss', 'jitter' or 'sack'", file=sys.stderr)
         sys.exit(1)
         
     exp_name = sys.argv[1]
@@ -81,8 +82,14 @@ def main():
         x_label = 'Delay Jitter (ms)'
         title = 'Download Time vs. Delay Jitter'
         output_file = 'jitter_vs_time.png'
+    elif exp_name == 'sack':
+        input_file = 'reliability_sack.csv'
+        x_column = 'loss'
+        x_label = 'Packet Loss Rate (%)'
+        title = 'Download Time vs. Packet Loss per SACK Block Count'
+        output_file = 'sack_vs_time.png'
     else:
-        print(f"Error: Unknown exp_name '{exp_name}'. Must be 'loss' or 'jitter'.", file=sys.stderr)
+        print(f"Error: Unknown exp_name '{exp_name}'. Must be 'loss', 'jitter' or 'sack'.", file=sys.stderr)
         sys.exit(1)
 
     # --- 3. Read and Process Data ---
@@ -96,33 +103,41 @@ def main():
         print(f"Error reading CSV file: {e}", file=sys.stderr)
         sys.exit(1)
 
-    # Group data by the x-axis column (loss or jitter)
-    grouped = df.groupby(x_column)
-    
-    x_values = []
-    means = []
-    errors = []
-
-    # Calculate mean and CI for each group
-    # We sort the keys to ensure the plot's x-axis is in order
-    for x_val in sorted(grouped.groups.keys()):
-        group = grouped.get_group(x_val)
-        
-        # Get the list of Time-To-Completion (ttc) values for this group
-        ttc_data = group['ttc'].tolist()
-        
-        mean, error_margin = calculate_ci(ttc_data)
-        
-        x_values.append(x_val)
-        means.append(mean)
-        errors.append(error_margin)
+    # One line per SACK block count for the sack experiment, else a single line
+    if 'sack_blocks' in df.columns:
+        series = [(f'{n} SACK blocks (90% CI)', df[df['sack_blocks'] == n])
+                  for n in sorted(df['sack_blocks'].unique())]
+    else:
+        series = [('Mean Time (90% CI)', df)]
 
     # --- 4. Generate the Plot ---
     plt.figure(figsize=(10, 6))
-    
-    # Plot the mean line with markers and error bars
-    plt.errorbar(x_values, means, yerr=errors, linestyle='-',
-                 marker='o', capsize=5, label='Mean Time (90% CI)')
+
+    for label, series_df in series:
+        # Group data by the x-axis column (loss or jitter)
+        grouped = series_df.groupby(x_column)
+
+        x_values = []
+        means = []
+        errors = []
+
+        # Calculate mean and CI for each group
+        # We sort the keys to ensure the plot's x-axis is in order
+        for x_val in sorted(grouped.groups.keys()):
+            group = grouped.get_group(x_val)
+
+            # Get the list of Time-To-Completion (ttc) values for this group
+            ttc_data = group['ttc'].tolist()
+
+            mean, error_margin = calculate_ci(ttc_data)
+
+            x_values.append(x_val)
+            means.append(mean)
+            errors.append(error_margin)
+
+        # Plot the mean line with markers and error bars
+        plt.errorbar(x_values, means, yerr=errors, linestyle='-',
+                     marker='o', capsize=5, label=label)
     
     # --- Formatting ---
     plt.title(title, fontsize=16)
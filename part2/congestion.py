@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Congestion controllers for the Part 2 server.
+
+A controller owns the congestion window (and the slow start threshold) of
+one transfer. The server keeps loss detection -- duplicate ACK counting,
+fast recovery and retransmission timers -- and tells the controller what
+happened through a small set of events:
+
+    on_ack(bytes_acked, now, rtt, bytes_in_flight)  new cumulative ACK
+    on_dup_ack(now)                                  duplicate ACK in fast recovery
+    on_loss(now, bytes_in_flight)                    fast retransmit (3rd duplicate ACK)
+    on_recovery_exit(now)                            first new ACK after fast recovery
+    on_timeout(now)                                  retransmission timeout
+
+cwnd and ssthresh are in bytes; rtt is an RTT sample in seconds, or None
+when the ACK carried none. pacing_rate() returns the rate in bytes per
+second the controller wants packets spaced at, or None for no pacing.
+
+Controllers are selected by name through make_controller(): 'reno' (the
+original behaviour), 'cubic' (RFC 8312) and 'bbr' (a delivery-rate-based
+controller modelled on BBR v1).
+"""
+
+import abc
+import collections
+import math
+
+
+class CongestionController(abc.ABC):
+    """Base class: Reno-style slow start and fast recovery window inflation."""
+
+    name = None
+
+    def __init__(self, mss, initial_ssthresh=64000):
+        self.mss = mss
+        self.cwnd = mss  # Start with 1 MSS
+        self.ssthresh = initial_ssthresh
+        self.in_slow_start = True
+
+    def slow_start(self, bytes_acked):
+        """Grow cwnd by bytes_acked, leaving slow start at ssthresh"""
+        self.cwnd += bytes_acked
+        if self.cwnd >= self.ssthresh:
+            self.in_slow_start = False
+            print(f"Exiting slow start at cwnd={self.cwnd:.0f}, ssthresh={self.ssthresh}")
+
+    @abc.abstractmethod
+    def on_ack(self, bytes_acked, now, rtt=None, bytes_in_flight=0):
+        """New cumulative ACK outside fast recovery"""
+
+    def on_dup_ack(self, now):
+        """Duplicate ACK during fast recovery: inflate cwnd by one MSS"""
+        self.cwnd += self.mss
+
+    @abc.abstractmethod
+    def on_loss(self, now, bytes_in_flight):
+        """Fast retransmit: shrink the window and enter fast recovery"""
+
+    def on_recovery_exit(self, now):
+        """Leaving fast recovery: deflate cwnd back to ssthresh"""
+        self.cwnd = self.ssthresh
+
+    def on_timeout(self, now):
+        """Retransmission timeout: severe congestion, restart from 1 MSS"""
+        self.ssthresh = max(self.cwnd / 2, 2 * self.mss)
+        self.cwnd = self.mss
+        self.in_slow_start = True
+
+    def pacing_rate(self):
+        """Pacing rate in bytes/s, or None to send as fast as the window allows"""
+        return None
+
+
+class RenoController(CongestionController):
+    """TCP Reno: slow start, AIMD congestion avoidance, fast recovery."""
+
+    name = 'reno'
+
+    def on_ack(self, bytes_acked, now, rtt=None, bytes_in_flight=0):
+        """Slow start below ssthresh, else about one MSS per RTT"""
+        if self.in_slow_start:
+            # Slow Start: increase by bytes_acked (exponential growth)
+            self.slow_start(bytes_acked)
+        else:
+            # Congestion Avoidance: increase by MSS * (bytes_acked / cwnd)
+            # This gives approximately MSS per RTT
+            self.cwnd += self.mss * bytes_acked / self.cwnd
+
+    def on_loss(self, now, bytes_in_flight):
+        """Halve the window, inflated by the three duplicate ACKs"""
+        self.ssthresh = max(self.cwnd / 2, 2 * self.mss)
+        self.cwnd = self.ssthresh + 3 * self.mss
+        self.in_slow_start = False
+
+
+class CubicController(CongestionController):
+    """CUBIC (RFC 8312): window growth is a cubic function of time since the
+    last reduction, centred on the window where that loss happened, so it
+    regains a large window in a few RTTs regardless of the RTT itself.
+    """
+
+    name = 'cubic'
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self, mss, initial_ssthresh=64000):
+        super().__init__(mss, initial_ssthresh)
+        self.w_max = 0.0         # window (segments) before the last reduction
+        self.epoch_start = None  # start of the current growth epoch
+        self.k = 0.0             # seconds from epoch start to reach w_origin
+        self.w_origin = 0.0      # plateau of the cubic curve (segments)
+        self.w_est = 0.0         # Reno-equivalent window (segments)
+        self.rtt = 0.0
+
+    def on_ack(self, bytes_acked, now, rtt=None, bytes_in_flight=0):
+        """Grow towards the cubic curve one RTT ahead, never slower than Reno"""
+        if rtt:
+            self.rtt = rtt
+        if self.in_slow_start:
+            self.slow_start(bytes_acked)
+            return
+
+        cwnd_seg = self.cwnd / self.mss
+        if self.epoch_start is None:
+            self.epoch_start = now
+            if cwnd_seg < self.w_max:
+                self.k = ((self.w_max - cwnd_seg) / self.C) ** (1 / 3)
+                self.w_origin = self.w_max
+            else:
+                self.k = 0.0
+                self.w_origin = cwnd_seg
+            self.w_est = cwnd_seg
+
+        # Target one RTT ahead on the cubic curve
+        target = self.w_cubic(now - self.epoch_start + self.rtt)
+
+        # TCP-friendly region: never grow slower than Reno would
+        acked_seg = bytes_acked / self.mss
+        self.w_est += 3 * (1 - self.BETA) / (1 + self.BETA) * acked_seg / cwnd_seg
+        target = min(max(target, self.w_est), 1.5 * cwnd_seg)
+
+        if target > cwnd_seg:
+            self.cwnd += self.mss * (target - cwnd_seg) / cwnd_seg * acked_seg
+        else:
+            # At or above the target: creep up very slowly
+            self.cwnd += self.mss * acked_seg / (100 * cwnd_seg)
+
+    def w_cubic(self, t):
+        """Window (segments) on the cubic curve t seconds into the epoch"""
+        return self.w_origin + self.C * (t - self.k) ** 3
+
+    def reduce(self):
+        """Record w_max (with fast convergence) and start a new epoch"""
+        cwnd_seg = self.cwnd / self.mss
+        if cwnd_seg < self.w_max:
+            # Loss before regaining the previous maximum: release bandwidth
+            self.w_max = cwnd_seg * (1 + self.BETA) / 2
+        else:
+            self.w_max = cwnd_seg
+        self.epoch_start = None
+        self.ssthresh = max(self.cwnd * self.BETA, 2 * self.mss)
+
+    def on_loss(self, now, bytes_in_flight):
+        """Reduce by BETA, inflated by the three duplicate ACKs"""
+        self.reduce()
+        self.cwnd = self.ssthresh + 3 * self.mss
+        self.in_slow_start = False
+
+    def on_timeout(self, now):
+        """Reduce by BETA and restart slow start from one MSS"""
+        self.reduce()
+        self.cwnd = self.mss
+        self.in_slow_start = True
+
+
+class BBRController(CongestionController):
+    """Delivery-rate-based controller modelled on BBR v1.
+
+    Estimates the bottleneck bandwidth (windowed maximum of per-round
+    delivery rate samples) and the propagation delay (windowed minimum RTT),
+    and sizes cwnd to a multiple of their product instead of reacting to
+    loss. Modes: STARTUP (double the rate each round until bandwidth stops
+    growing), DRAIN (empty the queue STARTUP built), PROBE_BW (cycle the
+    pacing gain around 1) and PROBE_RTT (briefly shrink to 4 segments to
+    re-measure the minimum RTT).
+    """
+
+    name = 'bbr'
+
+    STARTUP_GAIN = 2 / math.log(2)
+    DRAIN_GAIN = 1 / STARTUP_GAIN
+    CWND_GAIN = 2.0
+    PROBE_BW_GAINS = (1.25, 0.75, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0)
+    BW_WINDOW_ROUNDS = 10
+    MIN_RTT_WINDOW = 10.0
+    PROBE_RTT_DURATION = 0.2
+    MIN_CWND_SEGMENTS = 4
+
+    def __init__(self, mss, initial_ssthresh=64000):
+        super().__init__(mss, initial_ssthresh)
+        self.ssthresh = float('inf')  # not used: BBR does not react to loss
+        self.cwnd = self.MIN_CWND_SEGMENTS * mss
+        self.mode = 'STARTUP'
+
+        # Delivery rate estimation, one sample per round trip
+        self.delivered = 0
+        self.round_count = 0
+        self.round_start_time = None
+        self.round_start_delivered = 0
+        self.bw_samples = collections.deque()  # (round, bytes/s)
+        self.btl_bw = 0.0
+
+        # Propagation delay estimation
+        self.min_rtt = None
+        self.min_rtt_stamp = 0.0
+
+        # STARTUP exit detection
+        self.full_bw = 0.0
+        self.full_bw_rounds = 0
+        self.filled_pipe = False
+
+        # PROBE_BW gain cycling and PROBE_RTT
+        self.cycle_index = 0
+        self.cycle_stamp = 0.0
+        self.probe_rtt_end = None
+
+    def bdp(self):
+        """Estimated bandwidth-delay product in bytes"""
+        if not self.btl_bw or not self.min_rtt:
+            return 0.0
+        return self.btl_bw * self.min_rtt
+
+    def pacing_gain(self):
+        """Multiplier on btl_bw for the current mode and PROBE_BW phase"""
+        if self.mode == 'STARTUP':
+            return self.STARTUP_GAIN
+        if self.mode == 'DRAIN':
+            return self.DRAIN_GAIN
+        if self.mode == 'PROBE_BW':
+            return self.PROBE_BW_GAINS[self.cycle_index]
+        return 1.0
+
+    def pacing_rate(self):
+        """Pacing gain times the bandwidth estimate, or None before the first sample"""
+        if not self.btl_bw:
+            return None
+        return self.pacing_gain() * self.btl_bw
+
+    def update_min_rtt(self, rtt, now):
+        """Take rtt as the propagation delay if it is a new minimum"""
+        if rtt is None or rtt <= 0:
+            return
+        if self.min_rtt is None or rtt <= self.min_rtt:
+            self.min_rtt = rtt
+            self.min_rtt_stamp = now
+
+    def update_btl_bw(self, now):
+        """Close the round once a min RTT has passed and take a rate sample"""
+        if self.round_start_time is None:
+            self.round_start_time = now
+            return False
+        elapsed = now - self.round_start_time
+        if not self.min_rtt or elapsed < self.min_rtt:
+            return False
+
+        rate = (self.delivered - self.round_start_delivered) / elapsed
+        self.round_count += 1
+        self.round_start_time = now
+        self.round_start_delivered = self.delivered
+
+        self.bw_samples.append((self.round_count, rate))
+        while self.bw_samples[0][0] <= self.round_count - self.BW_WINDOW_ROUNDS:
+            self.bw_samples.popleft()
+        self.btl_bw = max(sample for _, sample in self.bw_samples)
+        return True
+
+    def check_full_pipe(self):
+        """STARTUP ends after three rounds without 25% bandwidth growth"""
+        if self.filled_pipe:
+            return
+        if self.btl_bw >= self.full_bw * 1.25:
+            self.full_bw = self.btl_bw
+            self.full_bw_rounds = 0
+            return
+        self.full_bw_rounds += 1
+        if self.full_bw_rounds >= 3:
+            self.filled_pipe = True
+
+    def update_mode(self, now, bytes_in_flight):
+        """Move between STARTUP, DRAIN, PROBE_BW and PROBE_RTT"""
+        if self.mode == 'STARTUP' and self.filled_pipe:
+            self.mode = 'DRAIN'
+            self.in_slow_start = False
+        if self.mode == 'DRAIN' and bytes_in_flight <= self.bdp():
+            self.enter_probe_bw(now)
+        if self.mode == 'PROBE_BW' and self.min_rtt and now - self.cycle_stamp > self.min_rtt:
+            self.cycle_index = (self.cycle_index + 1) % len(self.PROBE_BW_GAINS)
+            self.cycle_stamp = now
+
+        if self.mode != 'PROBE_RTT' and self.min_rtt is not None \
+                and now - self.min_rtt_stamp > self.MIN_RTT_WINDOW:
+            self.mode = 'PROBE_RTT'
+            self.probe_rtt_end = now + max(self.PROBE_RTT_DURATION, self.min_rtt)
+        elif self.mode == 'PROBE_RTT' and now >= self.probe_rtt_end:
+            # Whatever the minimum is now, it has just been re-measured
+            self.min_rtt_stamp = now
+            if self.filled_pipe:
+                self.enter_probe_bw(now)
+            else:
+                self.mode = 'STARTUP'
+
+    def enter_probe_bw(self, now):
+        """Start PROBE_BW at the first phase of the gain cycle"""
+        self.mode = 'PROBE_BW'
+        self.cycle_index = 0
+        self.cycle_stamp = now
+
+    def update_cwnd(self, bytes_acked):
+        """Grow cwnd towards the mode's gain times the BDP, never below 4 segments"""
+        min_cwnd = self.MIN_CWND_SEGMENTS * self.mss
+        if self.mode == 'PROBE_RTT':
+            self.cwnd = min_cwnd
+            return
+        gain = self.STARTUP_GAIN if self.mode == 'STARTUP' else self.CWND_GAIN
+        target = gain * self.bdp()
+        if self.filled_pipe:
+            self.cwnd = min(self.cwnd + bytes_acked, target)
+        elif not target or self.cwnd < target:
+            self.cwnd += bytes_acked
+        self.cwnd = max(self.cwnd, min_cwnd)
+
+    def on_ack(self, bytes_acked, now, rtt=None, bytes_in_flight=0):
+        """Update the path model from a delivery, then the mode and cwnd"""
+        self.delivered += bytes_acked
+        self.update_min_rtt(rtt, now)
+        if self.update_btl_bw(now):
+            self.check_full_pipe()
+        self.update_mode(now, bytes_in_flight)
+        self.update_cwnd(bytes_acked)
+
+    def on_dup_ack(self, now):
+        """No inflation: the window follows the model, not the loss signal"""
+
+    def on_loss(self, now, bytes_in_flight):
+        """Cap cwnd at what is in flight plus one MSS"""
+        # Packet conservation: do not grow into the loss, keep what is in flight
+        self.cwnd = max(min(self.cwnd, bytes_in_flight + self.mss),
+                        self.MIN_CWND_SEGMENTS * self.mss)
+
+    def on_recovery_exit(self, now):
+        """Keep cwnd: there is no inflated window to deflate"""
+
+    def on_timeout(self, now):
+        """Fall back to the minimum window of 4 segments"""
+        # Restart from the minimum window; on_ack regrows it towards the model
+        self.cwnd = self.MIN_CWND_SEGMENTS * self.mss
+
+
+CONTROLLERS = {cls.name: cls for cls in (RenoController, CubicController, BBRController)}
+
+
+def make_controller(name, mss):
+    """Return a new controller instance for the given algorithm name"""
+    try:
+        return CONTROLLERS[name](mss)
+    except KeyError:
+        raise ValueError(f"Unknown congestion control algorithm: {name}") from None
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+asyncio transport for the Part 2 transfer protocol.
+
+The blocking server and client run their own select()/recvfrom() loops.
+Here the same protocol state machines -- MultiSessionServer sessions and
+ReliableUDPClient -- are driven from asyncio.DatagramProtocol callbacks,
+with loop.call_at() timers for retransmission timeouts, pacing, EOF
+retries, request retries and delayed ACKs, so any number of transfers can
+share one event loop with other asyncio code:
+
+    await serve('0.0.0.0', 6555, 'data.txt', max_sessions=4, cc='cubic')
+    stats = await download('10.0.0.1', 6555, 'a_', sparse=True)
+
+uvloop is used automatically by run() (and the command line below) when it
+is installed.
+
+Usage:
+    python3 p2_async.py serve <SERVER_IP> <SERVER_PORT> [options]
+    python3 p2_async.py download <SERVER_IP> <SERVER_PORT> <PREF_FILENAME> [options]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+
+# Modules shared by Part 1 and Part 2
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+from congestion import CONTROLLERS
+from digest import ALGORITHMS
+from p2_client import DEFAULT_SACK_BLOCKS, ReliableUDPClient
+from p2_server import MultiSessionServer
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+class TransportSocket:
+    """The sendto() subset of a socket, backed by an asyncio datagram transport"""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def sendto(self, data, addr):
+        self.transport.sendto(data, addr)
+
+
+class ServerProtocol(asyncio.DatagramProtocol):
+    """Runs a MultiSessionServer on datagram callbacks and a single timer."""
+
+    def __init__(self, server_ip, server_port, file_path, max_sessions, options):
+        self.loop = asyncio.get_running_loop()
+        self.server_ip = server_ip
+        self.server_port = server_port
+        self.file_path = file_path
+        self.max_sessions = max_sessions
+        self.options = options
+        self.server = None
+        self.timer = None
+        self.done = self.loop.create_future()
+
+    def connection_made(self, transport):
+        self.server = MultiSessionServer(self.server_ip, self.server_port,
+                                         file_path=self.file_path,
+                                         max_sessions=self.max_sessions,
+                                         sock=TransportSocket(transport), **self.options)
+
+    def datagram_received(self, packet, addr):
+        if self.done.done():
+            return
+        self.server.dispatch(packet, addr)
+        self.step()
+
+    def error_received(self, exc):
+        print(f"Error receiving packet: {exc}")
+
+    def connection_lost(self, exc):
+        if self.timer is not None:
+            self.timer.cancel()
+        if not self.done.done():
+            self.done.set_result(self.server.completed if self.server else 0)
+
+    def on_timer(self):
+        self.timer = None
+        self.server.handle_timeouts()
+        self.step()
+
+    def step(self):
+        """Send what the windows allow, then re-arm the timer for the next deadline"""
+        self.server.schedule_sends()
+        if not self.server.serving():
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self.done.set_result(self.server.completed)
+            return
+        if self.timer is not None:
+            self.timer.cancel()
+        self.timer = self.loop.call_at(self.loop.time() + self.server.next_timeout(),
+                                       self.on_timer)
+
+
+class ClientProtocol(asyncio.DatagramProtocol):
+    """Runs one ReliableUDPClient download on datagram callbacks and timers."""
+
+    MAX_RETRIES = 5
+    RETRY_TIMEOUT = 2.0
+
+    def __init__(self, server_ip, server_port, pref_filename, options):
+        self.loop = asyncio.get_running_loop()
+        self.server_ip = server_ip
+        self.server_port = server_port
+        self.pref_filename = pref_filename
+        self.options = options
+        self.client = None
+        self.started = False
+        self.attempts = 0
+        self.retry_timer = None
+        self.ack_timer = None
+        self.start_time = None
+        self.done = self.loop.create_future()
+
+    def connection_made(self, transport):
+        self.client = ReliableUDPClient(self.server_ip, self.server_port, self.pref_filename,
+                                        sock=TransportSocket(transport), **self.options)
+        self.send_request()
+
+    def send_request(self):
+        """Send (or resend) the file request until the server answers"""
+        self.retry_timer = None
+        if self.attempts >= self.MAX_RETRIES:
+            self.finish(ConnectionError(
+                f"Failed to connect to server after {self.MAX_RETRIES} attempts"))
+            return
+        self.attempts += 1
+        self.client.sock.sendto(self.client.request_packet(), self.client.server_addr)
+        self.retry_timer = self.loop.call_at(self.loop.time() + self.RETRY_TIMEOUT,
+                                             self.send_request)
+
+    def datagram_received(self, packet, addr):
+        client = self.client
+        if addr != client.server_addr or self.done.done():
+            return
+
+        if not self.started:
+            self.started = True
+            self.retry_timer.cancel()
+            self.retry_timer = None
+            self.start_time = time.time()
+            if client.open_output(packet):
+                return  # metadata only
+
+        seq, timestamp, data = client.parse_packet(packet)
+        if seq is None:
+            return
+        if client.handle_packet(seq, timestamp, data):
+            self.finish()
+        elif client.ack_deadline is not None and self.ack_timer is None:
+            self.ack_timer = self.loop.call_at(self.loop.time() + client.receive_timeout(),
+                                               self.on_ack_timer)
+
+    def error_received(self, exc):
+        print(f"Error: {exc}")
+
+    def connection_lost(self, exc):
+        if not self.done.done():
+            self.finish(exc or ConnectionError("Transport closed before the transfer finished"))
+
+    def on_ack_timer(self):
+        self.ack_timer = None
+        self.client.flush_delayed_ack()
+        if self.client.ack_deadline is not None:
+            self.ack_timer = self.loop.call_at(self.loop.time() + self.client.receive_timeout(),
+                                               self.on_ack_timer)
+
+    def finish(self, error=None):
+        """Stop the timers, close the output file and resolve the download"""
+        for timer in (self.retry_timer, self.ack_timer):
+            if timer is not None:
+                timer.cancel()
+        self.retry_timer = self.ack_timer = None
+        if self.client is not None:
+            self.client.close_output()
+        if error is not None:
+            self.done.set_exception(error)
+            return
+        client = self.client
+        elapsed = time.time() - self.start_time
+        self.done.set_result({
+            'output': f"{self.pref_filename}received_data.txt",
+            'bytes': client.total_bytes_received,
+            'packets': client.total_packets_received,
+            'acks': client.total_acks_sent,
+            'duplicates': client.duplicate_packets,
+            'seconds': elapsed,
+            'digest': client.digest.hexdigest() if client.digest else None,
+        })
+
+
+async def serve(server_ip, server_port, file_path='data.txt', max_sessions=None, **options):
+    """Serve file_path to every client that asks, until max_sessions transfers
+    have completed (forever if None). options are MultiSessionServer keyword
+    arguments (quantum, cc, pacing, pacing_gain, sack, trace). Returns the number
+    of completed transfers."""
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: ServerProtocol(server_ip, server_port, file_path, max_sessions, options),
+        local_addr=(server_ip, server_port))
+    try:
+        return await protocol.done
+    finally:
+        transport.close()
+        protocol.server.close_sessions()
+
+
+async def download(server_ip, server_port, pref_filename, **options):
+    """Download the server's file to <pref_filename>received_data.txt.
+    options are ReliableUDPClient keyword arguments (ack_policy, ack_every,
+    ack_delay, sparse, sack_blocks, digest). Returns a dict of transfer statistics."""
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: ClientProtocol(server_ip, server_port, pref_filename, options),
+        family=socket.AF_INET)
+    try:
+        return await protocol.done
+    finally:
+        transport.close()
+
+
+def run(coro):
+    """asyncio.run(), on uvloop when it is installed"""
+    if uvloop is not None:
+        if hasattr(uvloop, 'run'):
+            return uvloop.run(coro)
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return asyncio.run(coro)
+
+
+async def download_many(server_ip, server_port, pref_filename, count, **options):
+    """Run count concurrent downloads, prefixed <pref_filename><i>_ when count > 1"""
+    if count == 1:
+        return [await download(server_ip, server_port, pref_filename, **options)]
+    return await asyncio.gather(*(
+        download(server_ip, server_port, f"{pref_filename}{i}_", **options)
+        for i in range(count)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="asyncio Part 2 server and client")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="Serve data.txt to concurrent clients")
+    serve_parser.add_argument('server_ip')
+    serve_parser.add_argument('server_port', type=int)
+    serve_parser.add_argument('--file', default='data.txt', help="File to serve")
+    serve_parser.add_argument('--max-sessions', type=int, default=None,
+                              help="Exit after this many transfers (default: serve forever)")
+    serve_parser.add_argument('--quantum', type=int, default=4,
+                              help="Packets each session may send per scheduling round")
+    serve_parser.add_argument('--cc', choices=sorted(CONTROLLERS), default='reno',
+                              help="Congestion control algorithm")
+    serve_parser.add_argument('--pacing', action='store_true',
+                              help="Pace new data at gain * cwnd / srtt")
+    serve_parser.add_argument('--pacing-gain', type=float, default=1.25,
+                              help="Pacing: rate multiplier over cwnd / srtt")
+    serve_parser.add_argument('--sack', action='store_true',
+                              help="Use the client's SACK blocks for RFC 6675 loss recovery")
+    serve_parser.add_argument('--trace', default=None,
+                              help="Record per-client binary traces, named "
+                                   "<stem>_<ip>_<port><ext> (default: off)")
+
+    download_parser = commands.add_parser('download', help="Download the server's file")
+    download_parser.add_argument('server_ip')
+    download_parser.add_argument('server_port', type=int)
+    download_parser.add_argument('pref_filename')
+    download_parser.add_argument('--count', type=int, default=1,
+                                 help="Concurrent downloads to run in this process")
+    download_parser.add_argument('--ack-policy', choices=('immediate', 'delayed'),
+                                 default='immediate',
+                                 help="ACK every packet, or delay ACKs for in-order data")
+    download_parser.add_argument('--ack-every', type=int, default=2,
+                                 help="Delayed ACKs: ACK at least every N in-order packets")
+    download_parser.add_argument('--ack-delay', type=float, default=0.04,
+                                 help="Delayed ACKs: maximum time to hold an ACK (seconds)")
+    download_parser.add_argument('--sparse', action='store_true',
+                                 help="Pre-size the output file and pwrite() segments in place")
+    download_parser.add_argument('--sack-blocks', type=int, default=DEFAULT_SACK_BLOCKS,
+                                 help="SACK blocks to append to each ACK")
+    download_parser.add_argument('--digest', choices=ALGORITHMS, default=None,
+                                 help="Hash each output as it is received")
+    args = parser.parse_args()
+
+    print(f"Event loop: {'uvloop' if uvloop is not None else 'asyncio'}")
+    try:
+        if args.command == 'serve':
+            print(f"Server listening on {args.server_ip}:{args.server_port} (asyncio)")
+            completed = run(serve(args.server_ip, args.server_port, args.file,
+                                  max_sessions=args.max_sessions, quantum=args.quantum,
+                                  cc=args.cc, pacing=args.pacing,
+                                  pacing_gain=args.pacing_gain, sack=args.sack,
+                                  trace=args.trace))
+            print(f"Served {completed} transfers")
+            return
+
+        start_time = time.time()
+        results = run(download_many(args.server_ip, args.server_port, args.pref_filename,
+                                    args.count, ack_policy=args.ack_policy,
+                                    ack_every=args.ack_every, ack_delay=args.ack_delay,
+                                    sparse=args.sparse, sack_blocks=args.sack_blocks,
+                                    digest=args.digest))
+        elapsed = time.time() - start_time
+    except KeyboardInterrupt:
+        print("\nInterrupted")
+        return
+
+    total_bytes = 0
+    for stats in results:
+        total_bytes += stats['bytes']
+        print(f"{stats['output']}: {stats['bytes']} bytes in {stats['seconds']:.2f} s, "
+              f"{stats['packets']} packets, {stats['acks']} ACKs, "
+              f"{stats['duplicates']} duplicates")
+        if stats['digest']:
+            print(f"  digest {args.digest}: {stats['digest']}")
+    if elapsed > 0:
+        print(f"Total time: {elapsed:.2f} seconds")
+        print(f"Throughput: {total_bytes / elapsed / 1024:.2f} KB/s")
+
+
+if __name__ == "__main__":
+    main()
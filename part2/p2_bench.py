@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Loopback throughput comparison of the blocking and asyncio Part 2 transports.
+
+Usage:
+    python3 p2_bench.py [size_mb] [extra server args...]
+
+Transfers a random file of <size_mb> megabytes (default 8) over 127.0.0.1
+to 1, 4 and 16 concurrent clients, first with the blocking implementation
+(p2_server.py --multi plus one p2_client.py process per client), then with
+p2_async.py (one server process and one process running every download).
+Reports, for each run, the wall-clock time, the aggregate throughput and
+the CPU time (user + system) spent by the server and by all clients per
+transferred megabyte. Any extra arguments are passed to both servers.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER_PY = os.path.join(HERE, "p2_server.py")
+CLIENT_PY = os.path.join(HERE, "p2_client.py")
+ASYNC_PY = os.path.join(HERE, "p2_async.py")
+
+CLIENTS = [1, 4, 16]
+SERVER_IP = "127.0.0.1"
+BASE_PORT = 17555
+
+
+def cpu_seconds(rusage):
+    """Return user + system CPU seconds from a resource usage record."""
+    return rusage.ru_utime + rusage.ru_stime
+
+
+def outputs_match(workdir, names):
+    """True if every received file equals data.txt."""
+    with open(os.path.join(workdir, "data.txt"), "rb") as src:
+        expected = src.read()
+    for name in names:
+        path = os.path.join(workdir, name)
+        if not os.path.exists(path):
+            return False
+        with open(path, "rb") as dst:
+            if dst.read() != expected:
+                return False
+        os.remove(path)
+    return True
+
+
+def run_once(workdir, port, mode, clients, server_args=()):
+    """Run one transfer and return (wall_s, server_cpu_s, client_cpu_s, ok)."""
+    if mode == "blocking":
+        server_cmd = [sys.executable, SERVER_PY, SERVER_IP, str(port), "--multi",
+                      "--max-sessions", str(clients), *server_args]
+        client_cmds = [[sys.executable, CLIENT_PY, SERVER_IP, str(port), f"{i}_"]
+                       for i in range(clients)]
+        names = [f"{i}_received_data.txt" for i in range(clients)]
+    else:
+        server_cmd = [sys.executable, ASYNC_PY, "serve", SERVER_IP, str(port),
+                      "--max-sessions", str(clients), *server_args]
+        client_cmds = [[sys.executable, ASYNC_PY, "download", SERVER_IP, str(port), "",
+                        "--count", str(clients)]]
+        # A single download keeps the bare prefix
+        names = ([f"{i}_received_data.txt" for i in range(clients)] if clients > 1
+                 else ["received_data.txt"])
+
+    server = subprocess.Popen(server_cmd, cwd=workdir, stdout=subprocess.DEVNULL)
+    time.sleep(0.3)
+
+    start = time.time()
+    procs = [subprocess.Popen(cmd, cwd=workdir, stdout=subprocess.DEVNULL)
+             for cmd in client_cmds]
+    client_cpu = 0.0
+    for proc in procs:
+        _, _, usage = os.wait4(proc.pid, 0)
+        client_cpu += cpu_seconds(usage)
+    wall = time.time() - start
+    _, _, server_usage = os.wait4(server.pid, 0)
+
+    return wall, cpu_seconds(server_usage), client_cpu, outputs_match(workdir, names)
+
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 8.0
+    server_args = tuple(sys.argv[2:])
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "data.txt"), "wb") as f:
+            f.write(os.urandom(int(size_mb * 1024 * 1024)))
+
+        print("mode,clients,wall_s,aggregate_mb_per_s,server_cpu_s_per_mb,"
+              "client_cpu_s_per_mb,ok")
+        port = BASE_PORT
+        for clients in CLIENTS:
+            for mode in ("blocking", "async"):
+                wall, server_cpu, client_cpu, ok = run_once(
+                    workdir, port, mode, clients, server_args=server_args
+                )
+                port += 1
+                total_mb = size_mb * clients
+                print(
+                    f"{mode},{clients},{wall:.3f},{total_mb / wall:.2f},"
+                    f"{server_cpu / total_mb:.4f},{client_cpu / total_mb:.4f},{ok}"
+                )
+
+
+if __name__ == "__main__":
+    main()
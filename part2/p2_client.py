@@ -4,14 +4,62 @@ Reliable UDP File Transfer Client (Part 2)
 Implements receiver with out-of-order handling and immediate ACKs
 """
 
+import argparse
+import json
+import os
+import select
 import socket
 import struct
 import time
 import sys
 
+# Modules shared by Part 1 and Part 2
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+from batch_io import DatagramBatcher
+from digest import ALGORITHMS, DEFAULT_ALGORITHM, RollingDigest
+from received_ranges import ReceivedRanges
+
+# Metadata packet (file size) sent by the server when the request carries
+# META_FLAG; its sequence number can never start a data segment.
+META_SEQ = 0xFFFFFFFF
+META_FLAG = b'M'
+
+# Striped downloads: each flow asks for one stripe with STRIPE_FLAG and
+# !HH (index, count); the metadata packet then carries the stripe's range.
+STRIPE_FLAG = b'S'
+
+# SACK blocks (start, end as 4-byte unsigned ints) follow the 20-byte ACK
+# header; the whole ACK must fit in one 1200-byte datagram.
+MAX_SACK_BLOCKS = (1200 - 20) // 8
+DEFAULT_SACK_BLOCKS = 4
+
+# Shortest receive timeout: settimeout(0.0) would make the socket
+# non-blocking, and recvfrom() would raise BlockingIOError, not a timeout.
+MIN_RECEIVE_TIMEOUT = 1e-4
+
+
+def send_report(path, report):
+    """Send a JSON completion report to an experiment driver's Unix datagram socket"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        sock.sendto(json.dumps(report).encode(), path)
+    except OSError as e:
+        print(f"Could not send report to {path}: {e}")
+    finally:
+        sock.close()
+
+
+def digest_report(digest):
+    """Report fields for a rolling digest (or its absence)"""
+    if digest is None:
+        return {'digest': None, 'digest_algorithm': None}
+    return {'digest': digest.hexdigest(), 'digest_algorithm': digest.algorithm}
+
 
 class ReliableUDPClient:
-    def __init__(self, server_ip, server_port, pref_filename):
+    def __init__(self, server_ip, server_port, pref_filename, batch_io=False,
+                 ack_policy='immediate', ack_every=2, ack_delay=0.04, sparse=False,
+                 sack_blocks=DEFAULT_SACK_BLOCKS, sock=None, stripe=None, digest=None):
         self.server_ip = server_ip
         self.server_port = server_port
         self.server_addr = (server_ip, server_port)
@@ -19,26 +67,73 @@ class ReliableUDPClient:
         self.MAX_PAYLOAD = 1180
         self.HEADER_SIZE = 20
 
-        # Socket
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.settimeout(2.0)  # 2 second timeout for retries
+        # Socket, unless the caller provides a sender (e.g. an asyncio transport)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.settimeout(2.0)  # 2 second timeout for retries
+        else:
+            batch_io = False
+        self.sock = sock
+        # Optional batched I/O: drain data packets and flush ACKs in bursts
+        self.batcher = DatagramBatcher(self.sock) if batch_io else None
 
         # Reception state
         self.next_expected_seq = 0
         self.recv_buffer = {}  # {seq: data} for out-of-order packets
         self.output_file = None
 
+        # SACK: ranges received above next_expected_seq, reported in every ACK
+        self.received_ranges = ReceivedRanges()
+        self.max_sack_blocks = max(0, min(sack_blocks, MAX_SACK_BLOCKS))
+
+        # Sparse mode: the file size is learned up front, the output file is
+        # pre-sized and every segment is pwrite()n straight to its offset.
+        # Only a bitmap of the segments between next_expected_seq and the
+        # highest one received is kept, so its size follows the sender's
+        # window (one bit per MSS) rather than the file.
+        self.sparse = sparse
+        self.file_size = None  # end of the expected data
+        self.fd = None
+        self.range_start = 0   # start of the expected data
+        self.base_seq = 0      # offset of bit 0 of the bitmap; slides with next_expected_seq
+        self.received_bitmap = None
+        self.highest_seq_end = 0
+
+        # Striped download: (index, count) of the stripe this flow fetches
+        self.stripe = stripe
+
+        # Rolling digest (algorithm name, or None) of the in-order data, so
+        # the output file need not be read back to be verified
+        self.digest = RollingDigest(digest) if digest else None
+
+        # Delayed ACKs: in-order data is ACKed every ack_every packets or after
+        # ack_delay seconds; out-of-order data and hole fills are ACKed at once
+        self.ack_policy = ack_policy
+        self.ack_every = ack_every
+        self.ack_delay = ack_delay
+        self.pending_acks = 0
+        self.ack_deadline = None
+        self.pending_echo = 0.0  # timestamp of the oldest unACKed packet
+
         # Statistics
         self.total_packets_received = 0
         self.total_acks_sent = 0
         self.duplicate_packets = 0
         self.total_bytes_received = 0
+        self.request_time = None  # request first sent
+        self.start_time = None    # first reply received
+        self.end_time = None
+        self.complete = False
 
     def create_ack(self, ack_num, timestamp_echo):
         """Create ACK packet"""
         # ACK packet: ack_num in seq field, no data, echo timestamp
         header = struct.pack('!Idd', ack_num, 0.0, timestamp_echo)
-        return header
+        # followed by SACK blocks for data received above ack_num
+        self.received_ranges.trim(ack_num)
+        sack_data = b''.join(struct.pack('!II', start, end)
+                             for start, end in self.received_ranges.blocks(self.max_sack_blocks))
+        return header + sack_data
 
     def parse_packet(self, packet):
         """Parse received packet"""
@@ -49,15 +144,67 @@ class ReliableUDPClient:
         data = packet[self.HEADER_SIZE:]
         return seq_num, timestamp, data
 
+    def delay_ack(self, timestamp):
+        """Count an in-order packet under the delayed-ACK policy.
+        Returns True if its ACK can be held back, False if it is due now"""
+        if self.ack_policy != 'delayed':
+            return False
+        if not self.pending_acks:
+            self.pending_echo = timestamp
+        self.pending_acks += 1
+        if self.pending_acks >= self.ack_every:
+            return False
+        if self.ack_deadline is None:
+            self.ack_deadline = time.time() + self.ack_delay
+        return True
+
+    def flush_delayed_ack(self):
+        """Send a held-back ACK once its delay has expired"""
+        if self.ack_deadline is not None and time.time() >= self.ack_deadline:
+            self.send_ack(self.next_expected_seq, self.pending_echo)
+
+    def receive_timeout(self):
+        """Socket timeout: block indefinitely unless a delayed ACK is pending"""
+        if self.ack_deadline is None:
+            return None
+        return max(MIN_RECEIVE_TIMEOUT, self.ack_deadline - time.time())
+
     def send_ack(self, ack_num, timestamp_echo):
         """Send ACK to server"""
+        self.pending_acks = 0
+        self.ack_deadline = None
+        self.pending_echo = 0.0
         ack_packet = self.create_ack(ack_num, timestamp_echo)
-        self.sock.sendto(ack_packet, self.server_addr)
+        if self.batcher:
+            self.batcher.queue([ack_packet], self.server_addr)
+        else:
+            self.sock.sendto(ack_packet, self.server_addr)
         self.total_acks_sent += 1
 
+    def flush_acks(self):
+        """Send any ACKs queued by the batched I/O layer"""
+        if self.batcher:
+            self.batcher.flush()
+
+    def receive_packets(self):
+        """Receive one datagram, plus every further one already queued when batching"""
+        packets = [self.sock.recvfrom(2048)]
+        if self.batcher:
+            packets.extend(self.batcher.recv_batch())
+        return packets
+
+    def request_packet(self):
+        """The file request datagram"""
+        request = b'R'  # Request byte
+        if self.sparse or self.stripe:
+            request += META_FLAG  # ask for the file size first
+        if self.stripe:
+            request += STRIPE_FLAG + struct.pack('!HH', *self.stripe)
+        return request
+
     def send_request(self):
         """Send file request to server with retries"""
-        request = b'R'  # Request byte
+        request = self.request_packet()
         max_retries = 5
         retry_timeout = 2.0
 
@@ -82,11 +229,122 @@ class ReliableUDPClient:
         print("Error: Failed to connect to server after 5 attempts")
         sys.exit(1)
 
+    def receive_first_segment(self, timeout=10.0):
+        """Wait for the server's first data packet after its metadata packet,
+        skipping other senders and repeated metadata. Returns None if nothing
+        arrives within timeout seconds"""
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            self.sock.settimeout(max(MIN_RECEIVE_TIMEOUT, remaining))
+            try:
+                packet, addr = self.sock.recvfrom(2048)
+            except (socket.timeout, BlockingIOError):
+                return None
+            if addr != self.server_addr:
+                continue
+            seq, _, _ = self.parse_packet(packet)
+            if seq is not None and seq != META_SEQ:
+                return packet
+
+    def parse_metadata(self, packet):
+        """Return (file size, (start, end) of the data that will be sent) from
+        a metadata packet, or None"""
+        seq, _, data = self.parse_packet(packet)
+        if seq != META_SEQ or len(data) < 12 or data[:4] != b'META':
+            return None
+        file_size = struct.unpack('!Q', data[4:12])[0]
+        if len(data) < 28:
+            return file_size, (0, file_size)
+        return file_size, struct.unpack('!QQ', data[12:28])
+
+    def open_output(self, first_packet):
+        """Open the output file for the server's first reply.
+        Returns True if that reply was a metadata packet carrying no data"""
+        output_filename = f"{self.pref_filename}received_data.txt"
+        if self.sparse:
+            metadata = self.parse_metadata(first_packet)
+            if metadata is not None:
+                file_size, _ = metadata
+                self.open_sparse_output(output_filename, file_size)
+                print(f"File size {file_size} bytes, writing segments in place")
+                return True
+            print("No metadata from server, falling back to buffered reassembly")
+            self.sparse = False
+        self.output_file = open(output_filename, 'wb')
+        return False
+
+    def open_sparse_output(self, output_filename, file_size):
+        """Create the output file pre-sized to file_size and start the segment bitmap"""
+        fd = os.open(output_filename, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.ftruncate(fd, file_size)
+        self.use_range(fd, 0, file_size)
+
+    def use_range(self, fd, start, end):
+        """Sparse mode: expect bytes [start, end), written in place through fd"""
+        self.sparse = True
+        self.fd = fd
+        self.range_start = start
+        self.file_size = end
+        self.base_seq = self.next_expected_seq = self.highest_seq_end = start
+        self.received_bitmap = bytearray()
+
+    def segment_index(self, seq):
+        """Bitmap index of the segment starting at seq"""
+        return (seq - self.base_seq) // self.MAX_PAYLOAD
+
+    def segment_received(self, index):
+        """Check the bitmap bit for a segment index"""
+        if index >> 3 >= len(self.received_bitmap):
+            return 0
+        return self.received_bitmap[index >> 3] & (1 << (index & 7))
+
+    def place_segment(self, seq, data):
+        """Sparse mode: write a segment at its offset and advance the in-order point"""
+        os.pwrite(self.fd, data, seq)
+        index = self.segment_index(seq)
+        if index >> 3 >= len(self.received_bitmap):
+            self.received_bitmap.extend(bytes((index >> 3) + 1 - len(self.received_bitmap)))
+        self.received_bitmap[index >> 3] |= 1 << (index & 7)
+        self.total_bytes_received += len(data)
+        self.highest_seq_end = max(self.highest_seq_end, seq + len(data))
+
+        # Advance over every contiguous received segment
+        while self.next_expected_seq < self.file_size and \
+                self.segment_received(self.segment_index(self.next_expected_seq)):
+            self.next_expected_seq = min(self.next_expected_seq + self.MAX_PAYLOAD, self.file_size)
+        # Slide the bitmap: drop the whole bytes now below the in-order point
+        done = self.segment_index(self.next_expected_seq) >> 3
+        if done:
+            del self.received_bitmap[:done]
+            self.base_seq += done * 8 * self.MAX_PAYLOAD
+        if self.digest:
+            self.digest.update_from_fd(self.fd, self.next_expected_seq)
+
+    def has_buffered_data(self):
+        """True if data beyond next_expected_seq is waiting for a hole to fill"""
+        if self.sparse:
+            return self.highest_seq_end > self.next_expected_seq
+        return bool(self.recv_buffer)
+
     def write_data(self, seq, data):
         """Write data to file"""
         if self.output_file:
             self.output_file.write(data)
             self.total_bytes_received += len(data)
+            if self.digest:
+                self.digest.update(data)
+
+    def close_output(self):
+        """Close the output file in either mode"""
+        if self.output_file:
+            self.output_file.close()
+            self.output_file = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
 
     def process_buffered_packets(self):
         """Process any consecutive buffered packets"""
@@ -98,6 +356,10 @@ class ReliableUDPClient:
 
     def handle_packet(self, seq, timestamp, data):
         """Handle received data packet"""
+        # Metadata repeats or reordering are not data
+        if seq == META_SEQ:
+            return False
+
         self.total_packets_received += 1
 
         # Check if this is EOF
@@ -108,19 +370,31 @@ class ReliableUDPClient:
 
         # Check if this is the expected packet
         if seq == self.next_expected_seq:
-            # In-order packet
-            self.write_data(seq, data)
-            self.next_expected_seq += len(data)
+            # In-order packet; with nothing buffered it does not fill a hole
+            in_sequence = not self.has_buffered_data()
+            if self.sparse:
+                self.place_segment(seq, data)
+            else:
+                self.write_data(seq, data)
+                self.next_expected_seq += len(data)
 
-            # Check if we can now process buffered packets
-            self.process_buffered_packets()
+                # Check if we can now process buffered packets
+                self.process_buffered_packets()
 
-            # Send ACK with updated next_expected_seq
-            self.send_ack(self.next_expected_seq, timestamp)
+            # Send ACK with updated next_expected_seq (possibly delayed)
+            if in_sequence and self.delay_ack(timestamp):
+                return False
+            self.send_ack(self.next_expected_seq, self.pending_echo or timestamp)
 
         elif seq > self.next_expected_seq:
-            # Out-of-order packet - buffer it
-            if seq not in self.recv_buffer:
+            # Out-of-order packet - buffer it (or place it, in sparse mode)
+            self.received_ranges.add(seq, seq + len(data))
+            if self.sparse:
+                if self.segment_received(self.segment_index(seq)):
+                    self.duplicate_packets += 1
+                else:
+                    self.place_segment(seq, data)
+            elif seq not in self.recv_buffer:
                 self.recv_buffer[seq] = data
             else:
                 self.duplicate_packets += 1
@@ -136,41 +410,67 @@ class ReliableUDPClient:
 
         return False  # Not done yet
 
+    def report(self):
+        """Completion report for an experiment driver"""
+        return {'name': self.pref_filename, 'complete': self.complete,
+                'start': self.request_time, 'first_packet': self.start_time,
+                'finish': self.end_time, 'bytes': self.total_bytes_received,
+                'packets': self.total_packets_received,
+                **digest_report(self.digest)}
+
     def run(self):
         """Main client loop"""
         print(f"Connecting to server {self.server_ip}:{self.server_port}")
+        self.request_time = time.time()
 
         # Send request and get first packet
         first_packet = self.send_request()
 
         # Open output file with prefix
         output_filename = f"{self.pref_filename}received_data.txt"
-        self.output_file = open(output_filename, 'wb')
+        if self.open_output(first_packet):
+            # the metadata packet carries no data; wait for the first segment
+            first_packet = self.receive_first_segment()
+            if first_packet is None:
+                print("Error: no data from server after the metadata packet")
+                self.close_output()
+                sys.exit(1)
         print(f"Receiving file to {output_filename}...")
 
-        start_time = time.time()
+        start_time = self.start_time = time.time()
 
         # Process first packet
         seq, timestamp, data = self.parse_packet(first_packet)
         if seq is not None:
             if self.handle_packet(seq, timestamp, data):
                 # EOF in first packet (shouldn't happen for normal files)
-                self.output_file.close()
+                self.flush_acks()
+                self.close_output()
+                self.end_time = time.time()
+                self.complete = True
                 return
+            self.flush_acks()
 
         # Main receive loop
         transfer_complete = False
         while not transfer_complete:
             try:
-                packet, addr = self.sock.recvfrom(2048)
-
-                if addr != self.server_addr:
-                    continue
-
-                seq, timestamp, data = self.parse_packet(packet)
-                if seq is not None:
-                    transfer_complete = self.handle_packet(seq, timestamp, data)
-
+                self.sock.settimeout(self.receive_timeout())
+                for packet, addr in self.receive_packets():
+                    if addr != self.server_addr:
+                        continue
+
+                    seq, timestamp, data = self.parse_packet(packet)
+                    if seq is not None:
+                        transfer_complete = self.handle_packet(seq, timestamp, data)
+                        if transfer_complete:
+                            break
+                self.flush_delayed_ack()
+                self.flush_acks()
+
+            except (socket.timeout, BlockingIOError):
+                self.flush_delayed_ack()
+                self.flush_acks()
             except KeyboardInterrupt:
                 print("\nClient interrupted")
                 break
@@ -178,11 +478,11 @@ class ReliableUDPClient:
                 print(f"Error: {e}")
                 break
 
-        end_time = time.time()
+        end_time = self.end_time = time.time()
+        self.complete = transfer_complete
 
         # Close file
-        if self.output_file:
-            self.output_file.close()
+        self.close_output()
 
         # Statistics
         print(f"\n=== Transfer Complete ===")
@@ -190,8 +490,16 @@ class ReliableUDPClient:
         print(f"Bytes received: {self.total_bytes_received}")
         print(f"Packets received: {self.total_packets_received}")
         print(f"ACKs sent: {self.total_acks_sent}")
+        if self.total_packets_received:
+            print(f"ACKs per data packet: {self.total_acks_sent / self.total_packets_received:.3f}")
         print(f"Duplicate packets: {self.duplicate_packets}")
         print(f"Out-of-order packets buffered: {len(self.recv_buffer)}")
+        if self.digest:
+            print(f"Digest {self.digest.algorithm}: {self.digest.hexdigest()}")
+        if self.batcher:
+            print(f"Batched I/O: {self.batcher.datagrams_received} packets in "
+                  f"{self.batcher.recv_calls} receive calls, "
+                  f"{self.batcher.datagrams_sent} ACKs in {self.batcher.send_calls} send calls")
 
         # Calculate throughput
         if end_time > start_time:
@@ -210,23 +518,229 @@ class ReliableUDPClient:
         self.sock.close()
 
 
-def main():
-    if len(sys.argv) != 4:
-        print("Usage: python3 p2_client.py <SERVER_IP> <SERVER_PORT> <PREF_FILENAME>")
-        sys.exit(1)
+class StripedDownload:
+    """Download one file over several concurrent flows.
+
+    Flow i is a ReliableUDPClient with its own socket, so a multi-session
+    server treats it as a separate client with its own congestion state, and
+    it requests stripe i of the file. The first metadata packet to arrive
+    gives the file size; the output file is created at that size and every
+    flow pwrite()s its segments into it. One select() loop serves all flows.
+    """
+
+    MAX_RETRIES = 5
+    RETRY_TIMEOUT = 2.0
+    # A flow that gets data before its metadata re-requests at most this often
+    REQUEST_REPEAT_INTERVAL = 0.05
 
-    server_ip = sys.argv[1]
-    server_port = int(sys.argv[2])
-    pref_filename = sys.argv[3]
+    def __init__(self, server_ip, server_port, pref_filename, streams, digest=None, **options):
+        self.server_ip = server_ip
+        self.server_port = server_port
+        self.pref_filename = pref_filename
+        self.output_filename = f"{pref_filename}received_data.txt"
+        self.flows = [ReliableUDPClient(server_ip, server_port, pref_filename,
+                                        stripe=(index, streams), **options)
+                      for index in range(streams)]
+        self.fd = None
+        self.file_size = None
+        self.requests = {}  # {flow: [last request time, attempts]} until metadata arrives
+        # Digest of the file in order, as far as every stripe has filled it in
+        self.digest = RollingDigest(digest) if digest else None
+        self.request_time = None
+        self.end_time = None
+        self.complete = False
+
+    def send_request(self, flow, now):
+        """Send flow's request and note when, for the retry timer"""
+        entry = self.requests[flow]
+        flow.sock.sendto(flow.request_packet(), flow.server_addr)
+        entry[0] = now
+
+    def open_output(self, file_size):
+        """Create the shared output file at its final size"""
+        self.file_size = file_size
+        self.fd = os.open(self.output_filename, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.ftruncate(self.fd, file_size)
+        print(f"File size {file_size} bytes, {len(self.flows)} streams, "
+              f"writing to {self.output_filename}")
+
+    def handle_packet(self, flow, packet):
+        """Process one datagram for a flow; returns True when its stripe is complete"""
+        if flow in self.requests:
+            metadata = flow.parse_metadata(packet)
+            if metadata is None:
+                # Data before the metadata: it was lost, ask again
+                now = time.time()
+                if now - self.requests[flow][0] >= self.REQUEST_REPEAT_INTERVAL:
+                    self.send_request(flow, now)
+                return False
+            file_size, (start, end) = metadata
+            if self.fd is None:
+                self.open_output(file_size)
+            flow.use_range(self.fd, start, end)
+            flow.start_time = time.time()
+            del self.requests[flow]
+            return False
+
+        seq, timestamp, data = flow.parse_packet(packet)
+        return seq is not None and flow.handle_packet(seq, timestamp, data)
+
+    def next_timeout(self):
+        """Time until the earliest request retry or delayed ACK"""
+        deadlines = [last + self.RETRY_TIMEOUT for last, _ in self.requests.values()]
+        deadlines.extend(flow.ack_deadline for flow in self.flows
+                         if flow.ack_deadline is not None)
+        if not deadlines:
+            return None
+        return max(0.0, min(deadlines) - time.time())
+
+    def retry_requests(self):
+        """Resend requests that have gone unanswered for RETRY_TIMEOUT"""
+        now = time.time()
+        for flow, entry in self.requests.items():
+            if now - entry[0] < self.RETRY_TIMEOUT:
+                continue
+            if entry[1] >= self.MAX_RETRIES:
+                print(f"Error: Failed to connect to server after {self.MAX_RETRIES} attempts")
+                sys.exit(1)
+            entry[1] += 1
+            print(f"Request timeout, stripe {flow.stripe[0] + 1} "
+                  f"(attempt {entry[1]}/{self.MAX_RETRIES})")
+            self.send_request(flow, now)
+
+    def advance_digest(self):
+        """Extend the digest over the file up to the first stripe still missing data"""
+        for flow in self.flows:  # in file order
+            if flow in self.requests:
+                return  # range not known yet
+            if self.digest.length < flow.file_size:
+                self.digest.update_from_fd(self.fd, flow.next_expected_seq)
+                if self.digest.length < flow.file_size:
+                    return
+
+    def report(self):
+        """Completion report for an experiment driver"""
+        first_packets = [flow.start_time for flow in self.flows if flow.start_time is not None]
+        return {'name': self.pref_filename, 'complete': self.complete,
+                'start': self.request_time,
+                'first_packet': min(first_packets) if first_packets else None,
+                'finish': self.end_time,
+                'bytes': sum(flow.total_bytes_received for flow in self.flows),
+                'packets': sum(flow.total_packets_received for flow in self.flows),
+                **digest_report(self.digest)}
 
-    client = ReliableUDPClient(server_ip, server_port, pref_filename)
+    def run(self):
+        """Main loop: run every flow until all stripes are complete"""
+        print(f"Connecting to server {self.server_ip}:{self.server_port} "
+              f"with {len(self.flows)} streams")
+        active = {flow.sock: flow for flow in self.flows}
+        now = self.request_time = time.time()
+        for flow in self.flows:
+            flow.sock.settimeout(None)
+            self.requests[flow] = [now, 1]
+            self.send_request(flow, now)
+
+        start_time = time.time()
+        try:
+            while active:
+                ready, _, _ = select.select(list(active), [], [], self.next_timeout())
+                for sock in ready:
+                    flow = active[sock]
+                    for packet, addr in flow.receive_packets():
+                        if addr != flow.server_addr:
+                            continue
+                        if self.handle_packet(flow, packet):
+                            del active[sock]
+                            break
+                for flow in active.values():
+                    flow.flush_delayed_ack()
+                for flow in self.flows:
+                    flow.flush_acks()
+                self.retry_requests()
+                if self.digest and self.fd is not None:
+                    self.advance_digest()
+        except KeyboardInterrupt:
+            print("\nClient interrupted")
+        end_time = self.end_time = time.time()
+        self.complete = not active
+
+        if self.fd is not None:
+            if self.digest:
+                self.advance_digest()
+            os.close(self.fd)
+        for flow in self.flows:
+            flow.sock.close()
+
+        total_bytes = sum(flow.total_bytes_received for flow in self.flows)
+        print(f"\n=== Transfer Complete ===")
+        print(f"Total time: {end_time - start_time:.2f} seconds")
+        print(f"Bytes received: {total_bytes}")
+        for flow in self.flows:
+            print(f"Stream {flow.stripe[0] + 1}: bytes {flow.range_start}-{flow.file_size}, "
+                  f"{flow.total_packets_received} packets, {flow.total_acks_sent} ACKs, "
+                  f"{flow.duplicate_packets} duplicates")
+        if self.digest:
+            print(f"Digest {self.digest.algorithm}: {self.digest.hexdigest()}")
+        if end_time > start_time:
+            print(f"Throughput: {total_bytes / (end_time - start_time) / 1024:.2f} KB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        usage="python3 p2_client.py <SERVER_IP> <SERVER_PORT> <PREF_FILENAME> [options]")
+    parser.add_argument('server_ip')
+    parser.add_argument('server_port', type=int)
+    parser.add_argument('pref_filename')
+    parser.add_argument('--batch-io', action='store_true',
+                        help="Batch datagram receives/ACK sends (recvmmsg/sendmmsg where available)")
+    parser.add_argument('--ack-policy', choices=('immediate', 'delayed'), default='immediate',
+                        help="ACK every packet, or delay ACKs for in-order data")
+    parser.add_argument('--ack-every', type=int, default=2,
+                        help="Delayed ACKs: ACK at least every N in-order packets")
+    parser.add_argument('--ack-delay', type=float, default=0.04,
+                        help="Delayed ACKs: maximum time to hold an ACK (seconds)")
+    parser.add_argument('--sparse', action='store_true',
+                        help="Pre-size the output file and pwrite() segments at their offsets")
+    parser.add_argument('--sack-blocks', type=int, default=DEFAULT_SACK_BLOCKS,
+                        help="SACK blocks to append to each ACK (0 for cumulative ACKs only)")
+    parser.add_argument('--streams', type=int, default=1,
+                        help="Split the file across N concurrent flows "
+                             "(needs a multi-session server; implies --sparse)")
+    parser.add_argument('--digest', choices=ALGORITHMS + ('none',), default=DEFAULT_ALGORITHM,
+                        help="Hash the output as it is received and print/report the digest")
+    parser.add_argument('--report', metavar='SOCKET',
+                        help="On exit, send a JSON report (start/finish times, bytes) to "
+                             "this Unix datagram socket")
+    args = parser.parse_args()
+    digest = None if args.digest == 'none' else args.digest
+
+    if args.streams > 1:
+        download = StripedDownload(args.server_ip, args.server_port, args.pref_filename,
+                                   args.streams, batch_io=args.batch_io,
+                                   ack_policy=args.ack_policy, ack_every=args.ack_every,
+                                   ack_delay=args.ack_delay, sack_blocks=args.sack_blocks,
+                                   digest=digest)
+        try:
+            download.run()
+        finally:
+            if args.report:
+                send_report(args.report, download.report())
+        return
+
+    client = ReliableUDPClient(args.server_ip, args.server_port, args.pref_filename,
+                               batch_io=args.batch_io, ack_policy=args.ack_policy,
+                               ack_every=args.ack_every, ack_delay=args.ack_delay,
+                               sparse=args.sparse, sack_blocks=args.sack_blocks,
+                               digest=digest)
     try:
         client.run()
     except KeyboardInterrupt:
         print("\nClient interrupted")
-        if client.output_file:
-            client.output_file.close()
+        client.close_output()
         client.sock.close()
+    finally:
+        if args.report:
+            send_report(args.report, client.report())
 
 
 if __name__ == "__main__":
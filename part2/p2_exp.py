@@ -1,19 +1,53 @@
-from mininet.topo import Topo
-from mininet.net import Mininet
-from mininet.link import TCLink
-from mininet.node import RemoteController
-from mininet.cli import CLI
-from mininet.log import setLogLevel
-from mininet.node import Controller
 import time, re, os
 import sys
-import hashlib
+import json
+import queue
+import select
 import shutil
+import socket
+import subprocess
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Mininet is only needed by the default backend; '--backend local' runs the
+# same topologies through link_emulator.py without it (or root)
+try:
+    from mininet.topo import Topo
+    from mininet.net import Mininet
+    from mininet.link import TCLink
+    from mininet.node import RemoteController
+    from mininet.cli import CLI
+    from mininet.log import setLogLevel
+    from mininet.node import Controller
+except ImportError:
+    Topo = object
+    Mininet = None
+
+# Modules shared by Part 1 and Part 2
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+from digest import ALGORITHMS, file_digest
+from link_emulator import EmulatedNetwork
 
 
 RTT_MS = 40         
 MSS_BYTES = 1200        
+CC_ALGO = 'reno'    # congestion control used by p2_server.py (set from argv)
+SERVER_FLAGS = ''   # extra p2_server.py options, e.g. '--sack --pacing' (set from argv)
+BACKEND = 'mininet' # 'mininet' or 'local' (link_emulator.py on loopback), set from argv
+JOBS = 1            # concurrent trials (local backend only), set from argv
+PROCESSES_PER_TRIAL = 5  # emulator, two servers, two clients (plus the UDP pair)
+RESUME = False      # skip trials whose rows are already in the CSV, set from argv
+DIGEST = 'md5'      # hash of the received files recorded in the CSV, set from argv
+
+# s1, s2 and UDP server ports, and where trial logs go; every trial of a
+# parallel sweep runs in its own directory with its own ports, and keeps its
+# logs in LOG_DIR/<results CSV name>/trial_<key>
+PORTS = (6555, 6556, 7777)
+LOG_DIR = '/tmp'
+TRIAL_PORT_BASE = 20000  # parallel trial slot n uses TRIAL_PORT_BASE + 10 * n onwards
+HERE = os.path.dirname(os.path.abspath(__file__))
+CLIENT_TIMEOUT = 900     # seconds a trial waits for its clients before killing them
 
 class DumbbellTopo(Topo):
     def build(self, delay_c2_sw1='5ms', bw=100, loss=0, buffer_size=420):
@@ -94,21 +128,43 @@ def jain_fairness_index(allocations):
     return jfi
 
 
-def compute_md5(file_path):
-    """Compute the MD5 hash of a file on the controller host (local filesystem).
-    Returns hex digest or None if file doesn't exist."""
-    hasher = hashlib.md5()
-    try:
-        with open(file_path, 'rb') as file:
-            while True:
-                chunk = file.read(8192)
-                if not chunk:
-                    break
-                hasher.update(chunk)
-        return hasher.hexdigest()
-    except FileNotFoundError:
-        # file not present on controller filesystem
-        return None
+def output_digest(report, pref):
+    """Digest of a client's output file: the one the client computed while
+    receiving, if it completed the transfer, otherwise hashed from the file"""
+    if report.get('complete') and report.get('digest_algorithm') == DIGEST:
+        return report['digest']
+    return file_digest(f"{pref}received_data.txt", DIGEST)
+
+
+def start_network(bw, loss, delay_c2_ms, buffer_size, server_ports, udp_port=None):
+    """Start the dumbbell (with the UDP host pair if udp_port is given) on the selected backend"""
+    if BACKEND == 'local':
+        # Each client/server pair is a route through the shared bottleneck,
+        # with the access-link delays of the Mininet topology
+        routes = [(server_ports[0], 5, 5), (server_ports[1], delay_c2_ms, 5)]
+        if udp_port is not None:
+            routes.append((udp_port, 5, 5))
+        net = EmulatedNetwork(routes, bw=bw, delay=10, loss=loss, buffer=buffer_size,
+                              log_path=f'{LOG_DIR}/link_emulator.out')
+        print(f"[local] bottleneck bw={bw} Mbps, loss={loss}%, buffer={buffer_size} pkts, bot_delay=10ms")
+        net.start()
+        return net
+
+    setLogLevel('info')
+    topo_class = DumbbellTopo if udp_port is None else DumbbellTopoWithUDP
+    topo = topo_class(delay_c2_sw1=f"{delay_c2_ms}ms", bw=bw, loss=loss, buffer_size=buffer_size)
+    net = Mininet(topo=topo, link=TCLink, controller=None)
+    remote_controller = RemoteController('c0', ip='127.0.0.1', port=6653)
+    net.addController(remote_controller)
+    net.start()
+    return net
+
+
+def server_address(net, server, port):
+    """Address a client sends to in order to reach port on the server host"""
+    if BACKEND == 'local':
+        return net.address(port)
+    return server.IP(), port
 
 
 def get_file_size_bytes(file_path):
@@ -117,31 +173,100 @@ def get_file_size_bytes(file_path):
     except Exception:
         return None
 
+
+def open_report_socket():
+    """Unix datagram socket for the clients' completion reports; returns (sock, path).
+    A filesystem path reaches it from every Mininet host's network namespace."""
+    report_dir = tempfile.mkdtemp(prefix='p2_report_')
+    path = os.path.join(report_dir, 'report.sock')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(path)
+    return sock, path
+
+
+def close_report_socket(sock, path):
+    sock.close()
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+
+def receive_reports(sock, pending, reports, timeout):
+    """Move the reports that arrive within timeout from pending to reports"""
+    while pending:
+        ready, _, _ = select.select([sock], [], [], timeout)
+        if not ready:
+            return
+        try:
+            report = json.loads(sock.recv(65536))
+        except ValueError:
+            continue
+        name = report.get('name')
+        if name in pending:
+            del pending[name]
+            report['exited'] = time.time()
+            reports[name] = report
+            print(f"client {name} finished at {report['finish']} ({report['bytes']} bytes)")
+        timeout = 0
+
+
+def wait_for_clients(sock, clients, timeout=CLIENT_TIMEOUT):
+    """Wait for the p2_client.py --report of every client in {pref: (host, pid)}.
+
+    Returns {pref: report} as soon as the last report arrives. A client that
+    exits without reporting gets {'exited': <time>}; one still running at the
+    timeout is killed and gets the same."""
+    pending = dict(clients)
+    reports = {}
+    deadline = time.time() + timeout
+    while pending:
+        receive_reports(sock, pending, reports, max(0.0, min(1.0, deadline - time.time())))
+        if not pending:
+            break
+        # Once a second: check for clients that died without a report
+        timed_out = time.time() >= deadline
+        exited = []
+        for pref, (host, pid) in pending.items():
+            if timed_out:
+                print(f"client {pref} timed out; killing pid {pid}")
+                host.cmd(f"kill {pid} 2>/dev/null || true")
+                exited.append(pref)
+            elif pid is not None and not host.cmd(f"ps -p {pid} -o pid= || true").strip():
+                exited.append(pref)
+        if exited:
+            receive_reports(sock, pending, reports, 0)  # sent just before exiting?
+            for pref in exited:
+                if pending.pop(pref, None) is not None:
+                    print(f"client {pref} exited without a report")
+                    reports[pref] = {'exited': time.time()}
+    return reports
+
+
+def client_result(report, launch_time, pref):
+    """(duration, size) of a client transfer: from its own request and finish
+    timestamps and byte count when it reported them, otherwise from the launch
+    and exit times seen by the driver and the size of its output file"""
+    start = report.get('start') or launch_time
+    finish = report.get('finish') or report['exited']
+    size = report.get('bytes')
+    if size is None:
+        size = get_file_size_bytes(f"{pref}received_data.txt")
+    return max(finish - start, 1e-9), size
+
 def run_trial(output_handle, bw=100, loss=0, delay_c2_ms=5, udp_off_mean=None, iteration=0, buffer_size=420):
-    setLogLevel('info')
     import time
 
-    controller_ip = '127.0.0.1'
-    controller_port = 6653
-
     # prefixes used by the client (must match client's behavior)
     pref_c1 = "1"
     pref_c2 = "2"
     SERVER_IP1 = "10.0.0.3"  # s1
-    SERVER_PORT1 = 6555
+    SERVER_PORT1 = PORTS[0]
     SERVER_IP2 = "10.0.0.4"  # s2
-    SERVER_PORT2 = 6556
+    SERVER_PORT2 = PORTS[1]
 
     OUTFILE = 'received_data.txt'  # client's receives are expected as {pref}received_data.txt
     print(f"--- Running trial: bw={bw}Mbps loss={loss}% delay_c2={delay_c2_ms}ms  udp_off_mean={udp_off_mean} iter={iteration} ---")
 
     # Build topology 
-    topo = DumbbellTopo(delay_c2_sw1=f"{delay_c2_ms}ms", bw=bw, loss=loss, buffer_size=buffer_size)
-    
-    net = Mininet(topo=topo, link=TCLink, controller=None)
-    remote_controller = RemoteController('c0', ip=controller_ip, port=controller_port)
-    net.addController(remote_controller)
-    net.start()
+    net = start_network(bw, loss, delay_c2_ms, buffer_size, (SERVER_PORT1, SERVER_PORT2))
     
 
     # get hosts (c1,c2,c3 and s1,s2,s3 )
@@ -154,8 +279,8 @@ def run_trial(output_handle, bw=100, loss=0, delay_c2_ms=5, udp_off_mean=None, i
     server_py = "p2_server.py"
 
 
-    s1_pid_raw = s1.cmdPrint(f"bash -c 'python3 {server_py} {s1.IP()} {SERVER_PORT1} > /tmp/s1_server.out 2>&1 & echo $!'").strip()
-    s2_pid_raw = s2.cmdPrint(f"bash -c 'python3 {server_py} {s2.IP()} {SERVER_PORT2} > /tmp/s2_server.out 2>&1 & echo $!'").strip()
+    s1_pid_raw = s1.cmdPrint(f"bash -c 'python3 {server_py} {s1.IP()} {SERVER_PORT1} --cc {CC_ALGO} --trace {LOG_DIR}/s1_trace.bin {SERVER_FLAGS} > {LOG_DIR}/s1_server.out 2>&1 & echo $!'").strip()
+    s2_pid_raw = s2.cmdPrint(f"bash -c 'python3 {server_py} {s2.IP()} {SERVER_PORT2} --cc {CC_ALGO} --trace {LOG_DIR}/s2_trace.bin {SERVER_FLAGS} > {LOG_DIR}/s2_server.out 2>&1 & echo $!'").strip()
     s1_pid = s1_pid_raw.split()[0] if s1_pid_raw else None
     s2_pid = s2_pid_raw.split()[0] if s2_pid_raw else None
     print(f"started server s1 pid: {s1_pid}, s2 pid: {s2_pid}")
@@ -167,14 +292,17 @@ def run_trial(output_handle, bw=100, loss=0, delay_c2_ms=5, udp_off_mean=None, i
     client_py = "p2_client.py"
 
 
-    c1_start_cmd = f"python3 {client_py} {s1.IP()} {SERVER_PORT1} {pref_c1}"
-    c2_start_cmd = f"python3 {client_py} {s2.IP()} {SERVER_PORT2} {pref_c2}"
+    c1_ip, c1_port = server_address(net, s1, SERVER_PORT1)
+    c2_ip, c2_port = server_address(net, s2, SERVER_PORT2)
+    report_sock, report_path = open_report_socket()
+    c1_start_cmd = f"python3 {client_py} {c1_ip} {c1_port} {pref_c1} --report {report_path} --digest {DIGEST}"
+    c2_start_cmd = f"python3 {client_py} {c2_ip} {c2_port} {pref_c2} --report {report_path} --digest {DIGEST}"
     
     start_time_c1 = time.time()
     start_time_c2 = time.time()
 
-    c1_pid_raw = c1.cmd(f"bash -c '{c1_start_cmd} > /tmp/{pref_c1}.out 2>&1 & echo $!'").strip()
-    c2_pid_raw = c2.cmd(f"bash -c '{c2_start_cmd} > /tmp/{pref_c2}.out 2>&1 & echo $!'").strip()
+    c1_pid_raw = c1.cmd(f"bash -c '{c1_start_cmd} > {LOG_DIR}/{pref_c1}.out 2>&1 & echo $!'").strip()
+    c2_pid_raw = c2.cmd(f"bash -c '{c2_start_cmd} > {LOG_DIR}/{pref_c2}.out 2>&1 & echo $!'").strip()
     if c1_pid_raw:
         c1_pid = c1_pid_raw.split()[0]
         print(f"started client 1 with PID: {c1_pid}")
@@ -191,53 +319,30 @@ def run_trial(output_handle, bw=100, loss=0, delay_c2_ms=5, udp_off_mean=None, i
 
     
 
-    end_time_c1 = None
-    end_time_c2 = None
-
-
-    while end_time_c1 is None or end_time_c2 is None:
-        if end_time_c1 is None:
-            try:
-                pg_c1 = c1.cmd(f"ps -p {c1_pid} -o pid= || true").strip()
-                if not pg_c1:
-                    end_time_c1 = time.time()
-                    print(f" client 1 completed at {end_time_c1}")
-            except Exception as e:
-                print("error checking client1:", e)
-                end_time_c1 = time.time()
-        if end_time_c2 is None:
-            try:
-                pg_c2 = c2.cmd(f"ps -p {c2_pid} -o pid= || true").strip()
-                if not pg_c2:
-                    end_time_c2 = time.time()
-                    print(f"client 2 completed at {end_time_c2}")
-            except Exception as e:
-                print("error checking client2:", e)
-                end_time_c2 = time.time()
-
-    print(f"client 1 finished at {end_time_c1}, client 2 finished at {end_time_c2}")
+    # Each client reports its own timestamps when it exits
+    try:
+        reports = wait_for_clients(report_sock, {pref_c1: (c1, c1_pid), pref_c2: (c2, c2_pid)})
+    finally:
+        close_report_socket(report_sock, report_path)
 
     # --- Kill any remaining server processes if still running ---
     print("stopping  servers (if still active)")
-    s1.cmd("pkill -f {server_py} || true")
-    s2.cmd("pkill -f {server_py} || true")
+    # (by PID: other trials of a parallel sweep run the same scripts)
+    s1.cmd(f"kill {s1_pid} 2>/dev/null || true")
+    s2.cmd(f"kill {s2_pid} 2>/dev/null || true")
     time.sleep(1)
 
 
     # Stop the network
     net.stop()
 
-    # compute durations
-    dur_c1 = max(end_time_c1 - start_time_c1, 1e-9)
-    dur_c2 = max(end_time_c2 - start_time_c2, 1e-9)
-
-    # compute MD5s using controller-local files
-    hash1 = compute_md5(f"{pref_c1}received_data.txt")
-    hash2 = compute_md5(f"{pref_c2}received_data.txt")
+    # compute durations and sizes, from the client reports where available
+    dur_c1, size1 = client_result(reports[pref_c1], start_time_c1, pref_c1)
+    dur_c2, size2 = client_result(reports[pref_c2], start_time_c2, pref_c2)
 
-    # compute file sizes if available on controller
-    size1 = get_file_size_bytes(f"{pref_c1}received_data.txt")
-    size2 = get_file_size_bytes(f"{pref_c2}received_data.txt")
+    # digests as reported by the clients (or of the controller-local files)
+    hash1 = output_digest(reports[pref_c1], pref_c1)
+    hash2 = output_digest(reports[pref_c2], pref_c2)
 
     # compute throughputs (Mbps) if sizes are available, else use 1/duration as a proxy
     if size1 is not None:
@@ -274,6 +379,7 @@ def experiment_fixed_bandwidth(exp_out, num_iterations=1):
 
     bw_list = [100, 200, 300, 400, 500, 600, 700, 800, 900, 1000]
     RTT_seconds = RTT_MS / 1000.0
+    trials = []
 
     for bw in bw_list:
         # compute buffer size in packets according to formula buffer = RTT * BW
@@ -281,51 +387,44 @@ def experiment_fixed_bandwidth(exp_out, num_iterations=1):
         buf_packets = max(1, int((RTT_seconds * bw_bps) / (MSS_BYTES * 8)))
         print(f"[fixed_bw] bw={bw}Mbps -> buffer_size={buf_packets} packets (RTT={RTT_MS}ms)")
         for i in range(num_iterations):
-            run_trial(exp_out, bw=bw,  iteration=i, buffer_size=buf_packets)
+            trials.append(trial_spec(bw=bw, iteration=i, buffer_size=buf_packets))
+    run_sweep(exp_out, trials)
 
 
 def experiment_varying_loss(exp_out, num_iterations=1):
     loss_rates = [0.0, 0.5, 1.0, 1.5, 2.0]
-    for loss in loss_rates:
-        for i in range(num_iterations):
-            run_trial(exp_out, bw=100, loss=loss, iteration=i,buffer_size=420)
+    trials = [trial_spec(bw=100, loss=loss, iteration=i, buffer_size=420)
+              for loss in loss_rates for i in range(num_iterations)]
+    run_sweep(exp_out, trials)
 
 
 def experiment_asymmetric_flows(exp_out, num_iterations=1):
-    for delay_c2 in range(5, 26, 5):  
-        for i in range(num_iterations):
-            run_trial(exp_out, bw=100, delay_c2_ms=delay_c2,iteration=i,buffer_size=420)
+    trials = [trial_spec(bw=100, delay_c2_ms=delay_c2, iteration=i, buffer_size=420)
+              for delay_c2 in range(5, 26, 5) for i in range(num_iterations)]
+    run_sweep(exp_out, trials)
 
 
 
 def run_trial_with_udp(output_handle, bw=100, loss=0, delay_c2_ms=5, udp_off_mean=1.0, iteration=0, buffer_size=420):
-    setLogLevel('info')
-
-    controller_ip = '127.0.0.1'
-    controller_port = 6653
 
     # prefixes used by the client 
     pref_c1 = "1"
     pref_c2 = "2"
     SERVER_IP1 = "10.0.0.3"  # s1
-    SERVER_PORT1 = 6555
+    SERVER_PORT1 = PORTS[0]
     SERVER_IP2 = "10.0.0.4"  # s2
-    SERVER_PORT2 = 6556
+    SERVER_PORT2 = PORTS[1]
     
     # UDP server and client IPs
     UDP_SERVER_IP = "10.0.0.6"  # s3
-    UDP_SERVER_PORT = 7777
+    UDP_SERVER_PORT = PORTS[2]
 
     OUTFILE = 'received_data.txt'  # client's receives are expected as {pref}received_data.txt
     print(f"--- Running trial with UDP: bw={bw}Mbps loss={loss}% delay_c2={delay_c2_ms}ms udp_off_mean={udp_off_mean}s iter={iteration} ---")
 
     # Build topology with UDP support
-    topo = DumbbellTopoWithUDP(delay_c2_sw1=f"{delay_c2_ms}ms", bw=bw, loss=loss, buffer_size=buffer_size)
-    
-    net = Mininet(topo=topo, link=TCLink, controller=None)
-    remote_controller = RemoteController('c0', ip=controller_ip, port=controller_port)
-    net.addController(remote_controller)
-    net.start()
+    net = start_network(bw, loss, delay_c2_ms, buffer_size, (SERVER_PORT1, SERVER_PORT2),
+                        udp_port=UDP_SERVER_PORT)
 
     # get hosts (c1,c2,c3 and s1,s2,s3)
     c1 = net.get('c1')
@@ -337,14 +436,14 @@ def run_trial_with_udp(output_handle, bw=100, loss=0, delay_c2_ms=5, udp_off_mea
 
     # Start TCP servers on s1 and s2 and capture their PIDs 
     server_py = 'p2_server.py'
-    s1_pid_raw = s1.cmd(f"bash -c 'python3 {server_py} {s1.IP()} {SERVER_PORT1} > /tmp/s1_server.out 2>&1 & echo $!'").strip()
-    s2_pid_raw = s2.cmd(f"bash -c 'python3 {server_py} {s2.IP()} {SERVER_PORT2} > /tmp/s2_server.out 2>&1 & echo $!'").strip()
+    s1_pid_raw = s1.cmd(f"bash -c 'python3 {server_py} {s1.IP()} {SERVER_PORT1} --cc {CC_ALGO} --trace {LOG_DIR}/s1_trace.bin {SERVER_FLAGS} > {LOG_DIR}/s1_server.out 2>&1 & echo $!'").strip()
+    s2_pid_raw = s2.cmd(f"bash -c 'python3 {server_py} {s2.IP()} {SERVER_PORT2} --cc {CC_ALGO} --trace {LOG_DIR}/s2_trace.bin {SERVER_FLAGS} > {LOG_DIR}/s2_server.out 2>&1 & echo $!'").strip()
     s1_pid = s1_pid_raw.split()[0] if s1_pid_raw else None
     s2_pid = s2_pid_raw.split()[0] if s2_pid_raw else None
     print(f"started TCP servers s1 pid: {s1_pid}, s2 pid: {s2_pid}")
     
     # Start UDP server on s3
-    s3_pid_raw = s3.cmd(f"bash -c 'python3 udp_server.py {s3.IP()} {UDP_SERVER_PORT} {udp_off_mean} > /tmp/s3_udp_server.out 2>&1 & echo $!'").strip()
+    s3_pid_raw = s3.cmd(f"bash -c 'python3 udp_server.py {s3.IP()} {UDP_SERVER_PORT} {udp_off_mean} > {LOG_DIR}/s3_udp_server.out 2>&1 & echo $!'").strip()
     s3_pid = s3_pid_raw.split()[0] if s3_pid_raw else None
     print(f"started UDP server s3 pid: {s3_pid}")
     
@@ -352,15 +451,18 @@ def run_trial_with_udp(output_handle, bw=100, loss=0, delay_c2_ms=5, udp_off_mea
 
     # Start TCP clients on c1 and c2 and capture PIDs 
     client_py = 'p2_client.py'
-    c1_start_cmd = f"python3 {client_py} {s1.IP()} {SERVER_PORT1} {pref_c1}"
-    c2_start_cmd = f"python3 {client_py} {s2.IP()} {SERVER_PORT2} {pref_c2}"
+    c1_ip, c1_port = server_address(net, s1, SERVER_PORT1)
+    c2_ip, c2_port = server_address(net, s2, SERVER_PORT2)
+    report_sock, report_path = open_report_socket()
+    c1_start_cmd = f"python3 {client_py} {c1_ip} {c1_port} {pref_c1} --report {report_path} --digest {DIGEST}"
+    c2_start_cmd = f"python3 {client_py} {c2_ip} {c2_port} {pref_c2} --report {report_path} --digest {DIGEST}"
     
     start_time_c1 = time.time()
     start_time_c2 = time.time()
     
 
-    c1_pid_raw = c1.cmd(f"bash -c '{c1_start_cmd} > /tmp/{pref_c1}.out 2>&1 & echo $!'").strip()
-    c2_pid_raw = c2.cmd(f"bash -c '{c2_start_cmd} > /tmp/{pref_c2}.out 2>&1 & echo $!'").strip()
+    c1_pid_raw = c1.cmd(f"bash -c '{c1_start_cmd} > {LOG_DIR}/{pref_c1}.out 2>&1 & echo $!'").strip()
+    c2_pid_raw = c2.cmd(f"bash -c '{c2_start_cmd} > {LOG_DIR}/{pref_c2}.out 2>&1 & echo $!'").strip()
     if c1_pid_raw:
         c1_pid = c1_pid_raw.split()[0]
         print(f"started TCP client 1 with PID: {c1_pid}")
@@ -376,58 +478,37 @@ def run_trial_with_udp(output_handle, bw=100, loss=0, delay_c2_ms=5, udp_off_mea
         c2_pid = None
 
     # Start UDP client on c3
-    c3_start_cmd = f"python3 udp_client.py {s3.IP()} {UDP_SERVER_PORT}"
-    c3_pid_raw = c3.cmd(f"bash -c '{c3_start_cmd} > /tmp/c3_udp_client.out 2>&1 & echo $!'").strip()
+    c3_ip, c3_port = server_address(net, s3, UDP_SERVER_PORT)
+    c3_start_cmd = f"python3 udp_client.py {c3_ip} {c3_port}"
+    c3_pid_raw = c3.cmd(f"bash -c '{c3_start_cmd} > {LOG_DIR}/c3_udp_client.out 2>&1 & echo $!'").strip()
     c3_pid = c3_pid_raw.split()[0] if c3_pid_raw else None
     print(f"started UDP client c3 with PID: {c3_pid}")
 
-    end_time_c1 = None
-    end_time_c2 = None
-
-    while end_time_c1 is None or end_time_c2 is None:
-        if end_time_c1 is None:
-            try:
-                pg_c1 = c1.cmd(f"ps -p {c1_pid} -o pid= || true").strip()
-                if not pg_c1:
-                    end_time_c1 = time.time()
-                    print(f" client 1 completed at {end_time_c1}")
-            except Exception as e:
-                print("error checking client1:", e)
-                end_time_c1 = time.time()
-        if end_time_c2 is None:
-            try:
-                pg_c2 = c2.cmd(f"ps -p {c2_pid} -o pid= || true").strip()
-                if not pg_c2:
-                    end_time_c2 = time.time()
-                    print(f"client 2 completed at {end_time_c2}")
-            except Exception as e:
-                print("error checking client2:", e)
-                end_time_c2 = time.time()
-
-    print(f"client 1 finished at {end_time_c1}, client 2 finished at {end_time_c2}")
+    # Each client reports its own timestamps when it exits
+    try:
+        reports = wait_for_clients(report_sock, {pref_c1: (c1, c1_pid), pref_c2: (c2, c2_pid)})
+    finally:
+        close_report_socket(report_sock, report_path)
 
     # --- Kill any remaining server processes if still running ---
     print("stopping servers (if still active)")
-    s1.cmd("pkill -f p2_server.py || true")
-    s2.cmd("pkill -f p2_server.py || true")
-    s3.cmd("pkill -f udp_server.py || true")
-    c3.cmd("pkill -f udp_client.py || true")
+    # (by PID: other trials of a parallel sweep run the same scripts)
+    s1.cmd(f"kill {s1_pid} 2>/dev/null || true")
+    s2.cmd(f"kill {s2_pid} 2>/dev/null || true")
+    s3.cmd(f"kill {s3_pid} 2>/dev/null || true")
+    c3.cmd(f"kill {c3_pid} 2>/dev/null || true")
     time.sleep(1)
 
     # Stop the network
     net.stop()
 
-    # compute durations
-    dur_c1 = max(end_time_c1 - start_time_c1, 1e-9)
-    dur_c2 = max(end_time_c2 - start_time_c2, 1e-9)
-
-    # compute MD5s using controller-local files
-    hash1 = compute_md5(f"{pref_c1}received_data.txt")
-    hash2 = compute_md5(f"{pref_c2}received_data.txt")
+    # compute durations and sizes, from the client reports where available
+    dur_c1, size1 = client_result(reports[pref_c1], start_time_c1, pref_c1)
+    dur_c2, size2 = client_result(reports[pref_c2], start_time_c2, pref_c2)
 
-    # compute file sizes if available on controller
-    size1 = get_file_size_bytes(f"{pref_c1}received_data.txt")
-    size2 = get_file_size_bytes(f"{pref_c2}received_data.txt")
+    # digests as reported by the clients (or of the controller-local files)
+    hash1 = output_digest(reports[pref_c1], pref_c1)
+    hash2 = output_digest(reports[pref_c2], pref_c2)
 
     # compute throughputs (Mbps) if sizes are available, else use 1/duration as a proxy
     if size1 is not None:
@@ -460,24 +541,220 @@ def run_trial_with_udp(output_handle, bw=100, loss=0, delay_c2_ms=5, udp_off_mea
 def experiment_background_udp(exp_out, num_iterations=1):
 
     udp_off_means = [1.5, 0.8, 0.5]
-    
+    trials = []
     for udp_off_mean in udp_off_means:
         print(f"[background_udp] Testing with UDP OFF mean={udp_off_mean}s")
         for i in range(num_iterations):
-            run_trial_with_udp(exp_out, bw=100, udp_off_mean=udp_off_mean, iteration=i,buffer_size=420)
+            trials.append(trial_spec(bw=100, udp_off_mean=udp_off_mean, iteration=i,
+                                     buffer_size=420, with_udp=True))
+    run_sweep(exp_out, trials)
+
+
+def trial_spec(bw=100, loss=0, delay_c2_ms=5, udp_off_mean=None, iteration=0, buffer_size=420,
+               with_udp=False):
+    """Parameters of one trial, as run_trial/run_trial_with_udp keyword arguments"""
+    return dict(bw=bw, loss=loss, delay_c2_ms=delay_c2_ms, udp_off_mean=udp_off_mean,
+                iteration=iteration, buffer_size=buffer_size, with_udp=with_udp)
+
+
+def trial_key(spec):
+    """The leading CSV columns (bw,loss,delay_c2_ms,udp_off_mean,iter) a trial's row starts with"""
+    return (f"{spec['bw']},{spec['loss']},{spec['delay_c2_ms']},{spec['udp_off_mean']},"
+            f"{spec['iteration']}")
+
+
+def completed_trials(csv_path):
+    """Keys of the complete rows already in a results CSV"""
+    done = set()
+    try:
+        with open(csv_path) as f:
+            next(f, None)  # header
+            for line in f:
+                fields = line.rstrip('\n').split(',')
+                if line.endswith('\n') and len(fields) == 15:
+                    done.add(','.join(fields[:5]))
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def truncate_partial_row(csv_path):
+    """Drop an incomplete last line left by an interrupted sweep"""
+    with open(csv_path, 'rb+') as f:
+        data = f.read()
+        if data and not data.endswith(b'\n'):
+            f.truncate(data.rfind(b'\n') + 1)
+
+
+def run_trial_spec(output_handle, spec):
+    params = dict(spec)
+    if params.pop('with_udp'):
+        run_trial_with_udp(output_handle, **params)
+    else:
+        run_trial(output_handle, **params)
+
+
+def append_row(output_handle, row, lock):
+    """Append one complete CSV row and make it durable before the next one"""
+    with lock:
+        output_handle.write(row)
+        output_handle.flush()
+        os.fsync(output_handle.fileno())
+
+
+def run_isolated_trial(spec, slot, log_dir):
+    """Run one trial in a worker process with its own directory, ports and
+    emulator, logging to log_dir; returns its CSV row, or None if it failed"""
+    shutil.rmtree(log_dir, ignore_errors=True)
+    os.makedirs(log_dir)
+    with tempfile.TemporaryDirectory(prefix='p2_trial_') as workdir:
+        # The scripts and data.txt, as seen from the sweep's directory
+        for name in os.listdir(HERE):
+            if name.endswith('.py'):
+                os.symlink(os.path.join(HERE, name), os.path.join(workdir, name))
+        os.symlink(os.path.abspath('data.txt'), os.path.join(workdir, 'data.txt'))
+
+        base = TRIAL_PORT_BASE + 10 * slot
+        job = {'spec': spec, 'cc': CC_ALGO, 'server_flags': SERVER_FLAGS, 'digest': DIGEST,
+               'ports': [base, base + 1, base + 2], 'log_dir': log_dir}
+        log_path = os.path.join(log_dir, 'trial.out')
+        with open(log_path, 'w') as log:
+            subprocess.run([sys.executable, os.path.join(HERE, 'p2_exp.py'), '--trial',
+                            json.dumps(job)], cwd=workdir, stdout=log, stderr=subprocess.STDOUT,
+                           check=False)
+        try:
+            with open(os.path.join(workdir, 'row.csv')) as f:
+                row = f.read()
+        except FileNotFoundError:
+            row = ''
+        if not row.endswith('\n'):
+            with open(log_path) as f:
+                tail = f.readlines()[-20:]
+            print(f"[sweep] trial {trial_key(spec)} failed (logs in {log_dir}):\n"
+                  f"{''.join(tail)}")
+            return None
+        return row
+
+
+def run_trial_worker(job_json):
+    """Entry point of a parallel sweep worker: one trial, row written to row.csv"""
+    global CC_ALGO, SERVER_FLAGS, BACKEND, PORTS, LOG_DIR, DIGEST
+    job = json.loads(job_json)
+    CC_ALGO = job['cc']
+    DIGEST = job['digest']
+    SERVER_FLAGS = job['server_flags']
+    BACKEND = 'local'
+    PORTS = tuple(job['ports'])
+    LOG_DIR = job['log_dir']
+    with open('row.csv', 'w') as f_out:
+        run_trial_spec(f_out, job['spec'])
+
+
+def run_sweep(output_handle, trials):
+    """Run a list of trials, up to JOBS at a time on the local backend,
+    skipping those already in the CSV when resuming"""
+    if RESUME:
+        done = completed_trials(output_handle.name)
+        skipped = [spec for spec in trials if trial_key(spec) in done]
+        trials = [spec for spec in trials if trial_key(spec) not in done]
+        if skipped:
+            print(f"[sweep] resuming: {len(skipped)} trials already done, {len(trials)} to run")
+
+    if JOBS <= 1 or BACKEND != 'local':
+        for spec in trials:
+            run_trial_spec(output_handle, spec)
+        return
+
+    log_root = os.path.join(LOG_DIR, os.path.splitext(os.path.basename(output_handle.name))[0])
+    print(f"[sweep] {JOBS} trials at a time, logs in {log_root}/trial_*")
+    lock = threading.Lock()
+    slots = queue.Queue()
+    for slot in range(JOBS):
+        slots.put(slot)
+
+    def run_one(spec):
+        slot = slots.get()
+        try:
+            print(f"[sweep] slot {slot}: trial {trial_key(spec)}")
+            log_dir = os.path.join(log_root, 'trial_' + trial_key(spec).replace(',', '_'))
+            row = run_isolated_trial(spec, slot, log_dir)
+        finally:
+            slots.put(slot)
+        if row is not None:
+            append_row(output_handle, row, lock)
+            print(f"[sweep] done: {row.strip()}")
+
+    with ThreadPoolExecutor(max_workers=JOBS) as pool:
+        list(pool.map(run_one, trials))
+
+
+def pop_option(argv, name, default=None):
+    """Remove '<name> <value>' from argv and return the value (or default)"""
+    if name not in argv:
+        return default
+    index = argv.index(name)
+    value = argv[index + 1] if index + 1 < len(argv) else ''
+    del argv[index:index + 2]
+    return value
 
 
 def run():
-    if len(sys.argv) < 2:
-        print("Usage: sudo python3 p2_exp.py {Exp_Name} Available Exp_Name values: fixed_bandwidth, varying_loss, asymmetric_flows, background_udp")
+    global CC_ALGO, SERVER_FLAGS, BACKEND, JOBS, RESUME, DIGEST
+    argv = sys.argv[1:]
+    if argv[:1] == ['--trial'] and len(argv) == 2:
+        run_trial_worker(argv[1])
+        return
+    BACKEND = pop_option(argv, '--backend', BACKEND)
+    jobs = pop_option(argv, '--jobs', '1')
+    DIGEST = pop_option(argv, '--digest', DIGEST)
+    if '--resume' in argv:
+        argv.remove('--resume')
+        RESUME = True
+    if not argv or BACKEND not in ('mininet', 'local') or not jobs.isdigit() \
+            or DIGEST not in ALGORITHMS:
+        print(f"Usage: sudo python3 p2_exp.py {{Exp_Name}} [reno|cubic|bbr] [server flags...] [--backend mininet|local] [--jobs N] [--resume] [--digest {'|'.join(ALGORITHMS)}] Available Exp_Name values: fixed_bandwidth, varying_loss, asymmetric_flows, background_udp")
         sys.exit(1)
 
-    exp_name = sys.argv[1]
+    if BACKEND == 'mininet' and Mininet is None:
+        print("Mininet is not installed; use --backend local")
+        sys.exit(1)
 
-    output_file = f'p2_fairness_{exp_name}.csv'
-    header = "bw,loss,delay_c2_ms,udp_off_mean,iter,md5_hash_1,md5_hash_2,ttc1,ttc2,size1_bytes,size2_bytes,thr1_mbps,thr2_mbps,link_util,jfi \n" 
-    f_out = open(output_file, 'w')
-    f_out.write(header)
+    # Concurrent trials need isolated emulator instances, so only the local
+    # backend runs them in parallel. Each trial keeps PROCESSES_PER_TRIAL
+    # processes busy, so --jobs 0 means as many trials as that fits on the cores
+    max_jobs = max(1, os.cpu_count() // PROCESSES_PER_TRIAL)
+    JOBS = min(int(jobs) or max_jobs, os.cpu_count())
+    if BACKEND != 'local' and JOBS > 1:
+        print("Parallel trials need --backend local; running one at a time")
+        JOBS = 1
+    elif JOBS > max_jobs:
+        print(f"Warning: --jobs {JOBS} oversubscribes {os.cpu_count()} cores "
+              f"({PROCESSES_PER_TRIAL} processes per trial); timings will be noisy. "
+              f"At most {max_jobs} is recommended")
+
+    exp_name = argv[0]
+    if len(argv) > 1:
+        CC_ALGO = argv[1]
+    SERVER_FLAGS = ' '.join(argv[2:])
+
+    # Plain Reno keeps the original file names; anything else gets a suffix
+    # such as _cubic or _reno_sack, and local-backend results end in _local
+    suffix = ''
+    if CC_ALGO != 'reno' or argv[2:]:
+        suffix = f'_{CC_ALGO}' + ''.join('_' + flag.lstrip('-').replace('-', '_')
+                                         for flag in argv[2:])
+    if DIGEST != 'md5':
+        suffix += f'_{DIGEST}'
+    if BACKEND == 'local':
+        suffix += '_local'
+    output_file = f'p2_fairness_{exp_name}{suffix}.csv'
+    header = f"bw,loss,delay_c2_ms,udp_off_mean,iter,{DIGEST}_hash_1,{DIGEST}_hash_2,ttc1,ttc2,size1_bytes,size2_bytes,thr1_mbps,thr2_mbps,link_util,jfi \n" 
+    if RESUME and os.path.exists(output_file):
+        truncate_partial_row(output_file)
+        f_out = open(output_file, 'a')
+    else:
+        f_out = open(output_file, 'w')
+        f_out.write(header)
 
     try:
         if exp_name == 'fixed_bandwidth':
@@ -4,67 +4,168 @@ Reliable UDP File Transfer Server with Congestion Control (Part 2)
 Implements TCP Reno-like congestion control
 """
 
+import argparse
+import bisect
+import collections
 import socket
 import struct
 import time
 import sys
 import os
 import select
+import signal
+
+# Modules shared by Part 1 and Part 2
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.pardir, 'common'))
+from batch_io import DatagramBatcher
+from congestion import CONTROLLERS, make_controller
+from read_ahead import ReadAheadSource
+from rtt_estimator import RttEstimator
+from sender_trace import (ACK, DUP_ACK, FAST_RETRANSMIT, RECOVERY_EXIT, RETRANSMIT, SEND,
+                          TIMEOUT, TraceWriter)
+
+# Metadata packet (file size), sent first when the request carries META_FLAG.
+# Its sequence number can never start a data segment.
+META_SEQ = 0xFFFFFFFF
+META_FLAG = b'M'
+
+# A request may name one stripe of the file: STRIPE_FLAG, then !HH (index,
+# count). The file is split into count ranges on segment boundaries and only
+# range index is sent, announced in the metadata packet. Sequence numbers
+# stay file offsets, so flows for different stripes write to one file.
+STRIPE_FLAG = b'S'
+
+# The pacer lets a late timer catch up by at most this much sending time,
+# which also bounds the burst a single wakeup may send
+PACING_HORIZON = 0.001
+
+# Packets sent less than this apart count as one burst in the burst size
+# statistics: about one 1200-byte packet time at 100 Mbit/s
+BURST_GAP = 0.0001
+
+# RFC 6675 DupThresh: a segment is lost once this many segments above it
+# have been SACKed
+DUP_THRESH = 3
+
+
+class InFlightSegment:
+    """Send state of one unacknowledged segment"""
+    __slots__ = ('send_time', 'retx_count', 'sacked', 'epoch', 'lost')
+
+    def __init__(self, send_time):
+        self.send_time = send_time
+        self.retx_count = 0
+        self.sacked = False
+        self.epoch = 0  # recovery epoch of the last retransmission
+        self.lost = None  # recovery epoch that deemed it lost, until retransmitted
 
 
 class CongestionControlServer:
-    def __init__(self, server_ip, server_port):
+    def __init__(self, server_ip, server_port, batch_io=False, sock=None, batcher=None,
+                 cc='reno', pacing=False, pacing_gain=1.25, sack=False, trace_path=None,
+                 trace_ring=None):
         self.server_ip = server_ip
         self.server_port = server_port
         self.MSS = 1180  # Maximum Segment Size (data per packet)
         self.MAX_PAYLOAD = 1180
         self.HEADER_SIZE = 20  # 4 + 8 + 8 bytes
 
-        # Socket
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.bind((self.server_ip, self.server_port))
+        # Socket (a MultiSessionServer passes in its shared socket and batcher)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((self.server_ip, self.server_port))
+            # Optional batched I/O: queue sends until flush, drain ACKs in bursts
+            batcher = DatagramBatcher(sock, recv_size=1024) if batch_io else None
+        self.sock = sock
+        self.batcher = batcher
         self.client_addr = None
 
+        # When a scheduler shares the socket between sessions, ACKs only open
+        # the window and the scheduler decides when this session may send
+        self.deferred_sends = False
+
         # File management
-        self.file_handle = None
-        self.file_size = 0
+        self.source = None  # ReadAheadSource
+        self.file_size = 0  # end of the data to send: file size, or end of the stripe
+        self.range_start = 0
+        self.wants_metadata = False
         self.next_seq_to_prepare = 0
 
         # Buffers
         self.send_buffer = {}  # {seq: data}
-        self.in_flight = {}    # {seq: {'send_time': float, 'retx_count': int}}
+        self.send_buffer_start = 0  # lowest seq still in send_buffer
+        self.in_flight = {}    # {seq: InFlightSegment}
+        # Unacknowledged seqs in ascending order: new data is always sent at
+        # LFS and ACKs remove from the front, so the oldest is in_flight_order[0]
+        self.in_flight_order = collections.deque()
 
         # Window management
         self.LAR = 0  # Last ACK Received
         self.LFS = 0  # Last Frame Sent
 
-        # Congestion Control
-        self.cwnd = self.MSS  # Start with 1 MSS
-        self.ssthresh = 64000  # Initial slow start threshold
-        self.in_slow_start = True
+        # Congestion Control (window arithmetic lives in the controller)
+        self.cc = make_controller(cc, self.MSS)
         self.bytes_acked_in_current_rtt = 0
 
+        # Pacing: spread new data at gain * cwnd / srtt (or the controller's
+        # own pacing rate) instead of sending the whole window back-to-back
+        self.pacing = pacing
+        self.pacing_gain = pacing_gain
+        self.next_send_time = 0.0
+
         # Fast Recovery state
         self.in_fast_recovery = False
         self.recovery_point = 0
 
+        # SACK-based loss recovery (RFC 6675): in_flight entries carry a
+        # sacked flag and the recovery epoch of their last retransmission,
+        # so each loss event retransmits every lost segment exactly once
+        self.sack = sack
+        self.sack_seen = False  # the client has sent SACK blocks
+        self.recovery_uses_sack = False  # else the current recovery is Reno's
+        self.recovery_epoch = 0
+        self.in_rto_recovery = False
+
+        # Scoreboard totals kept as ACKs arrive, so pipe never needs a walk
+        # of the window: SACKed bytes, the DUP_THRESH highest SACKed
+        # segments, and the segments deemed lost in this epoch but not yet
+        # retransmitted (lowest first). Segments below lost_scan have
+        # already been checked for loss in this epoch.
+        self.sacked_bytes = 0
+        self.top_sacked = []
+        self.lost_queue = collections.deque()
+        self.lost_bytes = 0
+        self.lost_scan = 0
+
         # ACK tracking
         self.last_ack = 0
         self.dup_ack_count = 0
 
-        # RTT and RTO
-        self.estimated_rtt = 0.5
-        self.dev_rtt = 0.25
-        self.rto = 1.0
-        self.min_rto = 0.2
-        self.max_rto = 60.0
+        # RTT and RTO (timestamp-echo samples, RFC 6298 smoothing)
+        self.rtt = RttEstimator(self.MSS)
 
         # Statistics and logging
         self.total_packets_sent = 0
         self.total_retransmissions = 0
-        self.cwnd_log = []
+        self.burst_sizes = collections.Counter()  # {packets sent back-to-back: count}
+        self.current_burst = 0
+        self.last_send_time = 0.0
         self.start_time = None
 
+        # Binary per-packet trace (sender_trace.py), opened when the transfer
+        # starts; trace_ring is its (segment_records, segments) ring size
+        self.trace_path = trace_path
+        self.trace_ring = trace_ring
+        self.trace = None
+
+    @property
+    def cwnd(self):
+        return self.cc.cwnd
+
+    @property
+    def ssthresh(self):
+        return self.cc.ssthresh
+
     def create_packet(self, seq_num, timestamp, timestamp_echo, data):
         """Create a packet with header and data"""
         header = struct.pack('!Idd', seq_num, timestamp, timestamp_echo)
@@ -77,173 +178,394 @@ class CongestionControlServer:
         ack_num, _, timestamp_echo = struct.unpack('!Idd', packet[:self.HEADER_SIZE])
         return ack_num, timestamp_echo
 
+    def parse_request(self, request):
+        """Return (wants_metadata, stripe) for a request; stripe is (index, count) or None"""
+        flags = request[1:]
+        wants_metadata = flags[:1] == META_FLAG
+        if wants_metadata:
+            flags = flags[1:]
+        stripe = None
+        if flags[:1] == STRIPE_FLAG and len(flags) >= 5:
+            index, count = struct.unpack('!HH', flags[1:5])
+            if index < count:
+                stripe = (index, count)
+        return wants_metadata, stripe
+
+    def parse_sack_blocks(self, packet):
+        """Parse the (start, end) SACK blocks that follow the ACK header"""
+        count = (len(packet) - self.HEADER_SIZE) // 8
+        return [struct.unpack_from('!II', packet, self.HEADER_SIZE + 8 * i) for i in range(count)]
+
     def load_file(self, filepath):
         """Open file and get size"""
         if not os.path.exists(filepath):
             print(f"Error: File {filepath} not found")
             sys.exit(1)
 
-        self.file_handle = open(filepath, 'rb')
-        self.file_size = os.path.getsize(filepath)
+        self.source = ReadAheadSource(filepath, self.MAX_PAYLOAD)
+        self.file_size = self.source.size
+        self.source.prefetch()
         print(f"Loaded file: {filepath}, size: {self.file_size} bytes")
 
+    def stripe_range(self, index, count):
+        """Byte range [start, end) of stripe index out of count, on segment boundaries"""
+        segments = (self.source.size + self.MAX_PAYLOAD - 1) // self.MAX_PAYLOAD
+        start = segments * index // count * self.MAX_PAYLOAD
+        end = min(segments * (index + 1) // count * self.MAX_PAYLOAD, self.source.size)
+        return start, end
+
+    def select_range(self, start, end):
+        """Send only bytes [start, end) of the file"""
+        self.range_start = start
+        self.file_size = end
+        self.LAR = self.LFS = self.last_ack = self.recovery_point = start
+        self.next_seq_to_prepare = self.send_buffer_start = start
+        self.source.release(start)
+        self.source.prefetch()
+
     def ensure_buffer_filled(self):
         """Read ahead to keep buffer filled"""
         # Buffer enough data for the current window
         buffer_target = min(self.LAR + int(self.cwnd * 4), self.file_size)
+        # and have the disk reads run the same distance ahead of the buffer
+        self.source.window = int(self.cwnd * 4)
 
         while self.next_seq_to_prepare < buffer_target:
-            chunk = self.file_handle.read(self.MAX_PAYLOAD)
-            if not chunk:
-                break
-
-            self.send_buffer[self.next_seq_to_prepare] = chunk
-            self.next_seq_to_prepare += len(chunk)
+            length = min(self.MAX_PAYLOAD, self.file_size - self.next_seq_to_prepare)
+            self.send_buffer[self.next_seq_to_prepare] = self.source.segment(
+                self.next_seq_to_prepare, length)
+            self.next_seq_to_prepare += length
 
     def clean_old_packets(self):
         """Remove acknowledged packets from buffer"""
         cleanup_threshold = max(0, self.LAR - int(self.cwnd * 2))
-        to_remove = [seq for seq in self.send_buffer if seq < cleanup_threshold]
-        for seq in to_remove:
-            del self.send_buffer[seq]
+        while self.send_buffer_start < cleanup_threshold:
+            chunk = self.send_buffer.pop(self.send_buffer_start, None)
+            if chunk is None:
+                break
+            self.send_buffer_start += len(chunk)
+        self.source.release(self.send_buffer_start)
 
     def send_packet(self, seq, data, is_retransmission=False):
         """Send a data packet"""
         timestamp = time.time()
         packet = self.create_packet(seq, timestamp, 0.0, data)
-        self.sock.sendto(packet, self.client_addr)
+        if self.batcher:
+            self.batcher.queue([packet], self.client_addr)
+        else:
+            self.sock.sendto(packet, self.client_addr)
 
         # Track in-flight
-        if seq not in self.in_flight:
-            self.in_flight[seq] = {'send_time': timestamp, 'retx_count': 0}
+        info = self.in_flight.get(seq)
+        if info is None:
+            self.in_flight[seq] = info = InFlightSegment(timestamp)
+            self.in_flight_order.append(seq)
         else:
-            self.in_flight[seq]['send_time'] = timestamp
-            self.in_flight[seq]['retx_count'] += 1
+            info.send_time = timestamp
+            info.retx_count += 1
+        if is_retransmission:
+            info.epoch = self.recovery_epoch
+
+        # Burst accounting: a gap longer than BURST_GAP ends the current burst
+        if timestamp - self.last_send_time > BURST_GAP and self.current_burst:
+            self.burst_sizes[self.current_burst] += 1
+            self.current_burst = 0
+        self.current_burst += 1
+        self.last_send_time = timestamp
 
         self.total_packets_sent += 1
         if is_retransmission:
             self.total_retransmissions += 1
+        if self.trace:
+            self.trace_event(RETRANSMIT if is_retransmission else SEND, seq, timestamp)
+
+    def window_open(self):
+        """True if cwnd has room and there is prepared data to send"""
+        return self.LFS - self.LAR < int(self.cwnd) and self.LFS < self.next_seq_to_prepare
+
+    def current_pacing_rate(self):
+        """Pacing rate in bytes/s, or None when new data should not be paced"""
+        if not self.pacing:
+            return None
+        rate = self.cc.pacing_rate()
+        if rate is None and self.rtt.srtt:
+            # Twice the gain in slow start so pacing does not slow its growth
+            gain = self.pacing_gain * (2 if self.cc.in_slow_start else 1)
+            rate = gain * self.cwnd / self.rtt.srtt
+        return rate
+
+    def next_send_deadline(self):
+        """When the pacer next allows a packet, or None if nothing is waiting on it"""
+        # In SACK recovery pipe, not LFS - LAR, limits new data
+        if not self.pacing or not (self.window_open() or self.sack_recovering()):
+            return None
+        if self.next_send_time <= time.time() or self.current_pacing_rate() is None:
+            return None
+        return self.next_send_time
+
+    def send_packets_in_window(self, max_packets=None):
+        """Send packets within the current congestion window, return how many were sent"""
+        if self.sack_recovering():
+            return self.send_recovery_packets(max_packets)
 
-    def send_packets_in_window(self):
-        """Send packets within the current congestion window"""
         # Effective window is min of cwnd and available data
         effective_window = int(self.cwnd)
+        rate = self.current_pacing_rate()
+        now = time.time()
 
+        sent = 0
         while (self.LFS - self.LAR < effective_window) and (self.LFS < self.next_seq_to_prepare):
+            if max_packets is not None and sent >= max_packets:
+                break
+            if rate and self.next_send_time > now:
+                break
             packet_data = self.send_buffer[self.LFS]
             self.send_packet(self.LFS, packet_data)
             self.LFS += len(packet_data)
-
-    def update_rtt(self, sample_rtt):
-        """Update RTT estimates and RTO"""
-        if sample_rtt <= 0:
+            sent += 1
+            if rate:
+                self.pace(len(packet_data), rate, now)
+        return sent
+
+    def pace(self, length, rate, now):
+        """Hold the next paced packet back by length bytes' worth of time at rate"""
+        # Credit from a late wakeup is capped at PACING_HORIZON
+        start = max(self.next_send_time, now - PACING_HORIZON)
+        self.next_send_time = start + length / rate
+
+    def sack_recovering(self):
+        """True while SACK-based recovery (after fast retransmit or RTO) is active"""
+        return self.recovery_uses_sack and (self.in_fast_recovery or self.in_rto_recovery)
+
+    def segment_length(self, seq):
+        """Length of the segment starting at seq"""
+        return min(self.MSS, self.file_size - seq)
+
+    def update_scoreboard(self, sack_blocks):
+        """Mark every in-flight segment fully covered by a SACK block"""
+        for start, end in sack_blocks:
+            # Segments start at multiples of MSS
+            seq = max(start, self.LAR)
+            seq += -seq % self.MSS
+            while seq < end:
+                info = self.in_flight.get(seq)
+                length = self.segment_length(seq)
+                if info is None or seq + length > end:
+                    break
+                if not info.sacked:
+                    info.sacked = True
+                    self.sacked_bytes += length
+                    if info.lost == self.recovery_epoch:
+                        info.lost = None
+                        self.lost_bytes -= length
+                    bisect.insort(self.top_sacked, seq)
+                    if len(self.top_sacked) > DUP_THRESH:
+                        del self.top_sacked[0]
+                seq += self.MSS
+
+    def start_recovery_epoch(self):
+        """Begin a loss event: every segment may be deemed lost (and
+        retransmitted) once more"""
+        self.recovery_epoch += 1
+        self.recovery_uses_sack = True
+        self.lost_queue.clear()
+        self.lost_bytes = 0
+        self.lost_scan = self.LAR
+
+    def update_lost(self):
+        """Queue the segments newly deemed lost, as in RFC 6675.
+
+        After fast retransmit a segment is lost once DUP_THRESH segments above
+        it are SACKed; after an RTO every un-SACKed segment sent before it is.
+        Both limits only rise within an epoch, so each segment is checked
+        once per epoch.
+        """
+        if self.in_rto_recovery:
+            limit = self.recovery_point
+        elif len(self.top_sacked) >= DUP_THRESH:
+            limit = self.top_sacked[0]
+        else:
             return
+        seq = max(self.lost_scan, self.LAR)
+        while seq < limit:
+            info = self.in_flight.get(seq)
+            # skip what is SACKed or was already retransmitted in this epoch
+            if info is not None and not info.sacked and info.epoch != self.recovery_epoch:
+                info.lost = self.recovery_epoch
+                self.lost_queue.append(seq)
+                self.lost_bytes += self.segment_length(seq)
+            seq += self.MSS
+        self.lost_scan = max(self.lost_scan, limit)
+
+    def pipe(self):
+        """RFC 6675 pipe: bytes in flight that are neither SACKed nor lost
+        and awaiting retransmission"""
+        return self.LFS - self.LAR - self.sacked_bytes - self.lost_bytes
+
+    def send_recovery_packets(self, max_packets=None):
+        """RFC 6675: retransmit lost segments, then new data, while pipe < cwnd.
+        At most max_packets are sent; new data is paced as outside recovery,
+        retransmissions are not"""
+        self.update_lost()
+        sent = 0
+        while self.lost_queue:
+            if max_packets is not None and sent >= max_packets:
+                return sent
+            if self.cwnd - self.pipe() < self.MSS:
+                return sent
+            seq = self.lost_queue.popleft()
+            info = self.in_flight.get(seq)
+            if info is None or info.lost != self.recovery_epoch:
+                continue  # acknowledged or SACKed since it was queued
+            info.lost = None
+            self.lost_bytes -= self.segment_length(seq)
+            self.send_packet(seq, self.send_buffer[seq], is_retransmission=True)
+            sent += 1
+
+        rate = self.current_pacing_rate()
+        now = time.time()
+        while self.cwnd - self.pipe() >= self.MSS and self.LFS < self.next_seq_to_prepare:
+            if max_packets is not None and sent >= max_packets:
+                break
+            if rate and self.next_send_time > now:
+                break
+            data = self.send_buffer[self.LFS]
+            self.send_packet(self.LFS, data)
+            self.LFS += len(data)
+            sent += 1
+            if rate:
+                self.pace(len(data), rate, now)
+        return sent
+
+    def burst_summary(self):
+        """Mean, median, 99th percentile and maximum burst size in packets"""
+        if self.current_burst:
+            self.burst_sizes[self.current_burst] += 1
+            self.current_burst = 0
+        total = sum(self.burst_sizes.values())
+        mean = sum(size * count for size, count in self.burst_sizes.items()) / total
+        percentiles = []
+        for q in (0.5, 0.99):
+            seen = 0
+            for size in sorted(self.burst_sizes):
+                seen += self.burst_sizes[size]
+                if seen >= q * total:
+                    percentiles.append(size)
+                    break
+        return mean, percentiles[0], percentiles[1], max(self.burst_sizes)
+
+    def handle_ack(self, ack_num, timestamp_echo, sack_blocks=()):
+        """Process received ACK with congestion control"""
+        now = time.time()
 
-        # Exponentially weighted moving average (RFC 6298)
-        alpha = 0.125
-        beta = 0.25
-
-        if self.estimated_rtt == 0:
-            self.estimated_rtt = sample_rtt
-            self.dev_rtt = sample_rtt / 2
-        else:
-            self.estimated_rtt = (1 - alpha) * self.estimated_rtt + alpha * sample_rtt
-            self.dev_rtt = (1 - beta) * self.dev_rtt + beta * abs(sample_rtt - self.estimated_rtt)
-
-        # Calculate RTO
-        self.rto = self.estimated_rtt + 4 * self.dev_rtt
-        self.rto = max(self.min_rto, min(self.rto, self.max_rto))
-
-    def increase_cwnd(self, bytes_acked):
-        """Increase congestion window based on current phase"""
-        if self.in_slow_start:
-            # Slow Start: increase by bytes_acked (exponential growth)
-            self.cwnd += bytes_acked
-
-            # Check if we should exit slow start
-            if self.cwnd >= self.ssthresh:
-                self.in_slow_start = False
-                print(f"Exiting slow start at cwnd={self.cwnd:.0f}, ssthresh={self.ssthresh}")
-        else:
-            # Congestion Avoidance: increase by MSS * (bytes_acked / cwnd)
-            # This gives approximately MSS per RTT
-            increment = self.MSS * bytes_acked / self.cwnd
-            self.cwnd += increment
+        if self.sack and sack_blocks:
+            self.sack_seen = True
+            self.update_scoreboard(sack_blocks)
 
-    def handle_ack(self, ack_num, timestamp_echo):
-        """Process received ACK with congestion control"""
-        # Update RTT if we have a valid timestamp echo
-        if timestamp_echo > 0 and ack_num in self.in_flight:
-            sample_rtt = time.time() - self.in_flight[ack_num]['send_time']
-            if sample_rtt > 0:
-                self.update_rtt(sample_rtt)
+        # RTT sample: the echoed send timestamp, or else (under Karn's rule)
+        # the send time of the newest segment this ACK covers
+        sample_rtt = self.rtt.sample_from_echo(now, timestamp_echo)
+        if sample_rtt is None and ack_num > self.last_ack:
+            newest = ((ack_num - 1) // self.MSS) * self.MSS
+            sample_rtt = self.rtt.sample_from_send_time(now, self.in_flight.get(newest))
+        self.rtt.update(sample_rtt, self.LFS - self.LAR)
 
         # Check if this is a new ACK or duplicate
         if ack_num > self.last_ack:
             # New ACK - advance window
             bytes_acked = ack_num - self.last_ack
 
-            # Exit fast recovery if we were in it
-            if self.in_fast_recovery:
+            # Exit fast recovery if we were in it (with SACK, only once
+            # everything outstanding at the loss is acknowledged)
+            if self.in_fast_recovery and (not self.recovery_uses_sack
+                                          or ack_num >= self.recovery_point):
                 self.in_fast_recovery = False
-                self.cwnd = self.ssthresh
+                self.cc.on_recovery_exit(now)
                 print(f"Exiting fast recovery, cwnd={self.cwnd:.0f}")
+                if self.trace:
+                    self.trace_event(RECOVERY_EXIT, ack_num, now)
+            if self.in_rto_recovery and ack_num >= self.recovery_point:
+                self.in_rto_recovery = False
 
-            # Increase congestion window
-            self.increase_cwnd(bytes_acked)
-
-            # Log cwnd
-            if self.start_time:
-                self.cwnd_log.append((time.time() - self.start_time, self.cwnd))
+            # Increase congestion window (not on partial ACKs during recovery)
+            if not self.in_fast_recovery:
+                self.cc.on_ack(bytes_acked, now, sample_rtt, self.LFS - ack_num)
 
             self.LAR = ack_num
             self.last_ack = ack_num
             self.dup_ack_count = 0
+            if self.trace:
+                self.trace_event(ACK, ack_num, now)
 
             # Remove acknowledged packets from in-flight
-            to_remove = [seq for seq in self.in_flight if seq < ack_num]
-            for seq in to_remove:
-                del self.in_flight[seq]
+            while self.in_flight_order and self.in_flight_order[0] < ack_num:
+                seq = self.in_flight_order.popleft()
+                info = self.in_flight.pop(seq)
+                if info.sacked:
+                    self.sacked_bytes -= self.segment_length(seq)
+                elif info.lost == self.recovery_epoch:
+                    self.lost_bytes -= self.segment_length(seq)
+            if self.top_sacked and self.top_sacked[0] < ack_num:
+                self.top_sacked = [seq for seq in self.top_sacked if seq >= ack_num]
 
             # Clean old buffered packets
             self.clean_old_packets()
 
             # Send more packets if window allows
             self.ensure_buffer_filled()
-            self.send_packets_in_window()
+            if not self.deferred_sends:
+                self.send_packets_in_window()
 
         elif ack_num == self.last_ack:
             # Duplicate ACK
             self.dup_ack_count += 1
+            if self.trace:
+                self.trace_event(DUP_ACK, ack_num, now)
 
             if self.in_fast_recovery:
-                # Inflate cwnd by MSS for each duplicate ACK (Fast Recovery)
-                self.cwnd += self.MSS
-                self.send_packets_in_window()
+                # Inflate cwnd by MSS for each duplicate ACK (Fast Recovery);
+                # SACK recovery counts pipe instead
+                if not self.recovery_uses_sack:
+                    self.cc.on_dup_ack(now)
+                if not self.deferred_sends:
+                    self.send_packets_in_window()
+            elif self.in_rto_recovery:
+                # Already repairing after a timeout: no further reduction
+                if not self.deferred_sends:
+                    self.send_packets_in_window()
             elif self.dup_ack_count == 3:
                 # Fast Retransmit
                 print(f"Fast retransmit triggered for seq {ack_num}, cwnd={self.cwnd:.0f}")
 
                 # Enter fast recovery
-                self.ssthresh = max(self.cwnd / 2, 2 * self.MSS)
-                self.cwnd = self.ssthresh + 3 * self.MSS
+                self.cc.on_loss(now, self.LFS - self.LAR)
                 self.in_fast_recovery = True
                 self.recovery_point = self.LFS
-                self.in_slow_start = False
 
-                # Log cwnd
-                if self.start_time:
-                    self.cwnd_log.append((time.time() - self.start_time, self.cwnd))
+                # Without SACK blocks from the client the scoreboard is
+                # empty: recover as Reno does
+                self.recovery_uses_sack = self.sack and self.sack_seen
+                if self.recovery_uses_sack:
+                    # pipe already excludes SACKed segments, so deflate the
+                    # window to ssthresh instead of inflating it
+                    self.cc.on_recovery_exit(now)
+                    self.start_recovery_epoch()
 
-                # Retransmit the missing packet
+                if self.trace:
+                    self.trace_event(FAST_RETRANSMIT, ack_num, now)
+
+                # Retransmit the first missing packet unconditionally (RFC
+                # 6675 section 5 step 4.3), then whatever the scoreboard allows
                 if ack_num in self.send_buffer:
                     self.send_packet(ack_num, self.send_buffer[ack_num], is_retransmission=True)
+                if self.recovery_uses_sack:
+                    self.send_recovery_packets()
 
     def get_oldest_unacked_seq(self):
         """Get sequence number of oldest unacknowledged packet"""
-        if not self.in_flight:
+        if not self.in_flight_order:
             return None
-        return min(self.in_flight.keys())
+        return self.in_flight_order[0]
 
     def get_timeout_deadline(self):
         """Calculate when the next timeout should occur"""
@@ -251,8 +573,13 @@ class CongestionControlServer:
         if oldest_seq is None:
             return None
 
-        send_time = self.in_flight[oldest_seq]['send_time']
-        return send_time + self.rto
+        send_time = self.in_flight[oldest_seq].send_time
+        return send_time + self.rtt.rto
+
+    def rto_expired(self):
+        """True if the oldest unacknowledged packet has timed out"""
+        deadline = self.get_timeout_deadline()
+        return deadline is not None and time.time() >= deadline
 
     def handle_timeout(self):
         """Handle retransmission timeout - severe congestion event"""
@@ -261,19 +588,42 @@ class CongestionControlServer:
             print(f"Timeout - retransmitting seq {oldest_seq}, cwnd={self.cwnd:.0f}")
 
             # Severe congestion: reset to slow start
-            self.ssthresh = max(self.cwnd / 2, 2 * self.MSS)
-            self.cwnd = self.MSS  # Reset to 1 MSS
-            self.in_slow_start = True
+            self.cc.on_timeout(time.time())
             self.in_fast_recovery = False
+            if self.sack and self.sack_seen:
+                # Everything un-SACKed sent so far is presumed lost; repair it
+                # in slow start, skipping what the receiver already holds
+                self.in_rto_recovery = True
+                self.recovery_point = self.LFS
+                self.start_recovery_epoch()
 
-            # Log cwnd
-            if self.start_time:
-                self.cwnd_log.append((time.time() - self.start_time, self.cwnd))
+            if self.trace:
+                self.trace_event(TIMEOUT, oldest_seq)
 
             if oldest_seq in self.send_buffer:
                 self.send_packet(oldest_seq, self.send_buffer[oldest_seq], is_retransmission=True)
                 # Exponential backoff for RTO
-                self.rto = min(self.rto * 2, self.max_rto)
+                self.rtt.backoff()
+
+    def flush_sends(self):
+        """Send any packets queued by the batched I/O layer"""
+        if self.batcher:
+            self.batcher.flush()
+
+    def receive_acks(self):
+        """Receive one ACK, plus every further ACK already queued when batching"""
+        packet, _ = self.sock.recvfrom(1024)
+        packets = [packet]
+        if self.batcher:
+            packets.extend(data for data, _ in self.batcher.recv_batch())
+        return packets
+
+    def send_metadata(self):
+        """Tell the client the file size (so it can preallocate its output) and
+        the byte range this transfer covers"""
+        payload = b'META' + struct.pack('!QQQ', self.source.size, self.range_start,
+                                        self.file_size)
+        self.sock.sendto(self.create_packet(META_SEQ, time.time(), 0.0, payload), self.client_addr)
 
     def send_eof(self):
         """Send EOF packet to signal end of transfer"""
@@ -288,37 +638,92 @@ class CongestionControlServer:
         print(f"Client connected: {addr}")
         return data
 
-    def save_cwnd_log(self):
-        """Save cwnd evolution to file for analysis"""
+    def trace_event(self, event, seq, now=None):
+        """Record an event with the current window, RTT and flight size"""
+        self.trace.record(event, seq, self.cwnd, self.ssthresh, self.rtt.srtt,
+                          self.LFS - self.LAR, now)
+
+    def close_trace(self):
+        """Write out and close the trace, if one is open"""
+        if not self.trace:
+            return
+        trace, self.trace = self.trace, None
         try:
-            with open('cwnd_log.txt', 'w') as f:
-                f.write("time,cwnd\n")
-                for t, cwnd in self.cwnd_log:
-                    f.write(f"{t:.3f},{cwnd:.0f}\n")
-            print("Congestion window log saved to cwnd_log.txt")
+            trace.close()
+            dropped = f", {trace.dropped} dropped" if trace.dropped else ""
+            print(f"Trace saved to {trace.path} ({trace.records} records{dropped})")
         except Exception as e:
-            print(f"Error saving cwnd log: {e}")
-
-    def run(self):
-        """Main server loop"""
-        # Wait for client request
-        self.wait_for_client()
+            print(f"Error saving trace: {e}")
 
+    def start_transfer(self, request, filepath='data.txt'):
+        """Load the file and prepare the first window for the client's request"""
         # Load file
-        self.load_file('data.txt')
+        self.load_file(filepath)
+        if self.trace_path:
+            self.trace = TraceWriter(self.trace_path, *(self.trace_ring or ()))
+
+        # Announce the file size if the client asked for it; a stripe's
+        # client learns its range from the metadata, so it always gets one
+        self.wants_metadata, stripe = self.parse_request(request)
+        if stripe is not None:
+            self.select_range(*self.stripe_range(*stripe))
+            self.wants_metadata = True
+            print(f"Stripe {stripe[0] + 1}/{stripe[1]}: bytes {self.range_start}-{self.file_size}")
+        if self.wants_metadata:
+            self.send_metadata()
 
         # Initialize buffers
         self.ensure_buffer_filled()
 
+    def transfer_done(self):
+        """True once every byte of the file has been acknowledged"""
+        return self.LAR >= self.file_size
+
+    def print_stats(self, end_time):
+        """Print transfer statistics"""
+        print(f"\n=== Transfer Complete ===")
+        print(f"Total time: {end_time - self.start_time:.2f} seconds")
+        print(f"File size: {self.source.size} bytes")
+        if self.range_start or self.file_size != self.source.size:
+            print(f"Range sent: bytes {self.range_start}-{self.file_size}")
+        print(f"Total packets sent: {self.total_packets_sent}")
+        print(f"Retransmissions: {self.total_retransmissions}")
+        print(f"Congestion control: {self.cc.name}")
+        print(f"RTT: {self.rtt.summary()}")
+        if self.source:
+            print(f"Read-ahead: {self.source.chunks_read} chunks of {self.source.chunk_size} bytes, "
+                  f"sender blocked on data {self.source.blocked} times")
+        print(f"Final cwnd: {self.cwnd:.0f} bytes")
+        print(f"Final ssthresh: {self.ssthresh:.0f} bytes")
+        sent_bytes = self.file_size - self.range_start
+        print(f"Throughput: {sent_bytes / max(end_time - self.start_time, 1e-9) / 1024:.2f} KB/s")
+        if self.burst_sizes or self.current_burst:
+            mean, p50, p99, largest = self.burst_summary()
+            print(f"Send bursts ({'paced' if self.pacing else 'unpaced'}): "
+                  f"{sum(self.burst_sizes.values())} bursts, mean {mean:.1f}, "
+                  f"p50 {p50}, p99 {p99}, max {largest} packets")
+
+    def run(self):
+        """Main server loop"""
+        # Wait for client request
+        request = self.wait_for_client()
+
+        # Load file and fill the send buffer
+        self.start_transfer(request)
+
         # Send initial window
         self.send_packets_in_window()
+        self.flush_sends()
 
         self.start_time = time.time()
 
         # Main loop
         while self.LAR < self.file_size:
-            # Calculate timeout for select
+            # Calculate timeout for select: the RTO or the pacer, whichever is first
             deadline = self.get_timeout_deadline()
+            send_at = self.next_send_deadline()
+            if send_at is not None:
+                deadline = send_at if deadline is None else min(deadline, send_at)
             if deadline is not None:
                 timeout = max(0.001, deadline - time.time())
             else:
@@ -328,19 +733,25 @@ class CongestionControlServer:
             ready, _, _ = select.select([self.sock], [], [], timeout)
 
             if ready:
-                # Receive ACK
+                # Receive ACK(s)
                 try:
-                    packet, addr = self.sock.recvfrom(1024)
-                    ack_num, timestamp_echo = self.parse_ack(packet)
+                    for packet in self.receive_acks():
+                        ack_num, timestamp_echo = self.parse_ack(packet)
 
-                    if ack_num is not None:
-                        self.handle_ack(ack_num, timestamp_echo)
+                        if ack_num is not None:
+                            self.handle_ack(ack_num, timestamp_echo,
+                                            self.parse_sack_blocks(packet))
                 except Exception as e:
                     print(f"Error receiving ACK: {e}")
-            else:
+            elif self.rto_expired() or not self.pacing:
                 # Timeout occurred
                 self.handle_timeout()
 
+            # Release whatever the pacer allows by now
+            if self.pacing:
+                self.send_packets_in_window()
+            self.flush_sends()
+
         # Send EOF
         self.send_eof()
 
@@ -364,40 +775,274 @@ class CongestionControlServer:
         end_time = time.time()
 
         # Statistics
-        print(f"\n=== Transfer Complete ===")
-        print(f"Total time: {end_time - self.start_time:.2f} seconds")
-        print(f"File size: {self.file_size} bytes")
-        print(f"Total packets sent: {self.total_packets_sent}")
-        print(f"Retransmissions: {self.total_retransmissions}")
-        print(f"Final cwnd: {self.cwnd:.0f} bytes")
-        print(f"Final ssthresh: {self.ssthresh:.0f} bytes")
-        print(f"Throughput: {self.file_size / (end_time - self.start_time) / 1024:.2f} KB/s")
+        self.print_stats(end_time)
+        if self.batcher:
+            print(f"Batched I/O: {self.batcher.datagrams_sent} datagrams in "
+                  f"{self.batcher.send_calls} send calls, "
+                  f"{self.batcher.datagrams_received} ACKs in {self.batcher.recv_calls} receive calls")
 
-        # Save cwnd log
-        self.save_cwnd_log()
+        # Save the trace
+        self.close_trace()
 
         # Cleanup
-        if self.file_handle:
-            self.file_handle.close()
+        if self.source:
+            self.source.close()
         self.sock.close()
 
 
-def main():
-    if len(sys.argv) != 3:
-        print("Usage: python3 p2_server.py <SERVER_IP> <SERVER_PORT>")
-        sys.exit(1)
+class MultiSessionServer:
+    """Serve many concurrent downloads from one socket and one event loop.
+
+    Datagrams are demultiplexed by client address: a request from a new
+    address opens a session (a CongestionControlServer sharing this socket),
+    everything else is an ACK for an existing session. Each session keeps its
+    own congestion state; sends are scheduled round-robin, at most `quantum`
+    packets per session per round, so every session with an open window gets
+    an equal share of each scheduling pass.
+    """
 
-    server_ip = sys.argv[1]
-    server_port = int(sys.argv[2])
+    EOF_RETRIES = 5
+    EOF_RETRY_INTERVAL = 1.0
+    # Per-session trace ring: 2 segments of 1024 records, 64 KiB per session
+    TRACE_RING = (1024, 2)
 
-    server = CongestionControlServer(server_ip, server_port)
+    def __init__(self, server_ip, server_port, file_path='data.txt', batch_io=False,
+                 quantum=4, max_sessions=None, cc='reno', pacing=False, pacing_gain=1.25,
+                 sack=False, sock=None, trace=None):
+        self.server_ip = server_ip
+        self.server_port = server_port
+        self.file_path = file_path
+        self.trace = trace  # None, or per-session traces named <stem>_<ip>_<port><ext>
+        self.cc = cc
+        self.pacing = pacing
+        self.pacing_gain = pacing_gain
+        self.sack = sack
+        self.quantum = quantum
+        self.max_sessions = max_sessions
+        self.HEADER_SIZE = 20
+
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((self.server_ip, self.server_port))
+        else:
+            # Caller-provided sender (e.g. an asyncio transport): sendto() only
+            batch_io = False
+        self.sock = sock
+        self.batcher = DatagramBatcher(self.sock, recv_size=1024) if batch_io else None
+
+        self.sessions = {}  # {client_addr: CongestionControlServer} transferring data
+        self.closing = {}   # {client_addr: [session, eof_deadline, eof_attempts]}
+        self.completed = 0
+        self.rr_start = 0   # rotates the first session of each scheduling round
+
+    def open_session(self, request, addr):
+        """Start a transfer for a new client"""
+        session = CongestionControlServer(self.server_ip, self.server_port,
+                                          sock=self.sock, batcher=self.batcher, cc=self.cc,
+                                          pacing=self.pacing, pacing_gain=self.pacing_gain,
+                                          sack=self.sack, trace_path=self.trace_path(addr),
+                                          trace_ring=self.TRACE_RING)
+        session.client_addr = addr
+        session.deferred_sends = True
+        session.start_transfer(request, self.file_path)
+        session.start_time = time.time()
+        self.sessions[addr] = session
+        print(f"Client connected: {addr} ({len(self.sessions)} active)")
+        if session.transfer_done():
+            self.begin_close(addr)
+
+    def trace_path(self, addr):
+        """Trace file for a client's session, or None when tracing is off"""
+        if not self.trace:
+            return None
+        stem, ext = os.path.splitext(self.trace)
+        return f"{stem}_{addr[0]}_{addr[1]}{ext}"
+
+    def begin_close(self, addr):
+        """All data acknowledged: send EOF and wait for its ACK"""
+        session = self.sessions.pop(addr)
+        session.send_eof()
+        self.closing[addr] = [session, time.time() + self.EOF_RETRY_INTERVAL, 1]
+
+    def finish_session(self, addr):
+        """Report and drop a session once EOF is acknowledged or retries run out"""
+        session, _, _ = self.closing.pop(addr)
+        print(f"Client {addr} done")
+        session.print_stats(time.time())
+        session.close_trace()
+        if session.source:
+            session.source.close()
+        self.completed += 1
+
+    def dispatch(self, packet, addr):
+        """Route one datagram to its session"""
+        session = self.sessions.get(addr)
+        if session is not None:
+            # Short datagrams are repeated requests, not ACKs
+            if len(packet) >= self.HEADER_SIZE:
+                ack_num, timestamp_echo = session.parse_ack(packet)
+                session.handle_ack(ack_num, timestamp_echo, session.parse_sack_blocks(packet))
+                if session.transfer_done():
+                    self.begin_close(addr)
+            elif packet[:1] == b'R' and session.wants_metadata:
+                # The client is still waiting for its metadata: it was lost
+                session.send_metadata()
+        elif addr in self.closing:
+            ack_num, _ = self.closing[addr][0].parse_ack(packet)
+            if ack_num == self.closing[addr][0].file_size:
+                self.finish_session(addr)
+        elif packet[:1] == b'R':
+            self.open_session(packet, addr)
+
+    def schedule_sends(self):
+        """Round-robin sends across sessions until no window has room"""
+        active = list(self.sessions.values())
+        if not active:
+            return
+        start = self.rr_start % len(active)
+        active = active[start:] + active[:start]
+        self.rr_start += 1
+        while True:
+            sent = 0
+            for session in active:
+                sent += session.send_packets_in_window(self.quantum)
+            if not sent:
+                break
+
+    def next_timeout(self):
+        """Time until the earliest retransmission, pacing or EOF retry deadline"""
+        deadlines = [session.get_timeout_deadline() for session in self.sessions.values()]
+        deadlines.extend(session.next_send_deadline() for session in self.sessions.values())
+        deadlines.extend(deadline for _, deadline, _ in self.closing.values())
+        deadlines = [d for d in deadlines if d is not None]
+        if not deadlines:
+            return 1.0
+        return max(0.001, min(deadlines) - time.time())
+
+    def handle_timeouts(self):
+        """Fire every expired retransmission timer and EOF retry"""
+        now = time.time()
+        for session in self.sessions.values():
+            deadline = session.get_timeout_deadline()
+            if deadline is not None and deadline <= now:
+                session.handle_timeout()
+
+        for addr, entry in list(self.closing.items()):
+            session, deadline, attempts = entry
+            if deadline > now:
+                continue
+            if attempts >= self.EOF_RETRIES:
+                self.finish_session(addr)
+            else:
+                session.send_eof()
+                entry[1] = now + self.EOF_RETRY_INTERVAL
+                entry[2] = attempts + 1
+
+    def receive_packets(self):
+        """Receive one datagram, plus every further datagram already queued when batching"""
+        packets = [self.sock.recvfrom(1024)]
+        if self.batcher:
+            packets.extend(self.batcher.recv_batch())
+        return packets
+
+    def serving(self):
+        """Serve until max_sessions transfers have completed (forever if unset)"""
+        if self.max_sessions is None:
+            return True
+        return self.completed < self.max_sessions or self.sessions or self.closing
+
+    def close_sessions(self):
+        """Release the file sources and traces of every unfinished session"""
+        for session in list(self.sessions.values()) + [e[0] for e in self.closing.values()]:
+            if session.source:
+                session.source.close()
+            session.close_trace()
+
+    def run(self):
+        """Main event loop"""
+        print(f"Server listening on {self.server_ip}:{self.server_port} (multi-session)")
+        try:
+            while self.serving():
+                self.schedule_sends()
+                if self.batcher:
+                    self.batcher.flush()
+
+                ready, _, _ = select.select([self.sock], [], [], self.next_timeout())
+                if ready:
+                    try:
+                        for packet, addr in self.receive_packets():
+                            self.dispatch(packet, addr)
+                    except Exception as e:
+                        print(f"Error receiving packet: {e}")
+
+                self.handle_timeouts()
+                if self.batcher:
+                    self.batcher.flush()
+        finally:
+            self.close_sessions()
+            self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        usage="python3 p2_server.py <SERVER_IP> <SERVER_PORT> [options]")
+    parser.add_argument('server_ip')
+    parser.add_argument('server_port', type=int)
+    parser.add_argument('--batch-io', action='store_true',
+                        help="Batch datagram sends/receives (sendmmsg/recvmmsg where available)")
+    parser.add_argument('--multi', action='store_true',
+                        help="Serve concurrent clients from one socket instead of a single transfer")
+    parser.add_argument('--max-sessions', type=int, default=None,
+                        help="Multi-session: exit after this many transfers (default: serve forever)")
+    parser.add_argument('--quantum', type=int, default=4,
+                        help="Multi-session: packets each session may send per scheduling round")
+    parser.add_argument('--cc', choices=sorted(CONTROLLERS), default='reno',
+                        help="Congestion control algorithm")
+    parser.add_argument('--pacing', action='store_true',
+                        help="Pace new data at gain * cwnd / srtt instead of sending window bursts")
+    parser.add_argument('--pacing-gain', type=float, default=1.25,
+                        help="Pacing: rate multiplier over cwnd / srtt (doubled in slow start)")
+    parser.add_argument('--sack', action='store_true',
+                        help="Use the client's SACK blocks for RFC 6675 loss recovery")
+    parser.add_argument('--trace', default=None,
+                        help="Binary per-packet trace file, read with sender_trace.py "
+                             "(default: cwnd_trace_<SERVER_PORT>.bin; multi-session: off "
+                             "unless given, then one per client named <stem>_<ip>_<port><ext>)")
+    parser.add_argument('--no-trace', dest='trace', action='store_const', const='',
+                        help="Do not record a trace")
+    args = parser.parse_args()
+
+    # Drivers stop servers with SIGTERM; exit through the finally clauses so
+    # traces are written out
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    if args.multi:
+        server = MultiSessionServer(args.server_ip, args.server_port, batch_io=args.batch_io,
+                                    quantum=args.quantum, max_sessions=args.max_sessions,
+                                    cc=args.cc, pacing=args.pacing, pacing_gain=args.pacing_gain,
+                                    sack=args.sack, trace=args.trace or None)
+        try:
+            server.run()
+        except KeyboardInterrupt:
+            print("\nServer interrupted")
+        return
+
+    # The default trace is per port, so servers sharing a directory never share a file
+    trace_path = args.trace or None
+    if args.trace is None:
+        trace_path = f"cwnd_trace_{args.server_port}.bin"
+    server = CongestionControlServer(args.server_ip, args.server_port, batch_io=args.batch_io,
+                                     cc=args.cc, pacing=args.pacing, pacing_gain=args.pacing_gain,
+                                     sack=args.sack, trace_path=trace_path)
     try:
         server.run()
     except KeyboardInterrupt:
         print("\nServer interrupted")
-        if server.file_handle:
-            server.file_handle.close()
+        if server.source:
+            server.source.close()
         server.sock.close()
+    finally:
+        server.close_trace()
 
 
 if __name__ == "__main__":
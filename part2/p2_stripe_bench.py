@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Aggregate throughput of striped Part 2 downloads versus the number of flows.
+
+Usage:
+    python3 p2_stripe_bench.py [size_mb] [link options] [extra server args...]
+
+Transfers a random file of <size_mb> megabytes (default 8) through
+link_emulator.py on 127.0.0.1 -- by default a 100 Mbit/s link with 10 ms
+one-way delay and a 100-packet drop-tail queue, like the fixed bandwidth
+experiment -- using p2_client.py --streams N for N = 1, 2, 4 and 8 against
+p2_server.py --multi. Reports, for each N, the wall-clock time, the goodput
+and whether the output matched. Link options: --bw MBPS, --delay MS,
+--loss PERCENT, --buffer PACKETS, --streams N [N ...]. Any other arguments are
+passed to p2_server.py so that its modes (--cc, --sack, ...) can be compared.
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SERVER_PY = os.path.join(HERE, "p2_server.py")
+CLIENT_PY = os.path.join(HERE, "p2_client.py")
+EMULATOR_PY = os.path.join(HERE, os.pardir, "common", "link_emulator.py")
+
+SERVER_IP = "127.0.0.1"
+BASE_PORT = 18555
+SERVER_TIMEOUT = 30  # seconds the server may outlive the client before it is killed
+
+
+def run_once(workdir, port, streams, link_args, server_args=()):
+    """Run one striped transfer and return (wall_s, ok)."""
+    out_file = os.path.join(workdir, "received_data.txt")
+    if os.path.exists(out_file):
+        os.remove(out_file)
+
+    server = subprocess.Popen(
+        [sys.executable, SERVER_PY, SERVER_IP, str(port), "--multi",
+         "--max-sessions", str(streams), *server_args],
+        cwd=workdir, stdout=subprocess.DEVNULL,
+    )
+    link = subprocess.Popen(
+        [sys.executable, EMULATOR_PY, "--route", f"{port + 1}:{SERVER_IP}:{port}", *link_args],
+        cwd=workdir, stdout=subprocess.DEVNULL,
+    )
+    time.sleep(0.5)
+
+    start = time.time()
+    subprocess.run(
+        [sys.executable, CLIENT_PY, SERVER_IP, str(port + 1), "", "--streams", str(streams)],
+        cwd=workdir, stdout=subprocess.DEVNULL, check=False,
+    )
+    wall = time.time() - start
+    try:
+        server.wait(timeout=SERVER_TIMEOUT)
+        server_done = True
+    except subprocess.TimeoutExpired:
+        # a flow never completed, so the server is still serving it
+        server.kill()
+        server.wait()
+        server_done = False
+    link.send_signal(signal.SIGINT)
+    link.wait()
+
+    if not server_done or not os.path.exists(out_file):
+        return wall, False
+    with open(os.path.join(workdir, "data.txt"), "rb") as src, \
+            open(out_file, "rb") as dst:
+        ok = src.read() == dst.read()
+    return wall, ok
+
+
+def main():
+    parser = argparse.ArgumentParser(usage=__doc__.split("Usage:")[1].split("\n\n")[0])
+    parser.add_argument("size_mb", nargs="?", type=float, default=8.0)
+    parser.add_argument("--bw", type=float, default=100.0)
+    parser.add_argument("--delay", type=float, default=10.0)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--buffer", type=int, default=100)
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 2, 4, 8])
+    args, server_args = parser.parse_known_args()
+    link_args = ["--bw", str(args.bw), "--delay", str(args.delay),
+                 "--loss", str(args.loss), "--buffer", str(args.buffer)]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        with open(os.path.join(workdir, "data.txt"), "wb") as f:
+            f.write(os.urandom(int(args.size_mb * 1024 * 1024)))
+
+        print("streams,wall_s,goodput_mbps,ok")
+        for i, streams in enumerate(args.streams):
+            wall, ok = run_once(workdir, BASE_PORT + 2 * i, streams, link_args,
+                                server_args=server_args)
+            print(f"{streams},{wall:.3f},{args.size_mb * 8 * 1.048576 / wall:.2f},{ok}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Background read-ahead for the Part 2 server.
+
+ReadAheadSource keeps file chunks ahead of the sender's read position, read
+with os.pread() on a thread pool shared by every transfer in the process, so
+the ACK path never waits on the disk unless the sender outruns the reader.
+How far ahead it reads is set by the sender through window (in bytes, a
+small multiple of cwnd), so a slow or short transfer does not pin megabytes
+of memory; a ring of max_chunks chunks is the hard limit. Segments are
+handed out as memoryview slices of those chunks; chunks are a whole number
+of segments long so no segment straddles two of them.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared by every source in the process; threads start on first use
+READ_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix='read-ahead')
+
+
+class ReadAheadSource:
+    """Read-only file source with asynchronous, bounded read-ahead.
+
+    Chunk i covers bytes [i * chunk_size, (i + 1) * chunk_size). Chunks are
+    read up to window bytes past the last segment handed out, and at most
+    max_chunks chunks, starting from the oldest one not yet released, are
+    kept in memory or in flight.
+    """
+
+    def __init__(self, path, segment_size, chunk_size=1 << 18, max_chunks=32, window=None):
+        self.fd = os.open(path, os.O_RDONLY)
+        self.size = os.fstat(self.fd).st_size
+        self.segment_size = segment_size
+        self.chunk_size = max(1, chunk_size // segment_size) * segment_size
+        self.max_chunks = max_chunks
+        self.window = self.chunk_size if window is None else window
+
+        self.chunks = {}   # {chunk index: memoryview}
+        self.pending = {}  # {chunk index: Future}
+        self.base_chunk = 0  # lowest chunk index still needed
+        self.prefetch_end = 0  # every chunk below this byte offset has been requested
+
+        # Statistics
+        self.chunks_read = 0
+        self.blocked = 0  # segment() had to wait for a read to finish
+
+    def read_chunk(self, index):
+        """Read one chunk (runs on the thread pool)"""
+        return os.pread(self.fd, self.chunk_size, index * self.chunk_size)
+
+    def prefetch(self, offset=None):
+        """Start reads for the missing chunks from offset (default: the oldest
+        chunk still needed) to window bytes past it, within the ring"""
+        first = self.base_chunk
+        if offset is not None:
+            first = max(first, offset // self.chunk_size)
+            end = min(offset + self.window, self.size)
+        else:
+            end = min(first * self.chunk_size + self.window, self.size)
+        last = min(self.base_chunk + self.max_chunks,
+                   (end + self.chunk_size - 1) // self.chunk_size)
+        for index in range(first, last):
+            if index not in self.chunks and index not in self.pending:
+                self.pending[index] = READ_POOL.submit(self.read_chunk, index)
+        self.prefetch_end = max(self.prefetch_end, min(last * self.chunk_size, self.size))
+
+    def chunk(self, index):
+        """Return chunk index as a memoryview, waiting for its read if needed"""
+        view = self.chunks.get(index)
+        if view is not None:
+            return view
+        future = self.pending.pop(index, None)
+        if future is None or not future.done():
+            self.blocked += 1
+        data = future.result() if future is not None else self.read_chunk(index)
+        self.chunks_read += 1
+        view = self.chunks[index] = memoryview(data)
+        return view
+
+    def segment(self, offset, length):
+        """Return length bytes at offset as a memoryview (zero-copy)"""
+        index, start = divmod(offset, self.chunk_size)
+        # Only look for new chunks once the read-ahead window crosses into one
+        if min(offset + self.window, self.size) > self.prefetch_end:
+            self.prefetch(offset)
+        return self.chunk(index)[start:start + length]
+
+    def release(self, offset):
+        """Drop chunks that end at or below offset; views still in use stay valid"""
+        base = offset // self.chunk_size
+        for index in range(self.base_chunk, base):
+            self.chunks.pop(index, None)
+            future = self.pending.pop(index, None)
+            if future is not None:
+                future.cancel()
+        self.base_chunk = max(self.base_chunk, base)
+
+    def close(self):
+        """Cancel outstanding reads, wait for those already running and close the file"""
+        for future in self.pending.values():
+            future.cancel()
+        for future in self.pending.values():
+            if not future.cancelled():
+                future.result()
+        self.pending.clear()
+        self.chunks.clear()
+        os.close(self.fd)
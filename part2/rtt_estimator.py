@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Round-trip time estimation for the Part 2 server.
+
+Every data packet carries its send time and the client echoes it back in
+the ACK it triggers (the timestamp_echo header field), so each ACK yields
+an RTT sample that is unambiguous even for retransmitted segments, in the
+manner of the TCP timestamps option (RFC 7323). ACKs without an echo fall
+back to the send time of the newest segment they acknowledge, under Karn's
+rule: segments that were retransmitted give no sample.
+
+Samples feed the RFC 6298 SRTT/RTTVAR filter and the retransmission
+timeout. Because nearly every ACK produces a sample, the filter gains are
+divided by the number of samples expected per round trip (RFC 7323,
+appendix G) so that the estimate still averages over about eight RTTs.
+"""
+
+import math
+
+
+class RttEstimator:
+    """SRTT/RTTVAR/RTO state for one transfer, plus min RTT tracking."""
+
+    ALPHA = 0.125
+    BETA = 0.25
+    K = 4
+    CLOCK_GRANULARITY = 0.001
+
+    def __init__(self, mss, initial_rto=1.0, min_rto=0.2, max_rto=60.0):
+        self.mss = mss
+        self.srtt = None
+        self.rttvar = None
+        self.min_rtt = None
+        self.latest_rtt = None
+        self.rto = initial_rto
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.samples = 0
+        self.karn_skipped = 0
+
+    def sample_from_echo(self, now, timestamp_echo):
+        """RTT sample from an echoed send timestamp, or None if there is none"""
+        if timestamp_echo <= 0 or timestamp_echo > now:
+            return None
+        return now - timestamp_echo
+
+    def sample_from_send_time(self, now, info):
+        """Fallback RTT sample from an in-flight segment record, applying Karn's rule"""
+        if info is None:
+            return None
+        if info.retx_count:
+            # Ambiguous: the ACK may be for either transmission
+            self.karn_skipped += 1
+            return None
+        return now - info.send_time
+
+    def update(self, rtt, bytes_in_flight):
+        """Fold an RTT sample into SRTT/RTTVAR and recompute the RTO"""
+        if rtt is None or rtt <= 0:
+            return
+        self.samples += 1
+        self.latest_rtt = rtt
+        if self.min_rtt is None or rtt < self.min_rtt:
+            self.min_rtt = rtt
+
+        if self.srtt is None:
+            # First measurement (RFC 6298, 2.2)
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            # Samples expected per RTT, assuming an ACK every other segment
+            expected_samples = max(1, math.ceil(bytes_in_flight / (2 * self.mss)))
+            alpha = self.ALPHA / expected_samples
+            beta = self.BETA / expected_samples
+            self.rttvar = (1 - beta) * self.rttvar + beta * abs(self.srtt - rtt)
+            self.srtt = (1 - alpha) * self.srtt + alpha * rtt
+
+        rto = self.srtt + max(self.CLOCK_GRANULARITY, self.K * self.rttvar)
+        self.rto = max(self.min_rto, min(rto, self.max_rto))
+
+    def backoff(self):
+        """Exponential RTO backoff after a timeout"""
+        self.rto = min(self.rto * 2, self.max_rto)
+
+    def summary(self):
+        """One-line description of the current estimates"""
+        if self.srtt is None:
+            return f"no RTT samples, RTO {self.rto * 1000:.0f} ms"
+        return (f"srtt {self.srtt * 1000:.2f} ms, rttvar {self.rttvar * 1000:.2f} ms, "
+                f"min {self.min_rtt * 1000:.2f} ms, RTO {self.rto * 1000:.0f} ms, "
+                f"{self.samples} samples ({self.karn_skipped} skipped by Karn's rule)")
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Binary per-packet trace of the Part 2 sender's congestion state.
+
+A trace file is a 32-byte header followed by fixed-size 32-byte
+little-endian records:
+
+    time      f8  seconds since the trace was opened
+    event     u1  index into EVENTS (3 bytes of padding follow)
+    seq       u4  sequence number of the segment or ACK
+    cwnd      f4  congestion window, bytes
+    ssthresh  f4  slow start threshold, bytes
+    srtt      f4  smoothed RTT, seconds (NaN before the first sample)
+    inflight  u4  bytes sent and not yet cumulatively ACKed
+
+The header holds the magic, format version, record size and the wall-clock
+time the trace was opened. With NumPy the records load in one call:
+
+    np.fromfile(path, dtype=numpy_dtype(), offset=HEADER.size)
+
+TraceWriter packs records into a preallocated ring of segments; each full
+segment is written by a background thread shared by every trace in the
+process, so the sender never waits on the file. If the writer falls a whole
+ring behind, records are dropped (and counted) rather than stalling the
+sender or growing memory.
+
+Usage (reader):
+    python3 sender_trace.py <TRACE_FILE> [--csv] [--events EVENT[,EVENT...]]
+"""
+
+import argparse
+import collections
+import math
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b'P2TRACE\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sIId8x')
+RECORD = struct.Struct('<dB3xIfffI')
+
+EVENTS = ('send', 'retransmit', 'ack', 'dup_ack', 'fast_retransmit', 'recovery_exit',
+          'timeout')
+SEND, RETRANSMIT, ACK, DUP_ACK, FAST_RETRANSMIT, RECOVERY_EXIT, TIMEOUT = range(len(EVENTS))
+
+FIELDS = ('time', 'event', 'seq', 'cwnd', 'ssthresh', 'srtt', 'inflight')
+
+# One thread writes the segments of every trace in the process, in order
+WRITE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trace-writer')
+
+
+def numpy_dtype():
+    """NumPy structured dtype of one record"""
+    return np.dtype({'names': list(FIELDS),
+                     'formats': ['<f8', 'u1', '<u4', '<f4', '<f4', '<f4', '<u4'],
+                     'offsets': [0, 8, 12, 16, 20, 24, 28],
+                     'itemsize': RECORD.size})
+
+
+class TraceWriter:
+    """Trace records for one transfer, written behind through a ring buffer."""
+
+    def __init__(self, path, segment_records=4096, segments=8):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.start_time = time.time()
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, self.start_time))
+
+        self.segment_bytes = segment_records * RECORD.size
+        self.buffer = bytearray(self.segment_bytes * segments)
+        self.view = memoryview(self.buffer)
+        # Segments the writer has finished with; the writer thread appends
+        self.free = collections.deque(range(1, segments))
+        self.segment = 0      # segment being filled, None while the ring is full
+        self.offset = 0       # byte offset of the next record in the buffer
+        self.pending = None   # Future of the latest segment write
+        self.error = None
+
+        # Statistics
+        self.records = 0
+        self.dropped = 0
+
+    def record(self, event, seq, cwnd, ssthresh, srtt, inflight, now=None):
+        """Append one record"""
+        if self.segment is None:
+            if not self.free:
+                self.dropped += 1
+                return
+            self.segment = self.free.popleft()
+            self.offset = self.segment * self.segment_bytes
+        if now is None:
+            now = time.time()
+        RECORD.pack_into(self.buffer, self.offset, now - self.start_time, event, seq,
+                         cwnd, ssthresh, math.nan if srtt is None else srtt, inflight)
+        self.offset += RECORD.size
+        self.records += 1
+        if self.offset == (self.segment + 1) * self.segment_bytes:
+            self.flush()
+
+    def flush(self):
+        """Hand the current segment to the writer thread"""
+        if self.segment is None:
+            return
+        start = self.segment * self.segment_bytes
+        if self.offset > start:
+            self.pending = WRITE_POOL.submit(self.write_segment, self.segment, start,
+                                             self.offset)
+        else:
+            self.free.append(self.segment)
+        self.segment = None
+
+    def write_segment(self, segment, start, end):
+        """Write one segment and return it to the ring (runs on the writer thread)"""
+        try:
+            if self.error is None:
+                self.file.write(self.view[start:end])
+        except OSError as exc:
+            self.error = exc
+        self.free.append(segment)
+
+    def close(self):
+        """Write out the remaining records and close the file. Re-raises any write error."""
+        self.flush()
+        if self.pending is not None:
+            self.pending.result()
+        self.view.release()
+        self.file.close()
+        if self.error is not None:
+            raise self.error
+
+
+def read_header(f):
+    """(version, start time) from an open trace file"""
+    magic, version, record_size, start_time = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or record_size != RECORD.size:
+        raise ValueError("Not a Part 2 sender trace")
+    return version, start_time
+
+
+def read_trace(path):
+    """All records of a trace: a NumPy structured array when NumPy is
+    installed, otherwise a list of tuples in FIELDS order"""
+    with open(path, 'rb') as f:
+        read_header(f)
+        if np is not None:
+            return np.fromfile(f, dtype=numpy_dtype())
+        data = f.read()
+    usable = len(data) - len(data) % RECORD.size
+    return list(RECORD.iter_unpack(data[:usable]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        usage="python3 sender_trace.py <TRACE_FILE> [--csv] [--events EVENT[,EVENT...]]")
+    parser.add_argument('trace_file')
+    parser.add_argument('--csv', action='store_true',
+                        help="Print the records as CSV instead of a summary")
+    parser.add_argument('--events', default=None,
+                        help=f"Only these events ({', '.join(EVENTS)})")
+    args = parser.parse_args()
+
+    selected = None
+    if args.events:
+        try:
+            selected = {EVENTS.index(name) for name in args.events.split(',')}
+        except ValueError:
+            parser.error(f"--events takes names from: {', '.join(EVENTS)}")
+
+    with open(args.trace_file, 'rb') as f:
+        _, start_time = read_header(f)
+    records = [tuple(r) for r in read_trace(args.trace_file)]
+    if selected is not None:
+        records = [r for r in records if r[1] in selected]
+
+    if args.csv:
+        out = sys.stdout
+        out.write(','.join(FIELDS) + '\n')
+        for t, event, seq, cwnd, ssthresh, srtt, inflight in records:
+            out.write(f"{t:.6f},{EVENTS[event]},{seq},{cwnd:.0f},{ssthresh:.0f},"
+                      f"{srtt:.6f},{inflight}\n")
+        return
+
+    print(f"Trace opened at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_time))}")
+    print(f"Records: {len(records)}")
+    if not records:
+        return
+    print(f"Duration: {records[-1][0] - records[0][0]:.3f} seconds")
+    counts = collections.Counter(r[1] for r in records)
+    for event, name in enumerate(EVENTS):
+        if counts[event]:
+            print(f"  {name}: {counts[event]}")
+    cwnds = [r[3] for r in records]
+    print(f"cwnd: max {max(cwnds):.0f}, mean {sum(cwnds) / len(cwnds):.0f}, "
+          f"final {cwnds[-1]:.0f} bytes")
+    srtts = [r[5] for r in records if not math.isnan(r[5])]
+    if srtts:
+        print(f"srtt: min {min(srtts) * 1000:.2f} ms, final {srtts[-1] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
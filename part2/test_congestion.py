@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the congestion controllers, driven by synthetic ACK, loss and
+timeout sequences instead of a network.
+
+Run from part2/:
+    python3 -m pytest -q test_congestion.py
+"""
+
+import pytest
+
+from congestion import (BBRController, CongestionController, CubicController,
+                        RenoController, make_controller)
+
+MSS = 1180
+
+
+def ack_window(ctrl, now, rtt=0.1):
+    """ACK every segment of the current window, one MSS at a time"""
+    for _ in range(int(ctrl.cwnd // MSS)):
+        ctrl.on_ack(MSS, now, rtt, ctrl.cwnd)
+
+
+# Base class and factory
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        CongestionController(MSS)
+
+
+def test_make_controller():
+    for name, cls in (('reno', RenoController), ('cubic', CubicController),
+                      ('bbr', BBRController)):
+        ctrl = make_controller(name, MSS)
+        assert isinstance(ctrl, cls)
+        assert ctrl.mss == MSS
+    with pytest.raises(ValueError):
+        make_controller('vegas', MSS)
+
+
+# Reno
+
+def test_reno_slow_start_doubles_each_round():
+    ctrl = RenoController(MSS, initial_ssthresh=64 * MSS)
+    assert ctrl.cwnd == MSS
+    for expected in (2, 4, 8, 16, 32):
+        ack_window(ctrl, 0.0)
+        assert ctrl.cwnd == expected * MSS
+        assert ctrl.in_slow_start
+
+
+def test_reno_leaves_slow_start_at_ssthresh():
+    ctrl = RenoController(MSS, initial_ssthresh=8 * MSS)
+    for _ in range(7):
+        ctrl.on_ack(MSS, 0.0)
+    assert ctrl.cwnd == 8 * MSS
+    assert not ctrl.in_slow_start
+
+
+def test_reno_congestion_avoidance_adds_one_mss_per_round():
+    ctrl = RenoController(MSS)
+    ctrl.cwnd = 20 * MSS
+    ctrl.in_slow_start = False
+    for rounds in range(1, 6):
+        for _ in range(20 + rounds - 1):
+            ctrl.on_ack(MSS, 0.0)
+        # MSS * MSS / cwnd per ACK: slightly under one MSS per window
+        assert ctrl.cwnd == pytest.approx((20 + rounds) * MSS, rel=0.01)
+        assert ctrl.cwnd < (20 + rounds) * MSS
+
+
+def test_reno_fast_recovery_halves_window():
+    ctrl = RenoController(MSS)
+    ctrl.cwnd = 40 * MSS
+    ctrl.in_slow_start = False
+
+    ctrl.on_loss(1.0, 40 * MSS)
+    assert ctrl.ssthresh == 20 * MSS
+    assert ctrl.cwnd == 23 * MSS  # inflated by the three duplicate ACKs
+    assert not ctrl.in_slow_start
+
+    for extra in range(1, 4):
+        ctrl.on_dup_ack(1.0)
+        assert ctrl.cwnd == (23 + extra) * MSS
+
+    ctrl.on_recovery_exit(1.1)
+    assert ctrl.cwnd == 20 * MSS
+
+
+def test_reno_halving_floor_is_two_segments():
+    ctrl = RenoController(MSS)
+    ctrl.cwnd = 3 * MSS
+    ctrl.on_loss(0.0, 3 * MSS)
+    assert ctrl.ssthresh == 2 * MSS
+
+
+def test_reno_timeout_restarts_slow_start():
+    ctrl = RenoController(MSS)
+    ctrl.cwnd = 40 * MSS
+    ctrl.in_slow_start = False
+    ctrl.on_timeout(2.0)
+    assert ctrl.cwnd == MSS
+    assert ctrl.ssthresh == 20 * MSS
+    assert ctrl.in_slow_start
+
+
+# CUBIC (values from RFC 8312 section 4 with C = 0.4, beta = 0.7)
+
+def cubic_after_loss(w_max=100):
+    """A CUBIC controller that lost a packet at w_max segments and has just
+    left fast recovery"""
+    ctrl = CubicController(MSS)
+    ctrl.cwnd = w_max * MSS
+    ctrl.in_slow_start = False
+    ctrl.on_loss(0.0, ctrl.cwnd)
+    ctrl.on_recovery_exit(0.0)
+    return ctrl
+
+
+def test_cubic_multiplicative_decrease_is_beta():
+    ctrl = CubicController(MSS)
+    ctrl.cwnd = 100 * MSS
+    ctrl.in_slow_start = False
+
+    ctrl.on_loss(0.0, ctrl.cwnd)
+    assert ctrl.w_max == 100
+    assert ctrl.ssthresh == pytest.approx(70 * MSS)
+    assert ctrl.cwnd == pytest.approx(73 * MSS)
+    assert ctrl.epoch_start is None
+
+    ctrl.on_recovery_exit(0.0)
+    assert ctrl.cwnd == pytest.approx(70 * MSS)
+
+
+def test_cubic_fast_convergence():
+    ctrl = cubic_after_loss(100)
+    ctrl.cwnd = 80 * MSS
+    ctrl.on_loss(5.0, ctrl.cwnd)
+    # Lost again below the previous maximum: W_max = cwnd * (1 + beta) / 2
+    assert ctrl.w_max == pytest.approx(68)
+    assert ctrl.ssthresh == pytest.approx(56 * MSS)
+
+
+def test_cubic_k_from_rfc():
+    ctrl = cubic_after_loss(100)
+    ctrl.on_ack(MSS, 10.0, rtt=0.1)
+    assert ctrl.epoch_start == 10.0
+    assert ctrl.w_origin == pytest.approx(100)
+    # K = cubic_root(W_max * (1 - beta) / C)
+    assert ctrl.k == pytest.approx((100 * 0.3 / 0.4) ** (1 / 3))
+    assert ctrl.k == pytest.approx(4.2172, abs=1e-4)
+
+
+def test_cubic_window_curve():
+    ctrl = cubic_after_loss(100)
+    ctrl.on_ack(MSS, 0.0, rtt=0.1)
+    k = ctrl.k
+
+    # W(0) = beta * W_max, W(K) = W_max
+    assert ctrl.w_cubic(0.0) == pytest.approx(70)
+    assert ctrl.w_cubic(k) == pytest.approx(100)
+    # W(t) = C * (t - K)^3 + W_max
+    assert ctrl.w_cubic(2.0) == pytest.approx(95.6400, abs=1e-3)
+    assert ctrl.w_cubic(6.0) == pytest.approx(102.2667, abs=1e-3)
+
+    # Concave before K: growth slows towards W_max and stays under it
+    concave = [ctrl.w_cubic(k * i / 4) for i in range(5)]
+    steps = [b - a for a, b in zip(concave, concave[1:])]
+    assert all(w <= 100 for w in concave)
+    assert steps == sorted(steps, reverse=True)
+    # Convex after K: growth speeds up again away from W_max
+    convex = [ctrl.w_cubic(k + i) for i in range(5)]
+    steps = [b - a for a, b in zip(convex, convex[1:])]
+    assert all(w >= 100 for w in convex)
+    assert steps == sorted(steps)
+
+
+def test_cubic_ack_grows_towards_curve_one_rtt_ahead():
+    rtt = 0.1
+    ctrl = cubic_after_loss(100)
+    ctrl.on_ack(MSS, 0.0, rtt=rtt)
+    for now in (0.5, 1.0, 2.0, 3.0):
+        cwnd_seg = ctrl.cwnd / MSS
+        target = min(ctrl.w_cubic(now + rtt), 1.5 * cwnd_seg)
+        ctrl.on_ack(MSS, now, rtt=rtt)
+        assert ctrl.cwnd / MSS == pytest.approx(
+            cwnd_seg + (target - cwnd_seg) / cwnd_seg)
+
+
+def test_cubic_regains_w_max_around_k():
+    rtt = 0.1
+    ctrl = cubic_after_loss(100)
+    now = 0.0
+    while now < 4.0:
+        ack_window(ctrl, now, rtt)
+        now += rtt
+    assert 95 * MSS < ctrl.cwnd < 100 * MSS
+    while now < 4.4:
+        ack_window(ctrl, now, rtt)
+        now += rtt
+    assert ctrl.cwnd == pytest.approx(100 * MSS, rel=0.01)
+    while now < 6.0:
+        ack_window(ctrl, now, rtt)
+        now += rtt
+    assert ctrl.cwnd > 100 * MSS
+
+
+def test_cubic_timeout():
+    ctrl = CubicController(MSS)
+    ctrl.cwnd = 100 * MSS
+    ctrl.in_slow_start = False
+    ctrl.on_timeout(1.0)
+    assert ctrl.cwnd == MSS
+    assert ctrl.ssthresh == pytest.approx(70 * MSS)
+    assert ctrl.w_max == 100
+    assert ctrl.in_slow_start
+
+
+# BBR
+
+BW = 800000.0   # bytes/s
+RTT = 0.125     # seconds; a power of two keeps round boundaries exact
+
+
+def bbr_round(ctrl, now, bw=BW, rtt=RTT, bytes_in_flight=None):
+    """One round trip over a bottleneck of bw bytes/s: deliver what the
+    window allows, capped at the link's capacity, as evenly spaced ACKs.
+    Returns the time at the end of the round."""
+    delivered = min(ctrl.cwnd, bw * rtt)
+    acks = max(1, int(delivered // MSS))
+    for i in range(1, acks + 1):
+        inflight = ctrl.cwnd if bytes_in_flight is None else bytes_in_flight
+        ctrl.on_ack(MSS, now + rtt * i / acks, rtt, inflight)
+    return now + rtt
+
+
+def test_bbr_initial_state():
+    ctrl = BBRController(MSS)
+    assert ctrl.mode == 'STARTUP'
+    assert ctrl.cwnd == 4 * MSS
+    assert ctrl.pacing_rate() is None
+    assert ctrl.in_slow_start
+
+
+def test_bbr_bandwidth_filter_is_windowed_max():
+    ctrl = BBRController(MSS)
+    ctrl.on_ack(0, 0.0, RTT)  # opens the first round and sets min_rtt
+
+    def sample(round_index, rate):
+        ctrl.on_ack(rate * RTT, round_index * RTT, RTT)
+
+    sample(1, 1e6)
+    assert ctrl.btl_bw == pytest.approx(1e6)
+    for i in range(2, 11):
+        sample(i, 5e5)
+        assert ctrl.btl_bw == pytest.approx(1e6)
+    # The 1e6 sample is now BW_WINDOW_ROUNDS rounds old
+    sample(11, 5e5)
+    assert ctrl.btl_bw == pytest.approx(5e5)
+    sample(12, 7e5)
+    assert ctrl.btl_bw == pytest.approx(7e5)
+
+
+def test_bbr_no_sample_before_min_rtt_elapses():
+    ctrl = BBRController(MSS)
+    ctrl.on_ack(MSS, 0.0, RTT)
+    ctrl.on_ack(MSS, RTT / 2, RTT)
+    assert ctrl.round_count == 0
+    assert ctrl.btl_bw == 0
+    ctrl.on_ack(MSS, RTT, RTT)
+    assert ctrl.round_count == 1
+
+
+def test_bbr_startup_drain_probe_bw():
+    ctrl = BBRController(MSS)
+    now = 0.0
+    rounds = 0
+    while ctrl.mode == 'STARTUP':
+        now = bbr_round(ctrl, now)
+        rounds += 1
+        assert rounds < 20, "STARTUP never found the bottleneck"
+        if ctrl.mode == 'STARTUP' and ctrl.btl_bw:
+            assert ctrl.pacing_rate() == pytest.approx(ctrl.STARTUP_GAIN * ctrl.btl_bw)
+
+    # Bandwidth stopped growing: the pipe is full and the estimate is the link rate
+    assert ctrl.mode == 'DRAIN'
+    assert ctrl.filled_pipe
+    assert not ctrl.in_slow_start
+    assert ctrl.btl_bw == pytest.approx(BW, rel=0.05)
+    assert ctrl.min_rtt == RTT
+    assert ctrl.pacing_rate() == pytest.approx(ctrl.DRAIN_GAIN * ctrl.btl_bw)
+
+    # Still more in flight than one BDP: keep draining
+    now = bbr_round(ctrl, now, bytes_in_flight=2 * ctrl.bdp())
+    assert ctrl.mode == 'DRAIN'
+
+    # Queue drained: cruise in PROBE_BW with cwnd capped at CWND_GAIN * BDP
+    now = bbr_round(ctrl, now, bytes_in_flight=ctrl.bdp() / 2)
+    assert ctrl.mode == 'PROBE_BW'
+    for _ in range(5):
+        now = bbr_round(ctrl, now)
+        assert ctrl.cwnd <= ctrl.CWND_GAIN * ctrl.bdp() + 1e-6
+    assert ctrl.mode == 'PROBE_BW'
+
+
+def test_bbr_probe_bw_cycles_pacing_gain():
+    ctrl = BBRController(MSS)
+    ctrl.min_rtt = RTT
+    ctrl.btl_bw = BW
+    ctrl.enter_probe_bw(0.0)
+    gains = []
+    for i in range(1, 9):
+        ctrl.update_mode(i * RTT * 1.01, 0)
+        gains.append(ctrl.pacing_gain())
+    assert gains == list(ctrl.PROBE_BW_GAINS[1:] + ctrl.PROBE_BW_GAINS[:1])
+
+
+def test_bbr_probe_rtt_after_min_rtt_expires():
+    ctrl = BBRController(MSS)
+    ctrl.min_rtt = RTT
+    ctrl.min_rtt_stamp = 0.0
+    ctrl.btl_bw = BW
+    ctrl.filled_pipe = True
+    ctrl.enter_probe_bw(0.0)
+    ctrl.cwnd = 100 * MSS
+
+    now = ctrl.MIN_RTT_WINDOW + 0.1
+    ctrl.on_ack(MSS, now, 2 * RTT, 0)  # a larger RTT does not refresh min_rtt
+    assert ctrl.mode == 'PROBE_RTT'
+    assert ctrl.cwnd == ctrl.MIN_CWND_SEGMENTS * MSS
+
+    ctrl.on_ack(MSS, now + ctrl.PROBE_RTT_DURATION, 2 * RTT, 0)
+    assert ctrl.mode == 'PROBE_BW'
+    assert ctrl.min_rtt_stamp == now + ctrl.PROBE_RTT_DURATION
+
+
+def test_bbr_ignores_loss_signal_beyond_packet_conservation():
+    ctrl = BBRController(MSS)
+    ctrl.cwnd = 50 * MSS
+    ctrl.on_loss(1.0, 30 * MSS)
+    assert ctrl.cwnd == 31 * MSS
+    ctrl.on_dup_ack(1.0)
+    ctrl.on_recovery_exit(1.1)
+    assert ctrl.cwnd == 31 * MSS
+    ctrl.on_timeout(2.0)
+    assert ctrl.cwnd == ctrl.MIN_CWND_SEGMENTS * MSS